@@ -0,0 +1,85 @@
+"""Latency of `GET /jobs` (a page) of random active tenants, with and without
+the applied jobs cache. Hit rate and memory of the cache are reported.
+
+Tenants `1..--tenants` MUST be provisioned (eg: by `bench_tenant_rls.py`).
+
+    python bench_applied_cache.py --tenants 10000 --requests 20000
+"""
+import random
+import asyncio
+import argparse
+from typing import Optional
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from jobserver.caches import AppliedJobsCache
+from jobserver.contexts import AppContext
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.services.job import JobService
+
+from common import db_config, emit, pool_config, run_load
+
+
+async def measure(
+    engines: EngineRegistry,
+    cache: Optional[AppliedJobsCache],
+    args: argparse.Namespace,
+) -> dict:
+    app_context: AppContext = AppContext(
+        db_config=db_config(),
+        table_metadata=METADATA,
+        debug=False,
+        engines=engines,
+        applied_jobs_cache=cache,
+    )
+    app: Starlette = Starlette(
+        routes=[Route("/jobs/", JobService(app_context).fetch_all, methods=["GET"])]
+    )
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+
+        async def _send(_: int) -> None:
+            tenant_id: int = random.randint(1, args.tenants)
+            response: httpx.Response = await client.get(
+                f"/jobs/?tenant={tenant_id}&limit={args.limit}"
+            )
+            response.raise_for_status()
+
+        result: dict = await run_load(_send, args.requests, args.concurrency)
+    if cache is not None:
+        lookups: int = cache.stats.hits + cache.stats.misses
+        result.update(
+            hit_rate=round(cache.stats.hits / lookups, 4) if lookups else None,
+            memory=cache.memory(),
+        )
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    try:
+        emit(
+            "applied_cache",
+            {
+                "tenants": args.tenants,
+                "uncached": await measure(engines, None, args),
+                "cached": await measure(
+                    engines, AppliedJobsCache(args.tenants, args.ttl), args
+                ),
+            },
+        )
+    finally:
+        await engines.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenants", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--ttl", type=float, default=60)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+"""Latency of the asyncio data path against the previous sync path.
+
+The sync app below mirrors the handlers before the asyncio stores were added:
+`GET /jobs` runs in the threadpool and `PATCH` blocks the event loop on the db.
+
+    python bench_async_path.py --tenant 1 --job 1 --requests 2000 --concurrency 50
+"""
+import asyncio
+import argparse
+from typing import Set
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from jobserver.contexts import AppContext
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.services.job import JobService
+from jobserver.stores.job import JobStore
+from jobserver.stores.user import UserStore
+from jobserver.utils import TOOL_WORKER_ID, set_worker_id
+
+from common import db_config, emit, pool_config, run_load
+
+
+def sync_app(engines: EngineRegistry) -> Starlette:
+    """App serving jobs through the sync stores."""
+    job_store: JobStore = JobStore(engines, METADATA)
+    user_store: UserStore = UserStore(engines, METADATA)
+
+    def fetch_all(request: Request) -> JSONResponse:
+        applied: Set[int] = user_store.get_user_job_ids(
+            int(request.query_params["tenant"])
+        )
+        return JSONResponse(
+            [{**job, "isApplied": job["id"] in applied} for job in job_store.get_all()]
+        )
+
+    async def update(request: Request) -> Response:
+        body: dict = await request.json()
+        tenant_id: int = int(request.query_params["tenant"])
+        job_id: int = int(request.path_params["job_id"])
+        if body["isApplied"] is True:
+            user_store.create_user_job_relation(tenant_id, job_id)
+        else:
+            user_store.remove_user_job_relation(tenant_id, job_id)
+        return Response(status_code=204)
+
+    return Starlette(
+        routes=[
+            Route("/jobs/", fetch_all, methods=["GET"]),
+            Route("/jobs/{job_id}", update, methods=["PATCH"]),
+        ]
+    )
+
+
+def async_app(app_context: AppContext) -> Starlette:
+    """App serving jobs through `JobService` (asyncio stores)."""
+    return Starlette(
+        routes=[
+            Route("/jobs/", JobService(app_context).fetch_all, methods=["GET"]),
+            Route("/jobs/{job_id}", JobService(app_context).update, methods=["PATCH"]),
+        ]
+    )
+
+
+async def measure(app: Starlette, args: argparse.Namespace) -> dict:
+    """Mixed load, every 10th request toggles the applied state of a job."""
+    results: dict = {}
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+
+        async def _send(i: int) -> None:
+            if i % 10 == 0:
+                await client.patch(
+                    f"/jobs/{args.job}?tenant={args.tenant}",
+                    json={"isApplied": (i // 10) % 2 == 0},
+                )
+            else:
+                await client.get(f"/jobs/?tenant={args.tenant}")
+
+        results["mixed"] = await run_load(_send, args.requests, args.concurrency)
+    return results
+
+
+async def main(args: argparse.Namespace) -> None:
+    set_worker_id(TOOL_WORKER_ID)
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    app_context: AppContext = AppContext(
+        db_config=db_config(), table_metadata=METADATA, debug=False, engines=engines
+    )
+    try:
+        emit(
+            "async_path",
+            {
+                "sync": await measure(sync_app(engines), args),
+                "async": await measure(async_app(app_context), args),
+            },
+        )
+    finally:
+        await engines.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--job", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+"""Throughput (rows/s) of `InitData` load methods.
+
+Every run truncates `Job` (and `UserJob`), so point it to a scratch database
+prepared with `InitDB`:
+
+    DB_NAME=bench_job_db python bench_bulk_load.py --rows 100000 --batch-size 5000
+"""
+import argparse
+from typing import Iterator
+from time import perf_counter, time
+
+from sqlalchemy import text
+
+from jobserver.contexts import DBConfig
+from jobserver.db import InitData, create_engine_
+
+from common import db_config, emit, synthetic_job
+
+
+def _jobs(count: int) -> Iterator[dict]:
+    created_time: int = int(time() * 1000)
+    return (synthetic_job(index, created_time) for index in range(count))
+
+
+def _truncate(config: DBConfig) -> None:
+    engine = create_engine_(
+        config.host, config.port, config.username, config.password, config.db_name
+    )
+    with engine.begin() as conn:
+        conn.execute(text('truncate "Job" cascade'))
+    engine.dispose()
+
+
+def measure(config: DBConfig, rows: int, batch_size: int, method: str) -> dict:
+    """Load `rows` synthetic jobs, return rows/s."""
+    _truncate(config)
+    init_data: InitData = InitData(
+        [],
+        _jobs(rows),
+        config.db_name,
+        config.host,
+        config.port,
+        config.username,
+        config.password,
+        batch_size=batch_size,
+        method=method,
+        progress=lambda *_: None,
+    )
+    started: float = perf_counter()
+    loaded: int = init_data.create_jobs()
+    elapsed: float = perf_counter() - started
+    return {
+        "rows": loaded,
+        "batch_size": batch_size,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(loaded / elapsed, 2),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    config: DBConfig = db_config()
+    emit(
+        "bulk_load",
+        {
+            "copy": measure(config, args.rows, args.batch_size, "copy"),
+            "insert": measure(config, args.rows, args.batch_size, "insert"),
+            # One statement per row, like the loader before batching.
+            "row_by_row": measure(config, args.row_by_row_rows, 1, "insert"),
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--row-by-row-rows", type=int, default=10000)
+    main(parser.parse_args())
@@ -0,0 +1,96 @@
+"""Bytes on the wire and CPU per request of compressed job listings.
+
+No database is needed, listings are encoded from synthetic jobs. Each encoding
+is measured for a buffered response without `ETag` (compressed every time),
+with `ETag` (compressed once, served from cache) and a streamed response.
+
+    python bench_compression.py --jobs 2000 --requests 200
+"""
+import asyncio
+import argparse
+from typing import AsyncIterator, Callable, Dict, List
+from time import process_time, time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from jobserver.compression import CompressionMiddleware, available_encodings
+from jobserver.serializers import JobEncoder
+from jobserver.services.job import _JOB_FIELDS
+
+from common import emit, synthetic_job
+
+_CHUNK_SIZE: int = 64 * 1024
+
+
+def listing_app(body: bytes) -> Starlette:
+    """App serving the same listing, buffered (with / without ETag) and streamed."""
+
+    async def plain(_: Request) -> Response:
+        return Response(body, media_type="application/json")
+
+    async def tagged(_: Request) -> Response:
+        return Response(body, media_type="application/json", headers={"ETag": 'W/"1"'})
+
+    async def streamed(_: Request) -> StreamingResponse:
+        async def _chunks() -> AsyncIterator[bytes]:
+            for start in range(0, len(body), _CHUNK_SIZE):
+                yield body[start : start + _CHUNK_SIZE]
+
+        return StreamingResponse(_chunks(), media_type="application/json")
+
+    return Starlette(
+        routes=[
+            Route("/plain", plain),
+            Route("/tagged", tagged),
+            Route("/streamed", streamed),
+        ],
+        middleware=[Middleware(CompressionMiddleware)],
+    )
+
+
+async def measure(app: Starlette, path: str, encoding: str, requests: int) -> dict:
+    """Sequential requests, CPU time includes both client (decoding) and server."""
+    wire_bytes: List[int] = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        started: float = process_time()
+        for _ in range(requests):
+            response: httpx.Response = await client.get(
+                path, headers={"Accept-Encoding": encoding}
+            )
+            wire_bytes.append(response.num_bytes_downloaded)
+        cpu: float = process_time() - started
+    return {
+        "wire_bytes": wire_bytes[-1],
+        "cpu_ms_per_request": round(cpu / requests * 1000, 3),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    created_time: int = int(time() * 1000)
+    jobs: List[dict] = [
+        {"id": index + 1, **synthetic_job(index, created_time)}
+        for index in range(args.jobs)
+    ]
+    body: bytes = JobEncoder(_JOB_FIELDS, args.jobs).encode_all(
+        jobs, _JOB_FIELDS, set()
+    )
+    app: Starlette = listing_app(body)
+    results: Dict[str, dict] = {"body_bytes": len(body)}
+    for encoding in ["identity"] + available_encodings():
+        results[encoding] = {
+            path.strip("/"): await measure(app, path, encoding, args.requests)
+            for path in ("/plain", "/tagged", "/streamed")
+        }
+    emit("compression", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
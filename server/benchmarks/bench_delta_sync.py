@@ -0,0 +1,92 @@
+"""Latency and bytes of a delta sync (`GET /jobs?since=`) against the no. of
+changed jobs, compared with a full listing of the catalogue.
+
+Jobs are changed by bumping their `lastModifiedTime`, nothing is deleted.
+
+    python bench_delta_sync.py --tenant 1 --jobs 100000 --changes 0 10 100 1000
+"""
+import asyncio
+import argparse
+from time import time
+from typing import List
+
+import httpx
+from sqlalchemy import select, update
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from jobserver.contexts import AppContext
+from jobserver.contract.models import METADATA, Job
+from jobserver.engines import EngineRegistry
+from jobserver.services.job import _SYNC_OVERLAP_MILLI, JobService
+
+from common import db_config, emit, pool_config, run_load, seed_jobs
+
+
+def change_jobs(engines: EngineRegistry, count: int) -> int:
+    """Modify `count` jobs, return a token taken just before it."""
+    # Token "from the future", so that the overlap starts at the changes.
+    token: int = int(time() * 1000) + _SYNC_OVERLAP_MILLI
+    job_ids = select(Job.c.id).order_by(Job.c.id.desc()).limit(count)
+    with engines.connect() as conn:
+        conn.execute(
+            update(Job)
+            .where(Job.c.id.in_(job_ids.scalar_subquery()))
+            .values(lastModifiedTime=int(time() * 1000) + 1)
+        )
+    return token
+
+
+async def measure(
+    client: httpx.AsyncClient, path: str, args: argparse.Namespace
+) -> dict:
+    """Polls of the path."""
+    sizes: List[int] = []
+
+    async def _send(_: int) -> None:
+        response: httpx.Response = await client.get(path)
+        response.raise_for_status()
+        sizes.append(len(response.content))
+
+    result: dict = await run_load(_send, args.requests, args.concurrency)
+    result["body_bytes_per_request"] = sum(sizes) // len(sizes)
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    seed_jobs(engines, args.jobs)
+    app_context: AppContext = AppContext(
+        db_config=db_config(),
+        table_metadata=METADATA,
+        debug=False,
+        engines=engines,
+    )
+    app: Starlette = Starlette(
+        routes=[Route("/jobs/", JobService(app_context).fetch_all, methods=["GET"])]
+    )
+    results: dict = {"jobs": args.jobs}
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            results["full"] = await measure(
+                client, f"/jobs/?tenant={args.tenant}", args
+            )
+            for changes in args.changes:
+                token: int = change_jobs(engines, changes)
+                results[f"since_{changes}"] = await measure(
+                    client, f"/jobs/?tenant={args.tenant}&since={token}", args
+                )
+    finally:
+        await engines.dispose()
+    emit("delta_sync", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=100000)
+    parser.add_argument("--changes", type=int, nargs="+", default=[0, 10, 100, 1000])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""Latency and bytes of unchanged `GET /jobs` polls, with and without
+`If-None-Match`.
+
+    python bench_etag.py --tenant 1 --jobs 10000 --requests 500 --concurrency 20
+"""
+import asyncio
+import argparse
+from typing import List, Optional
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from jobserver.caches import JobCache
+from jobserver.contexts import AppContext
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.services.job import JobService
+
+from common import db_config, emit, pool_config, run_load, seed_jobs
+
+
+async def measure(
+    client: httpx.AsyncClient, etag: Optional[str], args: argparse.Namespace
+) -> dict:
+    """Polls of the same list, conditional if `etag` is given."""
+    headers: dict = {} if etag is None else {"If-None-Match": etag}
+    sizes: List[int] = []
+
+    async def _send(_: int) -> None:
+        response: httpx.Response = await client.get(
+            f"/jobs/?tenant={args.tenant}", headers=headers
+        )
+        assert response.status_code == (200 if etag is None else 304)
+        sizes.append(len(response.content))
+
+    result: dict = await run_load(_send, args.requests, args.concurrency)
+    result["body_bytes_per_request"] = sum(sizes) // len(sizes)
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    seed_jobs(engines, args.jobs)
+    app_context: AppContext = AppContext(
+        db_config=db_config(),
+        table_metadata=METADATA,
+        debug=False,
+        engines=engines,
+        job_cache=JobCache(args.jobs, 1.0) if args.cache else None,
+    )
+    app: Starlette = Starlette(
+        routes=[Route("/jobs/", JobService(app_context).fetch_all, methods=["GET"])]
+    )
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            etag: str = (await client.get(f"/jobs/?tenant={args.tenant}")).headers[
+                "ETag"
+            ]
+            emit(
+                "etag",
+                {
+                    "jobs": args.jobs,
+                    "cache": args.cache,
+                    "unconditional": await measure(client, None, args),
+                    "conditional": await measure(client, etag, args),
+                },
+            )
+    finally:
+        await engines.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--cache", action="store_true", help="Enable job cache.")
+    asyncio.run(main(parser.parse_args()))
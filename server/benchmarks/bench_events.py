@@ -0,0 +1,168 @@
+"""Fan-out latency of job change events (`GET /jobs/events`) and memory per
+idle connection.
+
+A single worker is started with `jobserver.launcher`, `--clients` event
+streams are opened to it, and then a job is updated `--changes` times. Latency
+is from the commit of the update to the event reaching each client. Memory is
+the growth of the worker's RSS with the idle connections open.
+
+    python bench_events.py --tenant 1 --clients 100 1000 5000 --changes 20
+"""
+import os
+import sys
+import socket
+import asyncio
+import argparse
+import resource
+import subprocess
+from time import perf_counter, sleep, time
+from typing import List
+
+import httpx
+from sqlalchemy import func, select, update
+
+from jobserver.contract.models import Job
+from jobserver.engines import EngineRegistry
+
+from common import db_config, emit, pool_config, summarize
+
+_SERVER_DIR: str = os.path.join(os.path.dirname(__file__), os.pardir, "jobserver")
+
+
+def _rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status", "r", encoding="utf-8") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    raise RuntimeError(f"No RSS of {pid}")
+
+
+def _worker_pid(launcher_pid: int) -> int:
+    with open(
+        f"/proc/{launcher_pid}/task/{launcher_pid}/children", "r", encoding="utf-8"
+    ) as children:
+        pids: List[str] = children.read().split()
+    # Resource tracker of multiprocessing is a child as well.
+    for pid in pids:
+        with open(f"/proc/{pid}/cmdline", "rb") as cmdline:
+            if b"spawn_main" in cmdline.read():
+                return int(pid)
+    raise RuntimeError(f"No worker of {launcher_pid}")
+
+
+async def _open(port: int, tenant: int) -> asyncio.StreamReader:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET /jobs/events?tenant={tenant} HTTP/1.1\r\nHost: bench\r\n"
+        "Accept: text/event-stream\r\n\r\n".encode("utf-8")
+    )
+    await writer.drain()
+    # Subscribed once the first message (`retry`) arrives.
+    await reader.readuntil(b"retry:")
+    return reader
+
+
+async def _receive(reader: asyncio.StreamReader, marker: bytes) -> float:
+    await reader.readuntil(marker)
+    return perf_counter()
+
+
+async def measure(
+    port: int, worker_pid: int, clients: int, args: argparse.Namespace
+) -> dict:
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    idle_rss: int = _rss_kb(worker_pid)
+    readers: List[asyncio.StreamReader] = []
+    for start in range(0, clients, 100):
+        readers.extend(
+            await asyncio.gather(
+                *(
+                    _open(port, args.tenant)
+                    for _ in range(start, min(start + 100, clients))
+                )
+            )
+        )
+    await asyncio.sleep(1)
+    connected_rss: int = _rss_kb(worker_pid)
+    with engines.connect() as conn:
+        job_id: int = conn.execute(select(func.max(Job.c.id))).scalar()
+    latencies: List[float] = []
+    started: float = perf_counter()
+    for _ in range(args.changes):
+        receiving = [
+            asyncio.ensure_future(_receive(reader, b'"update"')) for reader in readers
+        ]
+        with engines.connect() as conn:
+            conn.execute(
+                update(Job)
+                .where(Job.c.id == job_id)
+                .values(lastModifiedTime=int(time() * 1000))
+            )
+        committed: float = perf_counter()
+        latencies.extend(
+            received - committed for received in await asyncio.gather(*receiving)
+        )
+    result: dict = summarize(latencies, perf_counter() - started)
+    result.update(
+        clients=clients,
+        rss_per_connection_kb=round((connected_rss - idle_rss) / clients, 2),
+    )
+    await engines.dispose()
+    return result
+
+
+def _wait_ready(port: int, server: subprocess.Popen) -> None:
+    started: float = perf_counter()
+    while perf_counter() - started < 30:
+        if server.poll() is not None:
+            raise RuntimeError(f"launcher exited with {server.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/jobs/?tenant=1&limit=1")
+            return
+        except httpx.TransportError:
+            sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def main(args: argparse.Namespace) -> None:
+    # A socket per client.
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    results: dict = {}
+    for clients in args.clients:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port: int = sock.getsockname()[1]
+        server: subprocess.Popen = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "jobserver.launcher",
+                "--workers",
+                "1",
+                "--port",
+                str(port),
+                "--log-level",
+                "warning",
+            ],
+            cwd=_SERVER_DIR,
+            env={**os.environ, "JOB_EVENTS_MAX_SUBSCRIBERS": str(clients)},
+        )
+        try:
+            _wait_ready(port, server)
+            results[str(clients)] = asyncio.run(
+                measure(port, _worker_pid(server.pid), clients, args)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+    emit("events", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--changes", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,83 @@
+"""Rate of id generation.
+
+Ids per second of `generate_id` (one tenant / many tenants) and of
+`generate_ids` (bulk), against the previous (random) generator. A tenant gets
+1024 ids per second without waiting for the clock (a few seconds more can be
+borrowed), so the single tenant run is of `--burst` ids. Uniqueness is tested
+in `tests/test_utils.py`.
+
+No database is needed.
+
+    python bench_id_generation.py --count 200000
+"""
+import argparse
+from typing import Callable, List
+from datetime import datetime
+from random import randrange
+from time import perf_counter, time
+
+from jobserver.utils import (
+    TOOL_WORKER_ID,
+    generate_id,
+    generate_ids,
+    set_worker_id,
+)
+
+from common import emit
+
+_OFFSET_2022_02_02_MILLI: int = int(
+    datetime(year=2022, month=2, day=2).timestamp() * 1000
+)
+
+
+def legacy_generate_id(tenant_id: int) -> int:
+    """Previous generator, millisecond timestamp and a random number."""
+    return (
+        (tenant_id << 47)
+        + ((int(time() * 1000) - _OFFSET_2022_02_02_MILLI) << 5)
+        + randrange(0, (2**4) - 1)
+    )
+
+
+def rate(generate: Callable[[int], object], count: int, per_call: int = 1) -> dict:
+    """Ids per second of `count` calls."""
+    started: float = perf_counter()
+    for i in range(count):
+        generate(i)
+    elapsed: float = perf_counter() - started
+    return {
+        "ids": count * per_call,
+        "ids_per_second": round(count * per_call / elapsed),
+    }
+
+
+def collisions(ids: List[int]) -> int:
+    return len(ids) - len(set(ids))
+
+
+def main(args: argparse.Namespace) -> None:
+    set_worker_id(TOOL_WORKER_ID)
+    # First ids of a process wait for the next second.
+    generate_id(1)
+    legacy_ids: List[int] = [legacy_generate_id(1) for _ in range(args.count)]
+    results: dict = {
+        "legacy": {
+            **rate(legacy_generate_id, args.count),
+            "collisions": collisions(legacy_ids),
+        },
+        "single_tenant": rate(lambda _: generate_id(60001), args.burst),
+        "many_tenants": rate(lambda i: generate_id(1 + i % 60000), args.count),
+        "bulk_100": rate(
+            lambda i: generate_ids(1 + i % 60000, 100),
+            args.count // 100,
+            per_call=100,
+        ),
+    }
+    emit("id_generation", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--burst", type=int, default=1000)
+    main(parser.parse_args())
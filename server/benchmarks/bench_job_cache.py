@@ -0,0 +1,70 @@
+"""Throughput of `GET /jobs` with the catalogue cache on and off.
+
+    python bench_job_cache.py --tenant 1 --jobs 10000 --requests 500 --concurrency 20
+"""
+import asyncio
+import argparse
+from dataclasses import asdict
+from typing import Optional
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from jobserver.caches import JobCache
+from jobserver.contexts import AppContext
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.services.job import JobService
+
+from common import db_config, emit, pool_config, run_load, seed_jobs
+
+
+async def measure(
+    engines: EngineRegistry, job_cache: Optional[JobCache], args: argparse.Namespace
+) -> dict:
+    app_context: AppContext = AppContext(
+        db_config=db_config(),
+        table_metadata=METADATA,
+        debug=False,
+        engines=engines,
+        job_cache=job_cache,
+    )
+    app: Starlette = Starlette(
+        routes=[Route("/jobs/", JobService(app_context).fetch_all, methods=["GET"])]
+    )
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+
+        async def _send(_: int) -> None:
+            (await client.get(f"/jobs/?tenant={args.tenant}")).raise_for_status()
+
+        result: dict = await run_load(_send, args.requests, args.concurrency)
+    if job_cache is not None:
+        result["cache"] = asdict(job_cache.stats)
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    seed_jobs(engines, args.jobs)
+    try:
+        emit(
+            "job_cache",
+            {
+                "jobs": args.jobs,
+                "off": await measure(engines, None, args),
+                "on": await measure(engines, JobCache(args.jobs, 1.0), args),
+            },
+        )
+    finally:
+        await engines.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
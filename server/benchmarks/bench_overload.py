@@ -0,0 +1,102 @@
+"""Tail latency under overload, with and without admission control.
+
+The app (`create_app`) is given a small pool (`--pool-size`) and loaded with
+far more concurrent requests (`--concurrency`), pages of jobs mixed with
+apply / withdraw of a job (`--write-ratio`). Latency is reported separately
+for served and rejected (`503`) requests, by reads and writes.
+
+    python bench_overload.py --tenant 1 --job 1 --pool-size 2 --concurrency 200
+"""
+import os
+import random
+import asyncio
+import argparse
+from collections import Counter
+from time import perf_counter
+from typing import Dict, List
+
+import httpx
+from starlette.applications import Starlette
+
+from common import emit, summarize
+
+
+async def measure(admission: bool, args: argparse.Namespace) -> dict:
+    """Load the app for `--duration` seconds."""
+    os.environ.update(
+        ADMISSION_ENABLED=str(admission),
+        DB_POOL_SIZE=str(args.pool_size),
+        DB_POOL_MAX_OVERFLOW="0",
+        # Caches would hide the db.
+        JOB_CACHE_ENABLED="False",
+        APPLIED_JOBS_CACHE_ENABLED="False",
+        JOB_EVENTS_ENABLED="False",
+        COMPRESSION_ENABLED="False",
+    )
+    from jobserver.server import create_app  # pylint: disable=import-outside-toplevel
+
+    app: Starlette = create_app()
+    latencies: Dict[str, List[float]] = {}
+    statuses: Counter = Counter()
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            app=app, base_url="http://bench", timeout=120
+        ) as client:
+
+            async def _send() -> None:
+                kind: str = "write" if random.random() < args.write_ratio else "read"
+                started: float = perf_counter()
+                if kind == "read":
+                    response: httpx.Response = await client.get(
+                        f"/jobs/?tenant={args.tenant}&limit=50"
+                    )
+                else:
+                    response = await client.patch(
+                        f"/jobs/{args.job}?tenant={args.tenant}",
+                        json={"isApplied": random.random() < 0.5},
+                    )
+                outcome: str = "rejected" if response.status_code == 503 else "served"
+                latencies.setdefault(f"{kind}_{outcome}", []).append(
+                    perf_counter() - started
+                )
+                statuses[str(response.status_code)] += 1
+
+            async def _worker(deadline: float) -> None:
+                while perf_counter() < deadline:
+                    await _send()
+
+            started: float = perf_counter()
+            deadline: float = started + args.duration
+            await asyncio.gather(*(_worker(deadline) for _ in range(args.concurrency)))
+            elapsed: float = perf_counter() - started
+    result: dict = {
+        name: summarize(values, elapsed)
+        for name, values in sorted(latencies.items())
+        if len(values) > 1
+    }
+    result["statuses"] = dict(statuses)
+    return result
+
+
+def main(args: argparse.Namespace) -> None:
+    emit(
+        "overload",
+        {
+            "pool_size": args.pool_size,
+            "concurrency": args.concurrency,
+            "without_admission": asyncio.run(measure(False, args)),
+            "with_admission": asyncio.run(measure(True, args)),
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--job", type=int, default=1)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--duration", type=float, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,101 @@
+"""Read replica routing: throughput of reads with and without replicas, and
+where reads go after a tenant's write and when a replica is down.
+
+Replicas are taken from `DB_REPLICAS` (comma separated `host:port`). Without
+a real replica, the primary itself stands in for one (`DB_HOST:DB_PORT`), it
+exercises the routing, not the offloading. A port with nothing listening
+(`--dead-replica`) is added to check the fallback.
+
+    DB_REPLICAS=localhost:5433 python bench_replicas.py --tenant 1 --job 1
+"""
+import os
+import asyncio
+import argparse
+from typing import Dict, Tuple
+
+from jobserver.contexts import DBConfig
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.stores.job import AsyncJobStore, JobQuery
+from jobserver.stores.user import AsyncUserStore
+from jobserver.utils import TOOL_WORKER_ID, set_worker_id
+
+from common import db_config, emit, pool_config, run_load
+
+
+def checkouts(engines: EngineRegistry) -> Dict[str, int]:
+    """Connections checked out so far, by asyncio engine."""
+    return {
+        name: stats["checkouts"]
+        for name, stats in engines.stats().items()
+        if name.endswith(".async")
+    }
+
+
+async def measure(config: DBConfig, args: argparse.Namespace) -> dict:
+    """Page reads of the catalogue, and applied jobs of the tenant."""
+    engines: EngineRegistry = EngineRegistry(config, pool_config())
+    engines.start()
+    job_store: AsyncJobStore = AsyncJobStore(engines, METADATA)
+    user_store: AsyncUserStore = AsyncUserStore(engines, METADATA)
+
+    async def _read(i: int) -> None:
+        await job_store.get_all(JobQuery(limit=50))
+        await user_store.get_user_job_ids(args.tenant)
+
+    try:
+        result: dict = await run_load(_read, args.requests, args.concurrency)
+        result["checkouts"] = checkouts(engines)
+        if config.replicas:
+            # Reads right after a write MUST see it (served by the primary).
+            before: Dict[str, int] = checkouts(engines)
+            await user_store.remove_user_job_relation(args.tenant, args.job)
+            await user_store.create_user_job_relation(args.tenant, args.job)
+            applied: bool = args.job in await user_store.get_user_job_ids(args.tenant)
+            after: Dict[str, int] = checkouts(engines)
+            result["read_your_writes"] = {
+                "applied_job_visible": applied,
+                "checkouts": {
+                    name: after[name] - before.get(name, 0) for name in after
+                },
+            }
+        result["connect_failures"] = {
+            name: stats["connect_failures"]
+            for name, stats in engines.stats().items()
+            if stats["connect_failures"]
+        }
+    finally:
+        await engines.dispose()
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    set_worker_id(TOOL_WORKER_ID)
+    config: DBConfig = db_config()
+    replicas: Tuple[str, ...] = tuple(
+        replica
+        for replica in os.environ.get(
+            "DB_REPLICAS", f"{config.host}:{config.port}"
+        ).split(",")
+        if replica
+    )
+    emit(
+        "replicas",
+        {
+            "primary_only": await measure(config, args),
+            "replicas": await measure(config._replace(replicas=replicas), args),
+            "dead_replica": await measure(
+                config._replace(replicas=(args.dead_replica,) + replicas), args
+            ),
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--job", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--dead-replica", default="127.0.0.1:1")
+    asyncio.run(main(parser.parse_args()))
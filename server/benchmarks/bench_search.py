@@ -0,0 +1,61 @@
+"""Latency of full text job search against catalogue size.
+
+Jobs are added to the catalogue until it reaches each of the given sizes, and
+the first page of a few searches is measured at every size:
+
+    python bench_search.py --sizes 1000 10000 100000 --requests 500 --concurrency 10
+"""
+import asyncio
+import argparse
+from typing import List
+
+from sqlalchemy import text
+
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.stores.job import AsyncJobStore, JobQuery
+
+from common import db_config, emit, pool_config, run_load, seed_jobs
+
+# Frequent, rare and phrase searches over the synthetic jobs.
+_SEARCHES: List[str] = ["engineer", "company 42", '"developer tools"', "job 777"]
+
+
+async def measure(store: AsyncJobStore, args: argparse.Namespace) -> dict:
+    """First page (`--page-size` jobs) of each search."""
+    results: dict = {}
+    for search in _SEARCHES:
+        query: JobQuery = JobQuery(
+            columns=("name", "company"), limit=args.page_size, search=search
+        )
+
+        async def _send(_: int, query: JobQuery = query) -> None:
+            await store.get_all(query)
+
+        results[search] = await run_load(_send, args.requests, args.concurrency)
+    return results
+
+
+async def main(args: argparse.Namespace) -> None:
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    store: AsyncJobStore = AsyncJobStore(engines, METADATA)
+    results: dict = {}
+    try:
+        for size in sorted(args.sizes):
+            seed_jobs(engines, size)
+            with engines.connect() as conn:
+                conn.execute(text('analyze "Job"'))
+            results[str(size)] = await measure(store, args)
+        emit("search", results)
+    finally:
+        await engines.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""Serialization cost of job listings per 1k/10k/100k jobs. No db needed.
+
+* `dict`: dict per job, datetime formatting and `JSONResponse` (previous path).
+* `cold`: `JobEncoder` encoding every job (first request after a change).
+* `warm`: `JobEncoder` re-using encoded jobs, only `isApplied` is added.
+
+Each of them is measured with stdlib json and, if installed, orjson.
+
+    python bench_serialization.py --sizes 1000 10000 100000
+"""
+import argparse
+from datetime import datetime
+from time import perf_counter, time
+from typing import Callable, List, Set
+
+from starlette.responses import JSONResponse
+
+from jobserver import serializers
+from jobserver.serializers import JobEncoder
+from jobserver.services.job import _JOB_FIELDS
+
+from common import emit, synthetic_job
+
+
+def dict_path(jobs: List[dict], applied_job_ids: Set[int]) -> bytes:
+    return JSONResponse(
+        [
+            {
+                "id": job_obj["id"],
+                "name": job_obj["name"],
+                "company": job_obj["company"],
+                "expectedExperienceInYears": job_obj["expectedExperienceInYears"],
+                "locations": job_obj["locations"],
+                "createdTime": str(
+                    datetime.utcfromtimestamp((job_obj["createdTime"] / 1000)).strftime(
+                        "%Y-%m-%dT%H:%M:%SZ"
+                    )
+                ),
+                "shortJobDescription": job_obj["shortJobDescription"],
+                "shortCompanyDescription": job_obj["shortCompanyDescription"],
+                "fullJobDescription": job_obj["fullJobDescription"],
+                "isApplied": job_obj["id"] in applied_job_ids,
+            }
+            for job_obj in jobs
+        ]
+    ).body
+
+
+def timed(run: Callable[[], bytes], repeat: int) -> float:
+    """Best of `repeat` runs, in milliseconds."""
+    best: float = float("inf")
+    for _ in range(repeat):
+        started: float = perf_counter()
+        run()
+        best = min(best, perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+def measure(size: int, repeat: int) -> dict:
+    created_time: int = int(time() * 1000)
+    jobs: List[dict] = [
+        dict(synthetic_job(index, created_time), id=index + 1) for index in range(size)
+    ]
+    applied_job_ids: Set[int] = set(range(1, size + 1, 7))
+    results: dict = {}
+    backends: dict = {"json": None, "orjson": serializers.orjson}
+    for backend, module in backends.items():
+        if backend == "orjson" and module is None:
+            continue
+        serializers.orjson = module
+        results[backend] = {
+            "dict_ms": timed(lambda: dict_path(jobs, applied_job_ids), repeat),
+            "cold_ms": timed(
+                lambda: JobEncoder(_JOB_FIELDS, size).encode_all(
+                    jobs, _JOB_FIELDS, applied_job_ids
+                ),
+                repeat,
+            ),
+        }
+        encoder: JobEncoder = JobEncoder(_JOB_FIELDS, size)
+        encoder.encode_all(jobs, _JOB_FIELDS, applied_job_ids)
+        results[backend]["warm_ms"] = timed(
+            lambda: encoder.encode_all(jobs, _JOB_FIELDS, applied_job_ids), repeat
+        )
+    serializers.orjson = backends["orjson"]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    emit(
+        "serialization",
+        {str(size): measure(size, args.repeat) for size in args.sizes},
+    )
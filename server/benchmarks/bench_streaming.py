@@ -0,0 +1,90 @@
+"""Peak RSS of the server process while listing the whole catalogue, buffered
+against streamed (json array, ndjson).
+
+Every mode runs in a fresh process, since peak RSS never goes down.
+
+    python bench_streaming.py --tenant 1 --jobs 100000
+"""
+import sys
+import json
+import asyncio
+import argparse
+import resource
+import subprocess
+from time import perf_counter
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from jobserver.contexts import AppContext
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.services.job import JobService
+
+from common import db_config, emit, pool_config, seed_jobs
+
+_MODES = {"buffered": "", "json": "&stream=json", "ndjson": "&stream=ndjson"}
+
+
+async def measure(mode: str, tenant: int) -> dict:
+    """List all jobs once in the given mode, discarding the received bytes."""
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    app_context: AppContext = AppContext(
+        db_config=db_config(), table_metadata=METADATA, debug=False, engines=engines
+    )
+    app: Starlette = Starlette(
+        routes=[Route("/jobs/", JobService(app_context).fetch_all, methods=["GET"])]
+    )
+    rss_before: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    received: int = 0
+    started: float = perf_counter()
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            async with client.stream(
+                "GET", f"/jobs/?tenant={tenant}{_MODES[mode]}", timeout=None
+            ) as response:
+                async for chunk in response.aiter_raw():
+                    received += len(chunk)
+    finally:
+        await engines.dispose()
+    return {
+        "seconds": round(perf_counter() - started, 3),
+        "bytes": received,
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "peak_rss_growth_mb": round(
+            (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+            1,
+        ),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.mode is not None:
+        print(json.dumps(asyncio.run(measure(args.mode, args.tenant))))
+        return
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    seed_jobs(engines, args.jobs)
+    asyncio.run(engines.dispose())
+    results: dict = {}
+    for mode in _MODES:
+        output: str = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--tenant", str(args.tenant)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results[mode] = json.loads(output)
+    emit("streaming", {"jobs": args.jobs, "modes": results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=100000)
+    parser.add_argument("--mode", choices=list(_MODES), default=None)
+    main(parser.parse_args())
@@ -0,0 +1,122 @@
+"""Role per tenant against a shared role: provisioning throughput and planning
+time of tenant scoped queries.
+
+A scratch database is created (and dropped) for each tenancy mode, named
+`<DB_NAME>_<mode>`. Roles are global, tenant ids MUST NOT be in use by other
+databases of the server.
+
+    python bench_tenancy.py --tenants 10000 --samples 200
+"""
+import os
+import json
+import random
+import argparse
+import tempfile
+from typing import List
+from statistics import mean, quantiles
+
+from sqlalchemy import text
+from sqlalchemy.engine.base import Engine
+
+from jobserver.contexts import DBConfig
+from jobserver.contract.models import METADATA
+from jobserver.db import TENANCY_ROLE, TENANCY_SHARED, DBSession, InitDB
+from jobserver.provision import provision
+
+from common import db_config, emit
+
+# Query of every `GET /jobs`, tenant rows are limited by RLS.
+_TENANT_QUERY: str = 'select array_agg("jobID") from "UserJob"'
+
+
+def planning_times(engine: Engine, tenancy: str, tenant_ids: List[int]) -> dict:
+    """Planning time (milliseconds) of the tenant query, for sampled tenants."""
+    times: List[float] = []
+    with engine.connect() as conn:
+        for tenant_id in tenant_ids:
+            db_session: DBSession = DBSession(conn, tenant_id, tenancy)
+            db_session.open()
+            try:
+                plan: list = conn.execute(
+                    text(f"explain (analyze, format json) {_TENANT_QUERY}")
+                ).scalar()
+            finally:
+                db_session.close()
+            conn.rollback()
+            times.append(plan[0]["Planning Time"])
+    cut_points: List[float] = quantiles(times, n=100, method="inclusive")
+    return {
+        "mean_ms": round(mean(times), 3),
+        "p99_ms": round(cut_points[98], 3),
+    }
+
+
+def measure(
+    base_config: DBConfig, tenancy: str, users_path: str, args: argparse.Namespace
+) -> dict:
+    """Provision tenants in a new database and plan the tenant query."""
+    config: DBConfig = base_config._replace(
+        db_name=f"{base_config.db_name}_{tenancy}", tenancy=tenancy
+    )
+    tenant_ids: List[int] = list(range(1, args.tenants + 1))
+    init_db: InitDB = InitDB(
+        METADATA,
+        config.db_name,
+        config.host,
+        config.port,
+        config.username,
+        config.password,
+        tenant_ids,
+        tenancy=tenancy,
+    )
+    init_db.create_db()
+    try:
+        results: dict = provision(config, users_path, batch_size=args.batch_size)
+        engine: Engine = init_db.create_engine(config.db_name)
+        with engine.connect() as conn:
+            results["policies"] = conn.execute(
+                text("select count(*) from pg_policy")
+            ).scalar()
+        results["planning"] = planning_times(
+            engine,
+            tenancy,
+            random.sample(tenant_ids, min(args.samples, len(tenant_ids))),
+        )
+        engine.dispose()
+    finally:
+        init_db.drop_db()
+        init_db.drop_roles()
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as users:
+        for tenant_id in range(1, args.tenants + 1):
+            users.write(
+                json.dumps(
+                    {
+                        "id": tenant_id,
+                        "name": f"user {tenant_id}",
+                        "email": f"{tenant_id}@b.c",
+                    }
+                )
+                + "\n"
+            )
+    try:
+        emit(
+            "tenancy",
+            {
+                tenancy: measure(db_config(), tenancy, users.name, args)
+                for tenancy in (TENANCY_ROLE, TENANCY_SHARED)
+            },
+        )
+    finally:
+        os.remove(users.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenants", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--samples", type=int, default=200)
+    main(parser.parse_args())
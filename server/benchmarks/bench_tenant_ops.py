@@ -0,0 +1,115 @@
+"""Statements, connection checkouts and latency per apply / withdraw / listing,
+for the previous per-statement role switch (sync `UserStore`) against the
+tenant scoped unit of work (`AsyncUserStore`).
+
+    python bench_tenant_ops.py --tenant 1 --job 1 --iterations 200
+"""
+import asyncio
+import argparse
+from collections import Counter
+from time import perf_counter
+from typing import Awaitable, Callable, List
+
+from sqlalchemy import event
+from sqlalchemy.engine.base import Engine
+
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.stores.user import AsyncUserStore, UserStore
+from jobserver.utils import TOOL_WORKER_ID, set_worker_id
+
+from common import db_config, emit, pool_config, summarize
+
+
+def count_events(engine: Engine, counter: Counter) -> None:
+    """Count statements (including transaction control) and pool checkouts."""
+
+    def _on_statement(*_) -> None:
+        counter["statements"] += 1
+
+    def _on_checkout(*_) -> None:
+        counter["checkouts"] += 1
+
+    event.listen(engine, "before_cursor_execute", _on_statement)
+    for name in ("begin", "commit", "rollback"):
+        event.listen(engine, name, _on_statement)
+    event.listen(engine, "checkout", _on_checkout)
+
+
+async def measure(
+    operation: Callable[[], Awaitable], counter: Counter, iterations: int
+) -> dict:
+    counter.clear()
+    latencies: List[float] = []
+    started: float = perf_counter()
+    for _ in range(iterations):
+        call_started: float = perf_counter()
+        await operation()
+        latencies.append(perf_counter() - call_started)
+    result: dict = summarize(latencies, perf_counter() - started)
+    result.update(
+        {
+            "statements_per_request": counter["statements"] / iterations,
+            "checkouts_per_request": counter["checkouts"] / iterations,
+        }
+    )
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    set_worker_id(TOOL_WORKER_ID)
+    engines: EngineRegistry = EngineRegistry(db_config(), pool_config())
+    engines.start()
+    sync_counter: Counter = Counter()
+    async_counter: Counter = Counter()
+    count_events(engines.get(), sync_counter)
+    count_events(engines.get_async().sync_engine, async_counter)
+    user_store: UserStore = UserStore(engines, METADATA)
+    async_user_store: AsyncUserStore = AsyncUserStore(engines, METADATA)
+
+    async def _sync_cycle() -> None:
+        user_store.create_user_job_relation(args.tenant, args.job)
+        user_store.remove_user_job_relation(args.tenant, args.job)
+
+    async def _async_cycle() -> None:
+        await async_user_store.create_user_job_relation(args.tenant, args.job)
+        await async_user_store.remove_user_job_relation(args.tenant, args.job)
+
+    async def _sync_listing() -> None:
+        user_store.get_user_job_ids(args.tenant)
+
+    async def _async_listing() -> None:
+        await async_user_store.get_user_job_ids(args.tenant)
+
+    try:
+        emit(
+            "tenant_ops",
+            {
+                "before": {
+                    "apply_withdraw": await measure(
+                        _sync_cycle, sync_counter, args.iterations
+                    ),
+                    "applied_ids": await measure(
+                        _sync_listing, sync_counter, args.iterations
+                    ),
+                },
+                "after": {
+                    "apply_withdraw": await measure(
+                        _async_cycle, async_counter, args.iterations
+                    ),
+                    "applied_ids": await measure(
+                        _async_listing, async_counter, args.iterations
+                    ),
+                },
+            },
+        )
+    finally:
+        await engines.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--job", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
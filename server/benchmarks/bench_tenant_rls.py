@@ -0,0 +1,140 @@
+"""Per-request cost of tenant scoped queries against the no. of tenants.
+
+Tenants (role, policies, user and `--applications` applied jobs each) are
+provisioned until each of the given counts, and requests of random tenants
+are measured at every count. With the range policies the cost stays flat.
+Tenant ids are limited to 65535 by the id layout (`utils.generate_id`).
+
+    DB_NAME=bench_job_db python bench_tenant_rls.py --tenants 1000 10000 60000
+"""
+import random
+import asyncio
+import argparse
+from typing import List
+
+from sqlalchemy import func, insert, select, text
+
+from jobserver.contexts import DBConfig
+from jobserver.contract.models import METADATA, Job, User, UserJob
+from jobserver.db import InitDB, InitData
+from jobserver.engines import EngineRegistry
+from jobserver.stores.user import AsyncUserStore
+from jobserver.utils import TOOL_WORKER_ID, set_worker_id, tenant_id_range
+
+from common import db_config, emit, pool_config, run_load, seed_jobs
+
+
+def provision(
+    engines: EngineRegistry,
+    config: DBConfig,
+    tenant_ids: List[int],
+    job_ids: List[int],
+) -> None:
+    """Create roles, users and applications of the tenants."""
+    InitDB(
+        METADATA,
+        config.db_name,
+        config.host,
+        config.port,
+        config.username,
+        config.password,
+        tenant_ids,
+    ).create_roles()
+    InitData(
+        [
+            {"id": tenant_id, "name": f"user {tenant_id}", "email": f"{tenant_id}@b.c"}
+            for tenant_id in tenant_ids
+        ],
+        [],
+        config.db_name,
+        config.host,
+        config.port,
+        config.username,
+        config.password,
+        progress=lambda *_: None,
+    ).create_users()
+    with engines.connect() as conn:
+        for tenant_id in tenant_ids:
+            start, stop = tenant_id_range(tenant_id)
+            user_id: int = conn.execute(
+                select(User.c.id).where(User.c.id >= start, User.c.id < stop)
+            ).scalar_one()
+            conn.execute(
+                insert(UserJob),
+                [
+                    # Generated ids have a timestamp, low ids of the range are free.
+                    {
+                        "id": start + 1 + index,
+                        "tenantID": tenant_id,
+                        "userID": user_id,
+                        "jobID": job_id,
+                    }
+                    for index, job_id in enumerate(job_ids)
+                ],
+            )
+
+
+async def measure(
+    store: AsyncUserStore, tenant_ids: List[int], job_id: int, args: argparse.Namespace
+) -> dict:
+    """Reads (applied job ids) and writes (withdraw + apply) of random tenants."""
+
+    async def _read(_: int) -> None:
+        await store.get_user_job_ids(random.choice(tenant_ids))
+
+    async def _write(_: int) -> None:
+        tenant_id: int = random.choice(tenant_ids)
+        await store.remove_user_job_relation(tenant_id, job_id)
+        await store.create_user_job_relation(tenant_id, job_id)
+
+    return {
+        "read": await run_load(_read, args.requests, args.concurrency),
+        "write": await run_load(_write, args.requests, args.concurrency),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    set_worker_id(TOOL_WORKER_ID)
+    config: DBConfig = db_config()
+    engines: EngineRegistry = EngineRegistry(config, pool_config())
+    engines.start()
+    store: AsyncUserStore = AsyncUserStore(engines, METADATA)
+    results: dict = {}
+    try:
+        seed_jobs(engines, args.applications)
+        with engines.connect() as conn:
+            job_ids: List[int] = list(
+                conn.execute(
+                    select(Job.c.id).order_by(Job.c.id).limit(args.applications)
+                ).scalars()
+            )
+            provisioned: int = conn.execute(
+                text('select count(*) from "User"')
+            ).scalar_one()
+        for count in sorted(args.tenants):
+            if count > provisioned:
+                provision(
+                    engines, config, list(range(provisioned + 1, count + 1)), job_ids
+                )
+                provisioned = count
+            with engines.connect() as conn:
+                conn.execute(text('analyze "User", "UserJob"'))
+                applications: int = conn.execute(
+                    select(func.count()).select_from(UserJob)
+                ).scalar_one()
+            results[str(count)] = {
+                "applications": applications,
+                **await measure(store, list(range(1, count + 1)), job_ids[0], args),
+            }
+        emit("tenant_rls", results)
+    finally:
+        await engines.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenants", type=int, nargs="+", default=[1000, 10000, 60000])
+    parser.add_argument("--applications", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,162 @@
+"""Per-tenant read and write latency of `UserJob`, as a single table and hash
+partitioned on the tenant.
+
+A scratch database (`<DB_NAME>_user_job`, shared tenancy) is loaded with
+`--rows` applications spread over `--tenants` tenants and measured. Then
+`UserJob` is converted in place (`InitDB.partition_user_job`, the time taken
+is reported) and measured again. The database is dropped at the end.
+
+    python bench_user_job_partitions.py --rows 10000000 --tenants 1000 --partitions 16
+"""
+import random
+import asyncio
+import argparse
+from typing import List
+from time import perf_counter
+
+from sqlalchemy import text
+
+from jobserver.contexts import DBConfig
+from jobserver.contract.models import METADATA
+from jobserver.db import TENANCY_SHARED, InitDB, InitData
+from jobserver.engines import EngineRegistry
+from jobserver.stores.user import AsyncUserStore
+from jobserver.utils import TOOL_WORKER_ID, set_worker_id, tenant_id_range
+
+from common import db_config, emit, pool_config, run_load, seed_jobs
+
+# Applications of the tenants from `first` to `last`, of the first `per_tenant`
+# jobs each. Generated ids have a timestamp, low ids of the ranges are free.
+_SEED_USER_JOBS = text(
+    """insert into "UserJob"(id, "tenantID", "userID", "jobID") """
+    + """select u.id / :span * :span + j.n, u.id / :span, u.id, j.id """
+    + """from "User" as u cross join ("""
+    + """select id, row_number() over (order by id) as n from "Job" """
+    + """order by id limit :per_tenant) as j """
+    + """where u.id >= :first * :span and u.id < (:last + 1) * :span"""
+)
+_SIZE = text(
+    """select sum(pg_total_relation_size(relid)) """
+    + """from pg_partition_tree('"UserJob"')"""
+)
+
+
+def seed(engines: EngineRegistry, config: DBConfig, args: argparse.Namespace) -> None:
+    """Users, jobs and `--rows` applications."""
+    tenant_ids: List[int] = list(range(1, args.tenants + 1))
+    InitData(
+        (
+            {"id": tenant_id, "name": f"user {tenant_id}", "email": f"{tenant_id}@b.c"}
+            for tenant_id in tenant_ids
+        ),
+        [],
+        config.db_name,
+        config.host,
+        config.port,
+        config.username,
+        config.password,
+        progress=lambda *_: None,
+    ).create_users()
+    per_tenant: int = args.rows // args.tenants
+    seed_jobs(engines, per_tenant)
+    with engines.connect() as conn:
+        # Bulk load, change logs and notifications (triggers) are not needed.
+        conn.execute(text("set session_replication_role = replica"))
+        for first in range(1, args.tenants + 1, args.batch_tenants):
+            conn.execute(
+                _SEED_USER_JOBS,
+                {
+                    "span": tenant_id_range(0)[1],
+                    "per_tenant": per_tenant,
+                    "first": first,
+                    "last": min(first + args.batch_tenants, args.tenants + 1) - 1,
+                },
+            )
+        conn.execute(text("reset session_replication_role"))
+
+
+async def measure(engines: EngineRegistry, args: argparse.Namespace) -> dict:
+    """Applied job ids (reads), withdraw + apply of a job (writes) of random
+    tenants.
+    """
+    store: AsyncUserStore = AsyncUserStore(engines, METADATA)
+    per_tenant: int = args.rows // args.tenants
+    with engines.connect() as conn:
+        conn.execute(text('analyze "UserJob"'))
+        size: int = conn.execute(_SIZE).scalar()
+        job_ids: List[int] = list(
+            conn.execute(
+                text('select id from "Job" order by id limit :limit'),
+                {"limit": per_tenant},
+            ).scalars()
+        )
+
+    async def _read(_: int) -> None:
+        await store.get_user_job_ids(random.randint(1, args.tenants))
+
+    async def _write(_: int) -> None:
+        tenant_id: int = random.randint(1, args.tenants)
+        job_id: int = random.choice(job_ids)
+        await store.remove_user_job_relation(tenant_id, job_id)
+        await store.create_user_job_relation(tenant_id, job_id)
+
+    return {
+        "size_mb": round(size / 2**20, 1),
+        "read": await run_load(_read, args.requests, args.concurrency),
+        "write": await run_load(_write, args.requests, args.concurrency),
+    }
+
+
+def _init_db(config: DBConfig, args: argparse.Namespace, partitions: int) -> InitDB:
+    return InitDB(
+        METADATA,
+        config.db_name,
+        config.host,
+        config.port,
+        config.username,
+        config.password,
+        list(range(1, args.tenants + 1)),
+        tenancy=TENANCY_SHARED,
+        user_job_partitions=partitions,
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    set_worker_id(TOOL_WORKER_ID)
+    base_config: DBConfig = db_config()
+    config: DBConfig = base_config._replace(
+        db_name=f"{base_config.db_name}_user_job", tenancy=TENANCY_SHARED
+    )
+    init_db: InitDB = _init_db(config, args, 0)
+    init_db.create_db()
+    init_db.create_roles()
+    engines: EngineRegistry = EngineRegistry(config, pool_config())
+    engines.start()
+    results: dict = {"rows": args.rows, "tenants": args.tenants}
+    try:
+        seed(engines, config, args)
+        results["single"] = await measure(engines, args)
+        # Pooled connections have the plans of the old table cached.
+        await engines.dispose()
+        started: float = perf_counter()
+        _init_db(config, args, args.partitions).partition_user_job()
+        results["partition_seconds"] = round(perf_counter() - started, 3)
+        engines = EngineRegistry(config, pool_config())
+        engines.start()
+        results[f"partitioned_{args.partitions}"] = await measure(engines, args)
+    finally:
+        await engines.dispose()
+        init_db.drop_db()
+        init_db.drop_roles()
+    emit("user_job_partitions", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument("--tenants", type=int, default=1000)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--batch-tenants", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,131 @@
+"""Throughput of the server against the no. of worker processes.
+
+For each worker count, the server is started with `jobserver.launcher` and
+loaded from `--clients` client processes (a single client process would be
+the bottleneck). Database is read from the `DB_*` variables.
+
+    python bench_workers.py --workers 1 2 4 8 --requests 2000 --concurrency 32
+"""
+import os
+import sys
+import socket
+import asyncio
+import argparse
+import subprocess
+from typing import List
+from multiprocessing import Pool
+from time import perf_counter, sleep
+
+import httpx
+
+from common import emit, run_load
+
+_SERVER_DIR: str = os.path.join(os.path.dirname(__file__), os.pardir, "jobserver")
+_PATHS: dict = {
+    "page": "/jobs/?tenant={tenant}&limit=50",
+    "list": "/jobs/?tenant={tenant}",
+}
+
+
+def _client(base_url: str, path: str, requests: int, concurrency: int) -> dict:
+    """Load of a client process."""
+
+    async def _run() -> dict:
+        limits: httpx.Limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(
+            base_url=base_url, limits=limits, timeout=60
+        ) as client:
+
+            async def _send(_: int) -> None:
+                response: httpx.Response = await client.get(path)
+                response.raise_for_status()
+
+            return await run_load(_send, requests, concurrency)
+
+    return asyncio.run(_run())
+
+
+def _wait_ready(base_url: str, path: str, server: subprocess.Popen) -> None:
+    started: float = perf_counter()
+    while perf_counter() - started < 30:
+        if server.poll() is not None:
+            raise RuntimeError(f"launcher exited with {server.returncode}")
+        try:
+            httpx.get(base_url + path).raise_for_status()
+            return
+        except httpx.TransportError:
+            sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def measure(workers: int, args: argparse.Namespace) -> dict:
+    """Start `workers` workers and load them from all clients at once."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+    base_url: str = f"http://127.0.0.1:{port}"
+    path: str = _PATHS[args.endpoint].format(tenant=args.tenant)
+    server: subprocess.Popen = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "jobserver.launcher",
+            "--workers",
+            str(workers),
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=_SERVER_DIR,
+    )
+    try:
+        _wait_ready(base_url, path, server)
+        with Pool(args.clients) as pool:
+            started: float = perf_counter()
+            results: List[dict] = pool.starmap(
+                _client,
+                [
+                    (
+                        base_url,
+                        path,
+                        args.requests // args.clients,
+                        args.concurrency // args.clients,
+                    )
+                    for _ in range(args.clients)
+                ],
+            )
+            elapsed: float = perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+    requests: int = sum(result["requests"] for result in results)
+    return {
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 2),
+        # Worst of the clients.
+        "p50_ms": max(result["p50_ms"] for result in results),
+        "p99_ms": max(result["p99_ms"] for result in results),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    emit(
+        "workers",
+        {
+            "endpoint": args.endpoint,
+            "cpus": os.cpu_count(),
+            **{str(workers): measure(workers, args) for workers in args.workers},
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--endpoint", choices=list(_PATHS), default="page")
+    parser.add_argument("--tenant", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    main(parser.parse_args())
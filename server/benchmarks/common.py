@@ -0,0 +1,104 @@
+"""Helpers shared by benchmarks.
+
+Benchmarks expect a database prepared with `jobserver.db.InitDB`/`InitData` and
+read its configs from the same variables used in `.env`.
+"""
+import os
+import json
+import asyncio
+from typing import Awaitable, Callable, List
+from statistics import quantiles
+from time import perf_counter, time
+
+from sqlalchemy import func, insert, select
+
+from jobserver.contexts import DBConfig, PoolConfig
+from jobserver.contract.models import Job
+from jobserver.engines import EngineRegistry
+
+
+def db_config() -> DBConfig:
+    """Database configs from environment."""
+    return DBConfig(
+        db_name=os.environ.get("DB_NAME", "job_db"),
+        host=os.environ.get("DB_HOST", "localhost"),
+        port=int(os.environ.get("DB_PORT", 5432)),
+        username=os.environ.get("DB_USERNAME", "postgres"),
+        password=os.environ.get("DB_PASSWORD", ""),
+    )
+
+
+def pool_config() -> PoolConfig:
+    """Pool configs from environment."""
+    return PoolConfig(
+        size=int(os.environ.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(os.environ.get("DB_POOL_MAX_OVERFLOW", 10)),
+        pre_ping=os.environ.get("DB_POOL_PRE_PING", "True") == "True",
+        recycle=int(os.environ.get("DB_POOL_RECYCLE", -1)),
+        timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    )
+
+
+def synthetic_job(index: int, created_time: int) -> dict:
+    """A job row with descriptions of realistic size (~4KB)."""
+    return {
+        "createdTime": created_time,
+        "lastModifiedTime": created_time,
+        "name": f"Software Engineer {index}",
+        "company": f"Company {index % 500}",
+        "expectedExperienceInYears": f"{index % 5}-{index % 5 + 3}",
+        "locations": "Bangalore/Bengaluru, Chennai, Hyderabad",
+        "shortJobDescription": "Build and operate backend services. " * 8,
+        "shortCompanyDescription": "A product company working on developer tools. " * 6,
+        "fullJobDescription": f"Job {index}. " + "Design, build and ship APIs. " * 120,
+    }
+
+
+def seed_jobs(engines: EngineRegistry, count: int, batch_size: int = 5000) -> None:
+    """Insert synthetic jobs until the catalogue has at least `count` jobs."""
+    created_time: int = int(time() * 1000)
+    with engines.connect() as conn:
+        existing: int = conn.execute(select(func.count()).select_from(Job)).scalar()
+        for start in range(existing, count, batch_size):
+            conn.execute(
+                insert(Job),
+                [
+                    synthetic_job(index, created_time)
+                    for index in range(start, min(start + batch_size, count))
+                ],
+            )
+
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+    """Throughput and latency percentiles (milliseconds) of a run."""
+    cut_points: List[float] = quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(cut_points[49] * 1000, 3),
+        "p99_ms": round(cut_points[98] * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+async def run_load(
+    send: Callable[[int], Awaitable], total: int, concurrency: int
+) -> dict:
+    """Call `send(i)` `total` times keeping `concurrency` calls in flight."""
+    latencies: List[float] = []
+    counter = iter(range(total))
+
+    async def _worker() -> None:
+        for i in counter:
+            started: float = perf_counter()
+            await send(i)
+            latencies.append(perf_counter() - started)
+
+    started: float = perf_counter()
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    return summarize(latencies, perf_counter() - started)
+
+
+def emit(name: str, results: dict) -> None:
+    """Print results as a single json document."""
+    print(json.dumps({"benchmark": name, "results": results}, indent=2))
@@ -0,0 +1,60 @@
+"""Compare two `suite.py` result files, eg: of a commit and of its parent.
+
+Change of throughput and p50 / p99 latency is printed for every scale, mode
+and endpoint measured in both. Exits with 1 if p99 of any endpoint regressed
+by more than `--threshold` percent.
+
+    python compare.py before.json after.json --threshold 10
+"""
+import sys
+import json
+import argparse
+from typing import List, Optional
+
+
+def change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    """Percent change from `before` to `after`."""
+    if not before or after is None:
+        return None
+    return round((after - before) * 100 / before, 1)
+
+
+def _format(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:+.1f}%"
+
+
+def main(args: argparse.Namespace) -> int:
+    with open(args.before) as before_file, open(args.after) as after_file:
+        before: dict = json.load(before_file)
+        after: dict = json.load(after_file)
+    print(f"before: {before['meta']['commit']}  after: {after['meta']['commit']}")
+    regressions: List[str] = []
+    for scale, modes in after["results"].items():
+        for mode, results in modes.items():
+            for endpoint, result in results.items():
+                base: Optional[dict] = (
+                    before["results"].get(scale, {}).get(mode, {}).get(endpoint)
+                )
+                if base is None:
+                    continue
+                p99: Optional[float] = change(base["p99_ms"], result["p99_ms"])
+                print(
+                    f"{scale:>16} {mode:>10} {endpoint:>8}"
+                    f"  rps {_format(change(base['throughput_rps'], result['throughput_rps'])):>8}"
+                    f"  p50 {_format(change(base['p50_ms'], result['p50_ms'])):>8}"
+                    f"  p99 {_format(p99):>8}"
+                )
+                if p99 is not None and p99 > args.threshold:
+                    regressions.append(f"{scale} {mode} {endpoint}")
+    if regressions:
+        print(f"p99 regressed by more than {args.threshold}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    sys.exit(main(parser.parse_args()))
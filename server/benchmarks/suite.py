@@ -0,0 +1,389 @@
+"""Load test of the server at several catalogue / tenant scales.
+
+A scratch database (`<DB_NAME>_suite`) is created with `InitDB`, grown to each
+scale (`<jobs>:<tenants>`) with `InitData` / `provision`, and every endpoint is
+driven through `jobserver.server.create_app`, in-process and through uvicorn.
+Throughput, p50 / p99 latency and memory (RSS) of the serving process are
+reported for each scale, mode and endpoint.
+
+Results are written as json (with the commit they were measured on), compare
+two runs with `compare.py`.
+
+    python suite.py --scales 1000:10 100000:10000 --output before.json
+
+Tenant ids are limited to 65535 by the id layout (`utils.generate_id`).
+Database roles are global, tenant ids MUST NOT be in use by other databases of
+the server.
+"""
+import os
+import sys
+import json
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from time import time
+
+import httpx
+from starlette.applications import Starlette
+from sqlalchemy import func, select, text
+from sqlalchemy.engine.base import Engine
+
+from jobserver.contexts import DBConfig
+from jobserver.contract.models import METADATA, Job
+from jobserver.db import InitDB, InitData
+from jobserver.provision import provision
+
+from common import db_config, run_load, synthetic_job
+
+_SERVER_DIR: str = os.path.join(os.path.dirname(__file__), os.pardir, "jobserver")
+# Jobs of a page / search, and job ids used by the write endpoints.
+_PAGE_SIZE: int = 50
+_WRITE_JOBS: int = 10
+_MODES: Tuple[str, ...] = ("inprocess", "uvicorn")
+
+Endpoint = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def parse_scale(value: str) -> Tuple[int, int]:
+    """`<jobs>:<tenants>`."""
+    jobs, _, tenants = value.partition(":")
+    return int(jobs), int(tenants)
+
+
+def memory() -> Dict[str, Optional[int]]:
+    """Current and peak RSS (bytes) of this process, `None` if unknown."""
+    return process_memory(os.getpid())
+
+
+def process_memory(pid: int) -> Dict[str, Optional[int]]:
+    """Current and peak RSS (bytes) of a process, from `/proc` (linux only)."""
+    result: Dict[str, Optional[int]] = {"rss_bytes": None, "peak_rss_bytes": None}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    result["rss_bytes"] = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    result["peak_rss_bytes"] = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return result
+
+
+def metadata(args: argparse.Namespace) -> dict:
+    """Where the results are measured."""
+
+    def _git(*command: str) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", *command],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=os.path.dirname(__file__) or ".",
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status: Optional[str] = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": None if status is None else bool(status),
+        "timestamp": int(time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {key: value for key, value in vars(args).items() if key != "output"},
+    }
+
+
+def endpoints(
+    tenants: int, job_ids: List[int], jobs: int, args: argparse.Namespace
+) -> Dict[str, Endpoint]:
+    """Requests of each endpoint, `i`th request is of tenant `i % tenants`."""
+
+    def _tenant(i: int) -> int:
+        return 1 + i % tenants
+
+    def _list(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        return client.get(f"/jobs/?tenant={_tenant(i)}")
+
+    def _page(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        after: int = job_ids[i % len(job_ids)]
+        return client.get(
+            f"/jobs/?tenant={_tenant(i)}&limit={_PAGE_SIZE}&after={after}"
+        )
+
+    def _search(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        return client.get(
+            f"/jobs/?tenant={_tenant(i)}&limit={_PAGE_SIZE}"
+            f"&q=backend engineer {i % jobs}"
+        )
+
+    def _apply(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        # Consecutive requests of a tenant apply and withdraw the same job.
+        return client.patch(
+            f"/jobs/{job_ids[(i // 2) % len(job_ids)]}?tenant={_tenant(i // 2)}",
+            json={"isApplied": i % 2 == 0},
+        )
+
+    def _batch(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        return client.patch(
+            f"/jobs/?tenant={_tenant(i // 2)}",
+            json=[
+                {"jobId": str(job_id), "isApplied": i % 2 == 0} for job_id in job_ids
+            ],
+        )
+
+    selected: Dict[str, Endpoint] = {
+        "page": _page,
+        "search": _search,
+        "apply": _apply,
+        "batch": _batch,
+    }
+    # Full listing is `jobs` x ~4KB, only measured on smaller catalogues.
+    if jobs <= args.list_max_jobs:
+        selected = {"list": _list, **selected}
+    return selected
+
+
+async def measure(
+    client: httpx.AsyncClient,
+    selected: Dict[str, Endpoint],
+    memory_of: Callable[[], Dict[str, Optional[int]]],
+    args: argparse.Namespace,
+) -> dict:
+    """Load every endpoint in turn, memory is sampled after each one."""
+    results: dict = {}
+    for name, endpoint in selected.items():
+        statuses: Dict[str, int] = {}
+
+        async def _send(i: int, endpoint: Endpoint = endpoint) -> None:
+            response: httpx.Response = await endpoint(client, i)
+            if response.status_code >= 500:
+                raise RuntimeError(f"{name}: {response.status_code} {response.text}")
+            status: str = str(response.status_code)
+            statuses[status] = statuses.get(status, 0) + 1
+
+        # Warm up caches and pools, not measured.
+        for i in range(min(args.concurrency, args.requests)):
+            await _send(i)
+        statuses.clear()
+        results[name] = {
+            **await run_load(_send, args.requests, args.concurrency),
+            "statuses": statuses,
+            **memory_of(),
+        }
+    return results
+
+
+def server_env(config: DBConfig) -> Dict[str, str]:
+    """Environment of the server, pointing to the scratch database."""
+    return {
+        "DB_NAME": config.db_name,
+        "DB_HOST": config.host,
+        "DB_PORT": str(config.port),
+        "DB_USERNAME": config.username,
+        "DB_PASSWORD": config.password,
+        "DB_TENANCY": config.tenancy,
+        "DEBUG": "",
+    }
+
+
+async def measure_inprocess(
+    selected: Dict[str, Endpoint], args: argparse.Namespace
+) -> dict:
+    """Drive the app in this process (no network, no http parsing)."""
+    # App reads its configs from environment, `server_env` is already set.
+    from jobserver.server import create_app  # pylint: disable=import-outside-toplevel
+
+    app: Starlette = create_app()
+
+    # Engines are started / disposed in the lifespan of the app.
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            return await measure(client, selected, memory, args)
+
+
+async def measure_uvicorn(
+    config: DBConfig, selected: Dict[str, Endpoint], args: argparse.Namespace
+) -> dict:
+    """Drive the app served by a uvicorn process, over loopback."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+    server: subprocess.Popen = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "jobserver.server:create_app",
+            "--factory",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=_SERVER_DIR,
+        env={**os.environ, **server_env(config)},
+    )
+    try:
+        limits: httpx.Limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60
+        ) as client:
+            await _wait_ready(client, server)
+            return await measure(
+                client, selected, lambda: process_memory(server.pid), args
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def _wait_ready(client: httpx.AsyncClient, server: subprocess.Popen) -> None:
+    for _ in range(300):
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        try:
+            await client.get("/jobs/?tenant=1&limit=1")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("uvicorn did not start")
+
+
+def grow(
+    engine: Engine,
+    config: DBConfig,
+    jobs: int,
+    tenants: int,
+    args: argparse.Namespace,
+) -> None:
+    """Add jobs and tenants, until the database has `jobs` and `tenants`."""
+    with engine.connect() as conn:
+        existing_jobs: int = conn.execute(
+            select(func.count()).select_from(Job)
+        ).scalar_one()
+        existing_tenants: int = conn.execute(
+            text('select count(*) from "User"')
+        ).scalar_one()
+    created_time: int = int(time() * 1000)
+    InitData(
+        [],
+        (synthetic_job(index, created_time) for index in range(existing_jobs, jobs)),
+        config.db_name,
+        config.host,
+        config.port,
+        config.username,
+        config.password,
+        batch_size=args.batch_size,
+    ).create_jobs()
+    if tenants > existing_tenants:
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as users:
+            for tenant_id in range(existing_tenants + 1, tenants + 1):
+                users.write(
+                    json.dumps(
+                        {
+                            "id": tenant_id,
+                            "name": f"user {tenant_id}",
+                            "email": f"{tenant_id}@b.c",
+                        }
+                    )
+                    + "\n"
+                )
+        try:
+            provision(config, users.name, batch_size=args.batch_size)
+        finally:
+            os.remove(users.name)
+    with engine.connect() as conn:
+        conn.execute(text("analyze"))
+        conn.commit()
+
+
+async def main(args: argparse.Namespace) -> None:
+    scales: List[Tuple[int, int]] = sorted(args.scales)
+    if [tenants for _, tenants in scales] != sorted(tenants for _, tenants in scales):
+        raise SystemExit("Tenants MUST not decrease as jobs grow.")
+    base_config: DBConfig = db_config()
+    config: DBConfig = base_config._replace(
+        db_name=f"{base_config.db_name}_suite",
+        tenancy=os.environ.get("DB_TENANCY", "role"),
+    )
+    os.environ.update(server_env(config))
+    init_db: InitDB = InitDB(
+        METADATA,
+        config.db_name,
+        config.host,
+        config.port,
+        config.username,
+        config.password,
+        list(range(1, scales[-1][1] + 1)),
+        tenancy=config.tenancy,
+    )
+    init_db.create_db()
+    engine: Engine = init_db.create_engine(config.db_name)
+    results: dict = {}
+    try:
+        for jobs, tenants in scales:
+            grow(engine, config, jobs, tenants, args)
+            with engine.connect() as conn:
+                job_ids: List[int] = list(
+                    conn.execute(
+                        select(Job.c.id).order_by(Job.c.id).limit(_WRITE_JOBS)
+                    ).scalars()
+                )
+            selected: Dict[str, Endpoint] = endpoints(tenants, job_ids, jobs, args)
+            scale_results: dict = {}
+            if "inprocess" in args.modes:
+                scale_results["inprocess"] = await measure_inprocess(selected, args)
+            if "uvicorn" in args.modes:
+                scale_results["uvicorn"] = await measure_uvicorn(config, selected, args)
+            results[f"{jobs}:{tenants}"] = scale_results
+    finally:
+        engine.dispose()
+        if not args.keep:
+            init_db.drop_db()
+            init_db.drop_roles()
+
+    document: dict = {
+        "benchmark": "suite",
+        "meta": metadata(args),
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, "w") as output:
+            json.dump(document, output, indent=2)
+    print(json.dumps(document, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--scales",
+        type=parse_scale,
+        nargs="+",
+        default=[(1000, 10), (10000, 1000), (100000, 10000), (1000000, 60000)],
+        help="`<jobs>:<tenants>` of each scale.",
+    )
+    parser.add_argument("--modes", nargs="+", choices=_MODES, default=list(_MODES))
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--list-max-jobs",
+        type=int,
+        default=100000,
+        help="Full listing is measured only up to this many jobs.",
+    )
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--output", help="File to write the results to.")
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the scratch database and roles."
+    )
+    asyncio.run(main(parser.parse_args()))
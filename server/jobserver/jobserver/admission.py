@@ -0,0 +1,220 @@
+"""Admission control, requests are rejected early instead of piling up when
+the db is slow.
+
+* Limited routes are of a class (`READ`, `WRITE`), all the routes of a class
+  share its concurrency limit and bounded queue of waiting requests. A request
+  waits in the queue (FIFO) at most `queue_timeout` seconds.
+* Requests are shed while the wait for a pool connection
+  (`EngineRegistry.pool_wait`) exceeds the class's `max_pool_wait`, when the
+  class has no free slot.
+* A rejected request gets `503` with `Retry-After` right away, instead of
+  timing out after many seconds.
+
+Reads are given priority by their limits, writes get a smaller queue and a
+lower pool wait threshold, so they are shed first. Routes without a class (eg:
+event streams, metrics) are not controlled.
+"""
+import asyncio
+from typing import Callable, Deque, Dict, List, Optional
+from collections import deque, namedtuple
+from dataclasses import asdict, dataclass
+
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, Match, Mount
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from jobserver.errors import SERVICE_UNAVAILABLE
+
+READ: str = "read"
+WRITE: str = "write"
+
+# * `max_concurrency`: requests in progress.
+# * `max_queue`: requests waiting for a slot, beyond it they are rejected.
+# * `queue_timeout`: seconds a request waits for a slot.
+# * `max_pool_wait`: seconds of pool wait beyond which the class is shed.
+RouteLimits = namedtuple(
+    "RouteLimits", "max_concurrency max_queue queue_timeout max_pool_wait"
+)
+
+
+@dataclass
+class AdmissionStats:
+    """Counters of a class of routes.
+
+    * `admitted`: requests served (immediately or after waiting).
+    * `queued`: requests which waited for a slot.
+    * `rejected_queue_full`, `rejected_timeout`, `rejected_pool_wait`: requests
+      rejected as the queue was full, after waiting `queue_timeout` and as the
+      pool wait was beyond the threshold.
+    """
+
+    admitted: int = 0
+    queued: int = 0
+    rejected_queue_full: int = 0
+    rejected_timeout: int = 0
+    rejected_pool_wait: int = 0
+
+
+class _Limiter:
+    """Concurrency limit with a bounded FIFO queue of a class of routes."""
+
+    def __init__(self, limits: RouteLimits) -> None:
+        self.limits: RouteLimits = limits
+        self.stats: AdmissionStats = AdmissionStats()
+        self.active: int = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def try_acquire(self) -> bool:
+        """Take a free slot, if any (and nobody is waiting for one)."""
+        if self.active < self.limits.max_concurrency and not self._waiters:
+            self.active += 1
+            return True
+        return False
+
+    async def acquire(self) -> bool:
+        """Wait for a slot, `False` if the queue is full or the wait timed out."""
+        if len(self._waiters) >= self.limits.max_queue:
+            self.stats.rejected_queue_full += 1
+            return False
+        self.stats.queued += 1
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # Slot is handed over by `release`, `active` is not changed. Not
+            # `wait_for`, it may lose a slot handed over as it times out.
+            await asyncio.wait((waiter,), timeout=self.limits.queue_timeout)
+        except asyncio.CancelledError:
+            # Client gone, after the slot was handed over or while waiting.
+            if waiter.done():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        if waiter.done():
+            return True
+        waiter.cancel()
+        self.stats.rejected_timeout += 1
+        return False
+
+    def release(self) -> None:
+        """Hand the slot over to the first waiting request, or free it."""
+        while self._waiters:
+            waiter: asyncio.Future = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    """Limiters of the classes of routes of a process.
+
+    * `limits`: limits of each class (eg: `READ`, `WRITE`).
+    * `routes`: class of each controlled route, by qualified name of the
+      endpoint (as in metrics).
+    * `pool_wait`: current wait for a pool connection, in seconds.
+    * `retry_after`: seconds, `Retry-After` of rejected requests.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, RouteLimits],
+        routes: Dict[str, str],
+        pool_wait: Callable[[], float],
+        retry_after: int = 1,
+    ) -> None:
+        self.retry_after: int = retry_after
+        self._pool_wait: Callable[[], float] = pool_wait
+        self._limiters: Dict[str, _Limiter] = {
+            kind: _Limiter(kind_limits) for kind, kind_limits in limits.items()
+        }
+        self._routes: Dict[str, _Limiter] = {
+            route: self._limiters[kind] for route, kind in routes.items()
+        }
+
+    def stats(self) -> Dict[str, dict]:
+        """Counters along with the current load of each class."""
+        return {
+            kind: {
+                **asdict(limiter.stats),
+                "active": limiter.active,
+                "waiting": limiter.waiting,
+            }
+            for kind, limiter in self._limiters.items()
+        }
+
+    def limiter(self, route: str) -> Optional[_Limiter]:
+        """Limiter of the route's class, `None` if it is not controlled."""
+        return self._routes.get(route)
+
+    async def admit(self, limiter: _Limiter) -> bool:
+        """Take a slot of the class, `False` if the request has to be rejected.
+        A slot taken MUST be released.
+        """
+        if limiter.try_acquire():
+            limiter.stats.admitted += 1
+            return True
+        # Saturated, waiting would only add to the latency.
+        if self._pool_wait() > limiter.limits.max_pool_wait:
+            limiter.stats.rejected_pool_wait += 1
+            return False
+        if await limiter.acquire():
+            limiter.stats.admitted += 1
+            return True
+        return False
+
+
+def _endpoint(routes: List[BaseRoute], scope: Scope) -> Optional[Callable]:
+    """Endpoint of the route matching the request, as the router would."""
+    for route in routes:
+        match, child_scope = route.matches(scope)
+        if match != Match.FULL:
+            continue
+        if isinstance(route, Mount):
+            return _endpoint(route.routes, {**scope, **child_scope})
+        return child_scope.get("endpoint")
+    return None
+
+
+class AdmissionMiddleware:
+    """Admit requests of the controlled routes as per `AdmissionController`."""
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController) -> None:
+        self.app: ASGIApp = app
+        self.controller: AdmissionController = controller
+        self._headers: Dict[str, str] = {"Retry-After": str(controller.retry_after)}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        endpoint: Optional[Callable] = _endpoint(scope["app"].router.routes, scope)
+        limiter: Optional[_Limiter] = (
+            None
+            if endpoint is None
+            else self.controller.limiter(getattr(endpoint, "__qualname__", ""))
+        )
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        if not await self.controller.admit(limiter):
+            # Route of the rejected request, for metrics.
+            scope["endpoint"] = endpoint
+            response: JSONResponse = JSONResponse(
+                asdict(SERVICE_UNAVAILABLE),
+                status_code=int(SERVICE_UNAVAILABLE.status),
+                headers=self._headers,
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,206 @@
+"""In-process caches."""
+import sys
+import asyncio
+from array import array
+from typing import Collection, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import count
+from time import monotonic
+
+# (no. of jobs, max id, max last-modified-time) of the catalogue.
+CatalogueVersion = Tuple[int, Optional[int], Optional[int]]
+
+
+@dataclass
+class CacheStats:
+    """Counters of a cache.
+
+    * `hits`: served from cache.
+    * `misses`: served from db (cache empty, stale or catalogue too large).
+    * `refreshes`: catalogue (re)loaded into cache.
+    * `version_checks`: catalogue version compared with db.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    version_checks: int = 0
+
+
+class JobCache:
+    """Process wide cache of the job catalogue (all `Job` rows, ordered by id).
+
+    `Job` is a global table modified only through the internal api, so every
+    tenant can be served from a single copy. Cache is validated against the
+    catalogue version at most once in every `check_interval` seconds, and
+    catalogues larger than `max_jobs` are never cached (only their version is
+    remembered, so that the check is not repeated on every request).
+    """
+
+    def __init__(self, max_jobs: int, check_interval: float) -> None:
+        self.max_jobs: int = max_jobs
+        self.check_interval: float = check_interval
+        self.stats: CacheStats = CacheStats()
+        self._lock: Optional[asyncio.Lock] = None
+        self._version: Optional[CatalogueVersion] = None
+        self._jobs: Optional[List[dict]] = None
+        self._ids: List[int] = []
+        self._checked_at: float = float("-inf")
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """Single loader at a time, others wait and reuse its result."""
+        # Created lazily, so that it binds to the loop of the server (py3.9).
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @property
+    def version(self) -> Optional[CatalogueVersion]:
+        """Version of the cached catalogue, `None` if nothing is cached."""
+        return self._version
+
+    @property
+    def jobs(self) -> Optional[List[dict]]:
+        """Cached jobs ordered by id, `None` if the catalogue is too large.
+        MUST NOT be modified.
+        """
+        return self._jobs
+
+    @property
+    def ids(self) -> List[int]:
+        """Ids of cached jobs, in the same order."""
+        return self._ids
+
+    def is_fresh(self) -> bool:
+        """Whether cached catalogue can be served without checking the version."""
+        return (
+            self._version is not None
+            and monotonic() - self._checked_at < self.check_interval
+        )
+
+    def mark_checked(self) -> None:
+        """Cached catalogue is verified to be the latest."""
+        self._checked_at = monotonic()
+
+    def store(self, version: CatalogueVersion, jobs: Optional[List[dict]]) -> None:
+        """Replace cached catalogue. `jobs` is `None` if it is too large to cache."""
+        self._version = version
+        self._jobs = jobs
+        self._ids = [] if jobs is None else [job_obj["id"] for job_obj in jobs]
+        self._checked_at = monotonic()
+        if jobs is not None:
+            self.stats.refreshes += 1
+
+
+@dataclass
+class AppliedJobsStats:
+    """Counters of `AppliedJobsCache`.
+
+    * `hits`, `misses`: reads served from cache / db.
+    * `evictions`: least recently used tenants dropped to stay within bounds.
+    * `expirations`: entries found older than the ttl.
+    * `write_throughs`: cached entries updated by a write of the tenant.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    write_throughs: int = 0
+
+
+class _AppliedJobsEntry:
+    __slots__ = ("job_ids", "expires_at")
+
+    def __init__(self, job_ids: "array[int]", expires_at: float) -> None:
+        # Sorted, 8 bytes per id.
+        self.job_ids: "array[int]" = job_ids
+        self.expires_at: float = expires_at
+
+
+class AppliedJobsCache:
+    """Process wide cache of the job ids applied by each tenant.
+
+    * Bounded LRU of `max_tenants` tenants, entries expire after `ttl` seconds
+      (writes through other processes are seen after it at the latest).
+    * Ids are kept as a sorted int array (8 bytes per id).
+    * Writes of the tenant through this process update the cached entry
+      (`record_write`). A read started before a write never caches its
+      (possibly outdated) result, see `generation`.
+    """
+
+    def __init__(self, max_tenants: int, ttl: float) -> None:
+        self.max_tenants: int = max_tenants
+        self.ttl: float = ttl
+        self.stats: AppliedJobsStats = AppliedJobsStats()
+        self._entries: "OrderedDict[int, _AppliedJobsEntry]" = OrderedDict()
+        # Tenant id -> sequence no. of its last write. Tenants without a write
+        # since the last reset are at `_floor`.
+        self._generations: Dict[int, int] = {}
+        self._sequence: Iterator[int] = count(1)
+        self._floor: int = 0
+
+    def get(self, tenant_id: int) -> Optional[Set[int]]:
+        """Applied job ids of the tenant, `None` if not cached."""
+        entry: Optional[_AppliedJobsEntry] = self._entries.get(tenant_id)
+        if entry is not None and entry.expires_at <= monotonic():
+            del self._entries[tenant_id]
+            self.stats.expirations += 1
+            entry = None
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(tenant_id)
+        self.stats.hits += 1
+        return set(entry.job_ids)
+
+    def generation(self, tenant_id: int) -> int:
+        """Write generation of the tenant, to be taken before reading from db
+        and given back to `store`."""
+        return self._generations.get(tenant_id, self._floor)
+
+    def store(self, tenant_id: int, job_ids: Iterable[int], generation: int) -> None:
+        """Cache job ids read from db, unless the tenant wrote since `generation`."""
+        if self.generation(tenant_id) != generation:
+            return
+        self._entries[tenant_id] = _AppliedJobsEntry(
+            array("q", sorted(job_ids)), monotonic() + self.ttl
+        )
+        self._entries.move_to_end(tenant_id)
+        while len(self._entries) > self.max_tenants:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def record_write(
+        self,
+        tenant_id: int,
+        applied: Collection[int] = (),
+        withdrawn: Collection[int] = (),
+    ) -> None:
+        """Apply a committed write of the tenant on its cached entry."""
+        self._generations[tenant_id] = next(self._sequence)
+        if len(self._generations) > self.max_tenants:
+            # Forgotten tenants move to a new floor, reads in flight are dropped.
+            self._generations.clear()
+            self._floor = next(self._sequence)
+        entry: Optional[_AppliedJobsEntry] = self._entries.get(tenant_id)
+        if entry is None:
+            return
+        job_ids: Set[int] = set(entry.job_ids)
+        job_ids.update(applied)
+        job_ids.difference_update(withdrawn)
+        entry.job_ids = array("q", sorted(job_ids))
+        self.stats.write_throughs += 1
+
+    def memory(self) -> Dict[str, int]:
+        """Bytes used by the cached ids, in total and per cached tenant."""
+        total: int = sum(
+            sys.getsizeof(entry.job_ids) for entry in self._entries.values()
+        )
+        return {
+            "tenants": len(self._entries),
+            "bytes": total,
+            "bytes_per_tenant": total // len(self._entries) if self._entries else 0,
+        }
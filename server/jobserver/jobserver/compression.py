@@ -0,0 +1,279 @@
+"""Response compression middleware.
+
+* Negotiates brotli (`br`), zstandard (`zstd`) and `gzip` from `Accept-Encoding`.
+  brotli / zstandard are used only when their (optional) packages are installed.
+* Only compressible (json / text) bodies of at least `minimum_size` bytes are
+  compressed. Streaming responses are compressed chunk by chunk, each chunk is
+  flushed to the client as soon as it is produced.
+* Compressed bodies of responses with an `ETag` are cached (LRU, bounded by
+  entries and bytes), so an unchanged listing is compressed only once.
+"""
+import zlib
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Optional dependency, brotli is not offered without it.
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency, zstd is not offered without it.
+    zstandard = None
+
+_COMPRESSIBLE_TYPES: Tuple[str, ...] = (
+    "application/json",
+    "application/x-ndjson",
+    "text/",
+)
+# Long lived streams of small events, a compressor per connection costs more
+# memory than it saves.
+_UNCOMPRESSED_TYPES: Tuple[str, ...] = ("text/event-stream",)
+# Bodies larger than this are compressed in threadpool, not to block the loop.
+_THREADPOOL_MIN_SIZE: int = 256 * 1024
+
+
+def available_encodings() -> List[str]:
+    """Supported encodings, in the order of preference."""
+    encodings: List[str] = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate(accept_encoding: str, encodings: List[str]) -> Optional[str]:
+    """Most preferred of `encodings` accepted by the client, `None` if none."""
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality: float = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[name.strip().lower()] = quality
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+@dataclass(frozen=True)
+class CompressionLevels:
+    """Compression level of each encoding."""
+
+    gzip: int = 6
+    brotli: int = 4
+    zstd: int = 3
+
+
+@dataclass
+class CompressionStats:
+    """Counters of the middleware."""
+
+    compressed: int = 0
+    cache_hits: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+
+def compress(body: bytes, encoding: str, levels: CompressionLevels) -> bytes:
+    """Compress a whole body."""
+    if encoding == "br":
+        return brotli.compress(body, quality=levels.brotli)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=levels.zstd).compress(body)
+    compressor = zlib.compressobj(levels.gzip, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class _StreamCompressor:
+    """Incremental compressor, output of every chunk is flushed."""
+
+    def __init__(self, encoding: str, levels: CompressionLevels) -> None:
+        self._encoding: str = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=levels.brotli)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=levels.zstd).compressobj()
+        else:
+            self._compressor = zlib.compressobj(levels.gzip, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self._encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        if self._encoding == "zstd":
+            return self._compressor.compress(chunk) + self._compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+        return self._compressor.compress(chunk) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        if self._encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressedBodyCache:
+    """LRU cache of compressed bodies, keyed by `(ETag, encoding)`."""
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self._max_entries: int = max_entries
+        self._max_bytes: int = max_bytes
+        self._size: int = 0
+        self._bodies: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        body: Optional[bytes] = self._bodies.get(key)
+        if body is not None:
+            self._bodies.move_to_end(key)
+        return body
+
+    def put(self, key: Tuple[str, str], body: bytes) -> None:
+        if len(body) > self._max_bytes or key in self._bodies:
+            return
+        self._bodies[key] = body
+        self._size += len(body)
+        while len(self._bodies) > self._max_entries or self._size > self._max_bytes:
+            _, evicted = self._bodies.popitem(last=False)
+            self._size -= len(evicted)
+
+
+class CompressionMiddleware:
+    """Compress responses as per `Accept-Encoding` (see module doc)."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        levels: CompressionLevels = CompressionLevels(),
+        cache_entries: int = 128,
+        cache_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.app: ASGIApp = app
+        self.minimum_size: int = minimum_size
+        self.levels: CompressionLevels = levels
+        self.encodings: List[str] = available_encodings()
+        self.cache: CompressedBodyCache = CompressedBodyCache(
+            cache_entries, cache_bytes
+        )
+        self.stats: CompressionStats = CompressionStats()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding: Optional[str] = negotiate(
+            Headers(scope=scope).get("accept-encoding", ""), self.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _Responder(self, encoding, send).send)
+
+
+class _Responder:
+    """Compress response messages of a request, before sending them."""
+
+    def __init__(
+        self, middleware: CompressionMiddleware, encoding: str, send: Send
+    ) -> None:
+        self._middleware: CompressionMiddleware = middleware
+        self._encoding: str = encoding
+        self._send: Send = send
+        self._start: Optional[Message] = None
+        self._passthrough: bool = False
+        self._compressor: Optional[_StreamCompressor] = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Held back until the first body, headers depend on it.
+            self._start = message
+            return
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+        if self._compressor is not None:
+            await self._send_chunk(message)
+            return
+
+        headers: Headers = Headers(raw=self._start["headers"])
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if (
+            self._start["status"] != 200
+            or "content-encoding" in headers
+            or not headers.get("content-type", "").startswith(_COMPRESSIBLE_TYPES)
+            or headers.get("content-type", "").startswith(_UNCOMPRESSED_TYPES)
+            or (not more_body and len(body) < self._middleware.minimum_size)
+        ):
+            self._passthrough = True
+            await self._send(self._start)
+            await self._send(message)
+            return
+        if more_body:
+            self._compressor = _StreamCompressor(
+                self._encoding, self._middleware.levels
+            )
+            self._set_headers(None)
+            await self._send(self._start)
+            await self._send_chunk(message)
+            return
+        compressed: bytes = await self._compress(body, headers.get("etag"))
+        self._set_headers(len(compressed))
+        await self._send(self._start)
+        await self._send({"type": "http.response.body", "body": compressed})
+
+    async def _compress(self, body: bytes, etag: Optional[str]) -> bytes:
+        middleware: CompressionMiddleware = self._middleware
+        key: Tuple[str, str] = (etag, self._encoding)
+        if etag is not None:
+            cached: Optional[bytes] = middleware.cache.get(key)
+            if cached is not None:
+                middleware.stats.cache_hits += 1
+                return cached
+        if len(body) >= _THREADPOOL_MIN_SIZE:
+            compressed: bytes = await run_in_threadpool(
+                compress, body, self._encoding, middleware.levels
+            )
+        else:
+            compressed = compress(body, self._encoding, middleware.levels)
+        middleware.stats.compressed += 1
+        middleware.stats.bytes_in += len(body)
+        middleware.stats.bytes_out += len(compressed)
+        if etag is not None:
+            middleware.cache.put(key, compressed)
+        return compressed
+
+    async def _send_chunk(self, message: Message) -> None:
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        compressed: bytes = self._compressor.compress(body) if body else b""
+        if not more_body:
+            compressed += self._compressor.finish()
+        await self._send(
+            {"type": "http.response.body", "body": compressed, "more_body": more_body}
+        )
+
+    def _set_headers(self, content_length: Optional[int]) -> None:
+        headers: MutableHeaders = MutableHeaders(raw=list(self._start["headers"]))
+        headers["Content-Encoding"] = self._encoding
+        headers.add_vary_header("Accept-Encoding")
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+        self._start["headers"] = headers.raw
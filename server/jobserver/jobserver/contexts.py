@@ -1,10 +1,27 @@
 """Context implementations."""
+from typing import TYPE_CHECKING, Optional
 from dataclasses import dataclass
 from collections import namedtuple
 
 from sqlalchemy import MetaData
 
-DBConfig = namedtuple("DBConfig", "db_name host port username password")
+from jobserver.caches import AppliedJobsCache, JobCache
+
+if TYPE_CHECKING:
+    from jobserver.engines import EngineRegistry
+    from jobserver.events import JobEvents
+
+# `tenancy`: `db.TENANCY_ROLE` or `db.TENANCY_SHARED`, as the db is provisioned.
+# `replicas`: `host:port` of read replicas (same db name and credentials).
+#   Catalogue / applied jobs reads are spread over them.
+# `read_your_writes`: seconds after a tenant's write, during which its reads go
+#   to the primary. `0` to always read from replicas.
+DBConfig = namedtuple(
+    "DBConfig",
+    "db_name host port username password tenancy replicas read_your_writes",
+    defaults=("role", (), 1.0),
+)
+PoolConfig = namedtuple("PoolConfig", "size max_overflow pre_ping recycle timeout")
 
 
 @dataclass(frozen=True)
@@ -14,3 +31,13 @@ class AppContext:
     db_config: DBConfig
     table_metadata: MetaData
     debug: bool
+    engines: "EngineRegistry"
+    # Catalogue cache, disabled if `None`.
+    job_cache: Optional[JobCache] = None
+    # Applied job ids of tenants, disabled if `None`.
+    applied_jobs_cache: Optional[AppliedJobsCache] = None
+    # Push of job changes (server-sent events), disabled if `None`.
+    job_events: Optional["JobEvents"] = None
+    # Seconds the change logs of the delta sync are kept, older `since` tokens
+    # are answered with a full resync.
+    sync_retention: float = 7 * 24 * 3600
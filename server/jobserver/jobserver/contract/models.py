@@ -1,16 +1,57 @@
 """Table definitions."""
+from typing import Tuple
+
 from sqlalchemy import (
+    DDL,
+    Boolean,
     Table,
+    Index,
     Column,
     String,
+    Computed,
+    SmallInteger,
+    Text,
     MetaData,
     BigInteger,
     ForeignKey,
     UniqueConstraint,
+    event,
+    func,
 )
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+
+from jobserver.utils import tenant_id_range
 
 METADATA = MetaData()
 
+# Years of experience are parsed from the start of `expectedExperienceInYears`
+# (lower cased), the first group of the first matching pattern:
+# "5", "5 yrs" -> (5, 5), "4-7", "4 - 7 years", "4 to 7" -> (4, 7),
+# "6+" -> (6, NULL), anything else -> (NULL, NULL). Years are capped at
+# `MAX_EXPERIENCE_YEARS` (smallint). The expressions go through `text()`, where
+# ":" followed by a letter is a bind parameter, so no "(?:yrs...)" groups.
+MIN_EXPERIENCE_PATTERNS: Tuple[str, ...] = (r"^\s*([0-9]+)",)
+MAX_EXPERIENCE_PATTERNS: Tuple[str, ...] = (
+    r"^\s*[0-9]+\s*(?:-|to)\s*([0-9]+)",
+    r"^\s*([0-9]+)\s*(yrs?|years?)?\s*$",
+)
+MAX_EXPERIENCE_YEARS: int = 32767
+
+
+def _experience_years(patterns: Tuple[str, ...]) -> str:
+    """Expression of the years matched by the patterns. Values have at most 10
+    digits, they fit in a bigint before being capped.
+    """
+    matches: str = ", ".join(
+        f"substring(lower(\"expectedExperienceInYears\") from '{pattern}')"
+        for pattern in patterns
+    )
+    return (
+        f"cast(least(cast(coalesce({matches}) as bigint), {MAX_EXPERIENCE_YEARS})"
+        + " as smallint)"
+    )
+
+
 User = Table(
     "User",
     METADATA,
@@ -41,17 +82,169 @@ Job = Table(
     Column("shortJobDescription", String(1000), nullable=True),
     Column("shortCompanyDescription", String(1000), nullable=True),
     Column("fullJobDescription", String(10000), nullable=False),
+    # Full text search document, weighted by field (name > company > locations >
+    # descriptions). Generated by db, MUST NOT be selected as part of a job.
+    Column(
+        "searchVector",
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', name), 'A')"
+            " || setweight(to_tsvector('english', company), 'B')"
+            " || setweight(to_tsvector('english', coalesce(locations, '')), 'C')"
+            " || setweight(to_tsvector('english', coalesce(\"shortJobDescription\", '')"
+            " || ' ' || \"fullJobDescription\"), 'D')",
+            persisted=True,
+        ),
+    ),
+    # Columns below are parsed from the free text columns by db, to filter on them.
+    # Experience as per `MIN_EXPERIENCE_PATTERNS` / `MAX_EXPERIENCE_PATTERNS`.
+    Column(
+        "minExperienceInYears",
+        SmallInteger,
+        Computed(_experience_years(MIN_EXPERIENCE_PATTERNS), persisted=True),
+    ),
+    Column(
+        "maxExperienceInYears",
+        SmallInteger,
+        Computed(_experience_years(MAX_EXPERIENCE_PATTERNS), persisted=True),
+    ),
+    # Lower cased places, without qualifiers in brackets.
+    # "Pune,Maharashtra, Mumbai (All Areas)" -> {pune, maharashtra, mumbai}
+    Column(
+        "locationKeys",
+        ARRAY(Text),
+        Computed(
+            "regexp_split_to_array(btrim(lower(regexp_replace("
+            "coalesce(locations, ''), '\\([^)]*\\)', '', 'g'))), '\\s*[,/]\\s*')",
+            persisted=True,
+        ),
+    ),
+    Index("Job.searchVector", "searchVector", postgresql_using="gin"),
+    Index("Job.experience", "minExperienceInYears", "maxExperienceInYears"),
+    Index("Job.locationKeys", "locationKeys", postgresql_using="gin"),
+    # Jobs created / modified since a sync token.
+    Index("Job.lastModifiedTime", "lastModifiedTime"),
 )
+Index("Job.company", func.lower(Job.c.company))
 
 UserJob = Table(
     "UserJob",
     METADATA,
     Column("id", BigInteger, primary_key=True, autoincrement=False),
+    # Tenant of the row (`id >> 47`), key of the partitions when the table is
+    # hash partitioned (`InitDB(user_job_partitions=)`). Written by the app,
+    # RLS policies check it.
+    Column("tenantID", BigInteger, nullable=False),
     Column(
         "userID", BigInteger, ForeignKey("User.id", ondelete="CASCADE"), nullable=False
     ),
     Column(
         "jobID", BigInteger, ForeignKey("Job.id", ondelete="CASCADE"), nullable=False
     ),
+    # Also serves the lookups of a user's jobs (RLS limits them to the user).
+    # Partitioned layout has `("tenantID", "userID", "jobID")` instead.
     UniqueConstraint("userID", "jobID"),
+    # Cascaded deletes of jobs.
+    Index("UserJob.jobID", "jobID"),
+)
+
+# Change logs for delta syncs, written by the triggers below (not by the app).
+# Times are epoch milliseconds of the db clock.
+JobDeletion = Table(
+    "JobDeletion",
+    METADATA,
+    # Global like `Job`, no row level security.
+    Column("id", BigInteger, primary_key=True, autoincrement=True),
+    # No FK, the job doesn't exist anymore.
+    Column("jobID", BigInteger, nullable=False),
+    Column("deletedTime", BigInteger, nullable=False),
+    Index("JobDeletion.deletedTime", "deletedTime"),
+)
+
+UserJobChange = Table(
+    "UserJobChange",
+    METADATA,
+    # Same id as the `UserJob` row (tenant's id range, row level security). The
+    # row is kept, as not applied, once the relation is removed.
+    Column("id", BigInteger, primary_key=True, autoincrement=False),
+    Column("jobID", BigInteger, nullable=False),
+    Column("isApplied", Boolean, nullable=False),
+    Column("changedTime", BigInteger, nullable=False),
+    Index("UserJobChange.changedTime", "changedTime"),
+)
+
+_DB_TIME_MILLI: str = "cast(extract(epoch from clock_timestamp()) * 1000 as bigint)"
+# Statement level triggers, a bulk write is logged with a single statement.
+CHANGE_LOG_TRIGGERS: Tuple[str, ...] = (
+    """create or replace function "JobDeletion.log"() returns trigger """
+    + """language plpgsql as $$ begin """
+    + """insert into "JobDeletion"("jobID", "deletedTime") """
+    + f"""select id, {_DB_TIME_MILLI} from deleted_rows; """
+    + """return null; end $$""",
+    'drop trigger if exists "Job.deletion" on "Job"',
+    """create trigger "Job.deletion" after delete on "Job" """
+    + """referencing old table as deleted_rows for each statement """
+    + """execute function "JobDeletion.log"()""",
+    """create or replace function "UserJobChange.logApplied"() returns trigger """
+    + """language plpgsql as $$ begin """
+    + """insert into "UserJobChange"(id, "jobID", "isApplied", "changedTime") """
+    + f"""select id, "jobID", true, {_DB_TIME_MILLI} from inserted_rows; """
+    + """return null; end $$""",
+    'drop trigger if exists "UserJob.applied" on "UserJob"',
+    """create trigger "UserJob.applied" after insert on "UserJob" """
+    + """referencing new table as inserted_rows for each statement """
+    + """execute function "UserJobChange.logApplied"()""",
+    """create or replace function "UserJobChange.logWithdrawn"() returns trigger """
+    + """language plpgsql as $$ begin """
+    + """update "UserJobChange" set "isApplied" = false, """
+    + f""""changedTime" = {_DB_TIME_MILLI} """
+    + """where id in (select id from deleted_rows); """
+    + """return null; end $$""",
+    'drop trigger if exists "UserJob.withdrawn" on "UserJob"',
+    """create trigger "UserJob.withdrawn" after delete on "UserJob" """
+    + """referencing old table as deleted_rows for each statement """
+    + """execute function "UserJobChange.logWithdrawn"()""",
 )
+
+# Channel of the change notifications (`pg_notify`), sent on commit.
+CHANGE_CHANNEL: str = "jobserver_changes"
+# More ids than this don't fit in a notification (8000 bytes), `ids` is null.
+NOTIFY_MAX_IDS: int = 300
+# eg: {"table": "Job", "op": "update", "ids": [1, 2]}
+#     {"table": "UserJob", "op": "insert", "tenant": 1, "ids": [<job ids>]}
+NOTIFY_TRIGGERS: Tuple[str, ...] = (
+    """create or replace function "Job.notify"() returns trigger """
+    + """language plpgsql as $$ begin """
+    + f"""perform pg_notify('{CHANGE_CHANNEL}', cast(json_build_object("""
+    + """'table', 'Job', 'op', lower(tg_op), 'ids', """
+    + f"""case when count(*) <= {NOTIFY_MAX_IDS} then array_agg(id) end) as text)) """
+    + """from changed_rows having count(*) > 0; """
+    + """return null; end $$""",
+    """create or replace function "UserJob.notify"() returns trigger """
+    + """language plpgsql as $$ begin """
+    + f"""perform pg_notify('{CHANGE_CHANNEL}', cast(json_build_object("""
+    + """'table', 'UserJob', 'op', lower(tg_op), """
+    + f"""'tenant', id / {tenant_id_range(0)[1]}, 'ids', """
+    + f"""case when count(*) <= {NOTIFY_MAX_IDS} then array_agg("jobID") end) """
+    + """as text)) """
+    + f"""from changed_rows group by id / {tenant_id_range(0)[1]}; """
+    + """return null; end $$""",
+)
+for _table_name, _operation, _transition in (
+    ("Job", "insert", "new"),
+    ("Job", "update", "new"),
+    ("Job", "delete", "old"),
+    ("UserJob", "insert", "new"),
+    ("UserJob", "delete", "old"),
+):
+    NOTIFY_TRIGGERS += (
+        f'drop trigger if exists "{_table_name}.notify.{_operation}" '
+        + f'on "{_table_name}"',
+        f'create trigger "{_table_name}.notify.{_operation}" '
+        + f'after {_operation} on "{_table_name}" '
+        + f"referencing {_transition} table as changed_rows for each statement "
+        + f'execute function "{_table_name}.notify"()',
+    )
+
+for _statement in CHANGE_LOG_TRIGGERS + NOTIFY_TRIGGERS:
+    event.listen(METADATA, "after_create", DDL(_statement))
@@ -14,9 +14,9 @@ class Service(ABC):
         self._app_context: AppContext = app_context
 
     @abstractmethod
-    def fetch_all(self, request: Request) -> JSONResponse:
+    async def fetch_all(self, request: Request) -> JSONResponse:
         ...
 
     @abstractmethod
-    def update(self, request: Request) -> JSONResponse:
+    async def update(self, request: Request) -> JSONResponse:
         ...
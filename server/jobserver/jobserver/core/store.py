@@ -1,22 +1,28 @@
 """Store skeletion which MUST be extended by all store implementations."""
 from abc import ABC
 
-from sqlalchemy.engine.base import Engine
 from sqlalchemy import MetaData
 
-from jobserver.contexts import DBConfig
-from jobserver.db import create_engine_
+from jobserver.engines import EngineRegistry
 
 
 class Store(ABC):
-    """Store skeleton."""
-
-    def __init__(self, db_config: DBConfig, table_metadata: MetaData) -> None:
-        self._engine: Engine = create_engine_(
-            db_config.host,
-            db_config.port,
-            db_config.username,
-            db_config.password,
-            db_config.db_name,
-        ).execution_options(isolation_level="AUTOCOMMIT")
+    """Store skeleton.
+
+    NOTE: Stores are cheap to build, connections are taken from the pools owned
+          by the shared `EngineRegistry`.
+    """
+
+    def __init__(self, engines: EngineRegistry, table_metadata: MetaData) -> None:
+        self._engines: EngineRegistry = engines
+        self._table_metadata: MetaData = table_metadata
+
+
+class AsyncStore(ABC):
+    """Asyncio store skeleton. Used by request handlers, so that a database
+    round-trip never blocks the event loop.
+    """
+
+    def __init__(self, engines: EngineRegistry, table_metadata: MetaData) -> None:
+        self._engines: EngineRegistry = engines
         self._table_metadata: MetaData = table_metadata
@@ -1,22 +1,76 @@
 """Utils to initialize DB."""
-from typing import List, Optional
+import io
+import json
+import logging
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Tuple
 from datetime import datetime, timezone
+from itertools import islice
+from time import perf_counter
 
-from sqlalchemy import MetaData, create_engine, text
+from sqlalchemy import MetaData, column, create_engine, insert, table, text
 from sqlalchemy.engine.base import Engine, Connection
 from sqlalchemy.exc import DatabaseError, IntegrityError
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncTransaction,
+    create_async_engine,
+)
 
-from jobserver.utils import generate_id
+from jobserver import migrations
+from jobserver.utils import TOOL_WORKER_ID, generate_id, set_worker_id
 
 _DEFAULT_POSTFRES_DB_NAME: str = "postgres"
-_ID_TO_TENANT_ID_RSHIFT: int = 47
+# Tenancy modes.
+# * `role`: a role (with RLS policies) per tenant, `set role` per session.
+# * `shared`: a single role for all tenants, tenant is set per transaction in
+#   `migrations.TENANT_SETTING`, that the policies check.
+TENANCY_ROLE: str = "role"
+TENANCY_SHARED: str = "shared"
+SHARED_TENANT_ROLE: str = "jobserver_tenant"
+_USER_COLUMNS: Tuple[str, ...] = (
+    "id",
+    "createdTime",
+    "lastModifiedTime",
+    "name",
+    "email",
+)
+_JOB_COLUMNS: Tuple[str, ...] = (
+    "createdTime",
+    "lastModifiedTime",
+    "name",
+    "company",
+    "expectedExperienceInYears",
+    "locations",
+    "shortJobDescription",
+    "shortCompanyDescription",
+    "fullJobDescription",
+)
 
+_LOGGER = logging.getLogger(__name__)
 
-def create_engine_(
-    host: str, port: int, username: str, password: str, db_name: str
+
+def create_engine_(  # pylint: disable=too-many-arguments
+    host: str, port: int, username: str, password: str, db_name: str, **kwargs
 ) -> Engine:
-    """Create a new connection to engine."""
-    return create_engine(f"postgresql://{username}:{password}@{host}:{port}/{db_name}")
+    """Create a new connection to engine.
+    Extra keyword arguments (pool configs etc.) are passed to `create_engine`.
+    """
+    return create_engine(
+        f"postgresql://{username}:{password}@{host}:{port}/{db_name}", **kwargs
+    )
+
+
+def create_async_engine_(  # pylint: disable=too-many-arguments
+    host: str, port: int, username: str, password: str, db_name: str, **kwargs
+) -> AsyncEngine:
+    """Create a new asyncio engine (asyncpg driver).
+    Extra keyword arguments (pool configs etc.) are passed to `create_async_engine`.
+    """
+    return create_async_engine(
+        f"postgresql+asyncpg://{username}:{password}@{host}:{port}/{db_name}",
+        **kwargs,
+    )
 
 
 class InitDB:
@@ -26,6 +80,11 @@ class InitDB:
     * Create users with given ids.
     * Create row level policy for the users on tables where `id` doesnt have
       autoincrement.
+    * `tenancy`: `TENANCY_ROLE` (role per tenant) or `TENANCY_SHARED` (a role
+      shared by all tenants).
+    * `user_job_partitions`: `UserJob` is created hash partitioned on its tenant
+      (`tenantID`) in as many partitions, `0` for a single table. Policies
+      check `tenantID` in both layouts, roles are created the same way.
     """
 
     def __init__(  # pylint: disable=too-many-arguments
@@ -37,7 +96,13 @@ class InitDB:
         username: str,
         password: str,
         tenant_ids: List[int],
+        tenancy: str = TENANCY_ROLE,
+        user_job_partitions: int = 0,
     ) -> None:
+        if tenancy not in (TENANCY_ROLE, TENANCY_SHARED):
+            raise ValueError(f"Unknown tenancy {tenancy}")
+        if user_job_partitions < 0:
+            raise ValueError(f"Invalid no. of partitions {user_job_partitions}")
         self._db_name: str = db_name
         self._host: str = host
         self._port: int = port
@@ -45,6 +110,8 @@ class InitDB:
         self._password: str = password
         self._metadata: MetaData = metadata
         self._tenant_ids: List[int] = tenant_ids
+        self._tenancy: str = tenancy
+        self._user_job_partitions: int = user_job_partitions
 
     def create_engine(self, db_name: Optional[str] = None) -> Engine:
         """Create a new engine with given configs.
@@ -69,7 +136,10 @@ class InitDB:
     def create_db(self) -> None:
         """Create all tables in the metadata.
         * Create database with given name.
-        * Create all tables in db.
+        * Create all tables in db, along with their indexes (eg: GIN index for
+          job search).
+        * Partition `UserJob`, if `user_job_partitions` is given.
+        * Stamp db with the latest migration, schema is already up to date.
         """
         default_engine: Engine = self.create_engine().execution_options(
             isolation_level="AUTOCOMMIT"
@@ -80,9 +150,56 @@ class InitDB:
             conn.execute(text(f"create database {self._db_name}"))
             curr_engine: Engine = self.create_engine(db_name=self._db_name)
             self._metadata.create_all(curr_engine)
+            with curr_engine.begin() as curr_conn:
+                if self._user_job_partitions:
+                    for statement in migrations.partition_user_job(
+                        curr_conn, self._user_job_partitions
+                    ):
+                        curr_conn.execute(text(statement))
+                migrations.create_version_table(curr_conn)
+                for migration in migrations.MIGRATIONS:
+                    migrations.record(curr_conn, migration)
             curr_engine.dispose()
         default_engine.dispose()
 
+    def migrate(self) -> List[int]:
+        """Upgrade schema of an existing database.
+        Apply pending migrations in order, each in a transaction. Return the
+        versions applied.
+        """
+        engine: Engine = self.create_engine(db_name=self._db_name)
+        applied: List[int] = []
+
+        with engine.connect() as conn:
+            migrations.create_version_table(conn)
+            current_version: int = migrations.current_version(conn)
+            conn.commit()
+            for migration in migrations.MIGRATIONS:
+                if migration.version <= current_version:
+                    continue
+                with conn.begin():
+                    migrations.apply(conn, self._metadata, migration)
+                applied.append(migration.version)
+        engine.dispose()
+        return applied
+
+    def partition_user_job(self) -> None:
+        """Convert `UserJob` of an existing database to `user_job_partitions`
+        hash partitions, in a transaction. Rows, triggers and the policies of
+        existing roles are kept, writes of `UserJob` wait till it is done.
+        Database MUST be migrated first (`migrate`).
+        """
+        if not self._user_job_partitions:
+            raise ValueError("No. of partitions (user_job_partitions) is not given")
+        engine: Engine = self.create_engine(db_name=self._db_name)
+
+        with engine.begin() as conn:
+            for statement in migrations.partition_user_job(
+                conn, self._user_job_partitions
+            ):
+                conn.execute(text(statement))
+        engine.dispose()
+
     def drop_db(self) -> None:
         """Drop database."""
         engine: Engine = self.create_engine().execution_options(
@@ -92,10 +209,29 @@ class InitDB:
             conn.execute(text(f"drop database {self._db_name}"))
         engine.dispose()
 
-    def create_roles(self) -> None:
-        """Create roles for all given tenants."""
-        for tenant_id in self._tenant_ids:
-            self.create_role(tenant_id)
+    def create_roles(self, batch_size: int = 500) -> None:
+        """Create roles for all given tenants.
+
+        * Role tenancy: a role, and a policy on every RLS table, for each tenant.
+          Roles of `batch_size` tenants are created in one transaction (and one
+          round-trip).
+        * Shared tenancy: the shared role and its policies (re-created if exists).
+          A tenant needs nothing more than its user.
+        """
+        engine: Engine = self.create_engine(self._db_name)
+
+        with engine.connect() as conn:
+            if self._tenancy == TENANCY_SHARED:
+                with conn.begin():
+                    conn.execute(text(";\n".join(self._shared_role_statements())))
+            else:
+                for start in range(0, len(self._tenant_ids), batch_size):
+                    statements: List[str] = self._enable_rls_statements()
+                    for tenant_id in self._tenant_ids[start : start + batch_size]:
+                        statements.extend(self._role_statements(tenant_id))
+                    with conn.begin():
+                        conn.execute(text(";\n".join(statements)))
+        engine.dispose()
 
     def create_role(self, tenant_id: int) -> str:
         """Create role and configs for tenant.
@@ -103,44 +239,93 @@ class InitDB:
         * Create the RLS policy for the role for all tables in <database>.
         """
         engine: Engine = self.create_engine(self._db_name)
+        statements: List[str] = self._enable_rls_statements()
+        statements.extend(self._role_statements(tenant_id))
 
-        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
-            role_name: str = f"tenant_{tenant_id}"
-            # Create role.
-            conn.execute(text(f"create role {role_name}"))
-            for table_name in self._metadata.tables:
-                # No need to create RLS policy for tables with autoincrement id.
-                if (
-                    self._metadata.tables[table_name].columns["id"].autoincrement
-                    is True
-                ):
-                    continue
-                # Enable row level security for table.
-                conn.execute(
-                    text(f"""alter table "{table_name}" enable row level security""")
-                )
-                # Grant privielges on table for the role.
-                conn.execute(
-                    text(
-                        """grant all privileges on table """
-                        + f""""{table_name}" to {role_name}"""
-                    )
-                )
-                # Create RLS policy for the role on the table.
-                conn.execute(
-                    text(
-                        f"""create policy "{table_name}.{role_name}" """
-                        + f"""on "{table_name}" as permissive for all to {role_name} """
-                        + f"""using (id >> {_ID_TO_TENANT_ID_RSHIFT} = {tenant_id})"""
-                    )
-                )
+        with engine.connect() as conn:
+            with conn.begin():
+                conn.execute(text(";\n".join(statements)))
         engine.dispose()
-        return role_name
+        return f"tenant_{tenant_id}"
+
+    def _rls_table_names(self) -> List[str]:
+        # No need to create RLS policy for tables with autoincrement id.
+        return [
+            table_name
+            for table_name, table in self._metadata.tables.items()
+            if table.columns["id"].autoincrement is not True
+        ]
+
+    def _tenant_column(self, table_name: str) -> bool:
+        return "tenantID" in self._metadata.tables[table_name].columns
+
+    def _enable_rls_statements(self) -> List[str]:
+        return [
+            f"""alter table "{table_name}" enable row level security"""
+            for table_name in self._rls_table_names()
+        ]
+
+    def _role_statements(self, tenant_id: int) -> List[str]:
+        """Create tenant's role, grant privileges and create its RLS policies.
+        Policy condition is a range on `id`, served by the primary key index
+        (and the tenant, on tables with a `tenantID` column).
+        """
+        role_name: str = f"tenant_{tenant_id}"
+        statements: List[str] = [f"create role {role_name}"]
+        for table_name in self._rls_table_names():
+            statements.append(
+                f"""grant all privileges on table "{table_name}" to {role_name}"""
+            )
+            statements.append(
+                f"""create policy "{table_name}.{role_name}" """
+                + f"""on "{table_name}" as permissive for all to {role_name} """
+                + "using ("
+                + migrations.tenant_policy_condition(
+                    tenant_id, self._tenant_column(table_name)
+                )
+                + ")"
+            )
+        return statements
+
+    def _shared_role_statements(self) -> List[str]:
+        role_name: str = SHARED_TENANT_ROLE
+        # Roles are global, it may exist already for another database.
+        statements: List[str] = [
+            f"""do $$ begin create role {role_name}; """
+            + """exception when duplicate_object then null; end $$"""
+        ]
+        statements.extend(self._enable_rls_statements())
+        for table_name in self._rls_table_names():
+            statements.append(
+                f"""grant all privileges on table "{table_name}" to {role_name}"""
+            )
+            statements.append(
+                f"""drop policy if exists "{table_name}.{role_name}" """
+                + f'on "{table_name}"'
+            )
+            statements.append(
+                f"""create policy "{table_name}.{role_name}" """
+                + f"""on "{table_name}" as permissive for all to {role_name} """
+                + "using ("
+                + migrations.shared_policy_condition(self._tenant_column(table_name))
+                + ")"
+            )
+        return statements
 
     def drop_roles(self) -> None:
-        """Drop all roles."""
-        for tenant_id in self._tenant_ids:
-            self.drop_role(tenant_id)
+        """Drop all roles (the shared role in shared tenancy), on a single
+        connection.
+        """
+        engine: Engine = self.create_engine().execution_options(
+            isolation_level="AUTOCOMMIT"
+        )
+        with engine.connect() as conn:
+            if self._tenancy == TENANCY_SHARED:
+                conn.execute(text(f"drop role if exists {SHARED_TENANT_ROLE}"))
+            else:
+                for tenant_id in self._tenant_ids:
+                    conn.execute(text(f"drop role tenant_{tenant_id}"))
+        engine.dispose()
 
     def drop_role(self, tenant_id: int) -> None:
         """Drop the given role.
@@ -155,62 +340,264 @@ class InitDB:
 
 
 class InitData:
-    """Initial data loader."""
+    """Initial data loader.
 
-    def __init__(
+    * `users`, `jobs` can be any iterable of records, eg: `read_records(path)`
+      to stream them from a file.
+    * Records are written in batches of `batch_size`, with `copy from stdin`
+      (`method="copy"`) or a parameterized multi-row insert (`method="insert"`).
+    * `progress(table name, rows loaded, seconds elapsed)` is called after
+      every batch, progress is logged by default.
+    * `worker_id`: of the process (user ids), `TOOL_WORKER_ID` by default. Give
+      distinct ones to loaders running at the same time.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
         self,
-        users: List[dict],
-        jobs: List[dict],
+        users: Iterable[dict],
+        jobs: Iterable[dict],
         db_name: str,
         host: str,
         port: int,
         username: str,
         password: str,
+        batch_size: int = 5000,
+        method: str = "copy",
+        progress: Optional[Callable[[str, int, float], None]] = None,
+        worker_id: int = TOOL_WORKER_ID,
     ) -> None:
-        self._users: List[dict] = users
-        self._jobs: List[dict] = jobs
+        if method not in ("copy", "insert"):
+            raise ValueError(f"Unknown load method {method}")
+        self._users: Iterable[dict] = users
+        self._jobs: Iterable[dict] = jobs
         self._engine: Engine = create_engine_(
             host, port, username, password, db_name
         ).execution_options(isolation_level="AUTOCOMMIT")
+        self._batch_size: int = batch_size
+        self._method: str = method
+        self._progress: Callable[[str, int, float], None] = progress or _log_progress
+        self._worker_id: int = worker_id
 
-    def create_users(self) -> None:
-        """Create provided users."""
+    def create_users(self) -> int:
+        """Create provided users. Return no. of users created."""
         curr_time_milli: int = int(datetime.now(timezone.utc).timestamp() * 1000)
+        set_worker_id(self._worker_id)
 
-        with self._engine.connect() as conn:
-            for user_obj in self._users:
-                conn.execute(
-                    text(
-                        """INSERT INTO "User"(id, "createdTime", "lastModifiedTime", name, email)"""
-                        + f"""VALUES ({generate_id(user_obj["id"])}, {curr_time_milli}, {curr_time_milli}, '{user_obj["name"]}', '{user_obj["email"]}')"""
-                    )
-                )
+        return self._load(
+            "User",
+            _USER_COLUMNS,
+            (
+                {
+                    "id": generate_id(user_obj["id"]),
+                    "createdTime": curr_time_milli,
+                    "lastModifiedTime": curr_time_milli,
+                    "name": user_obj["name"],
+                    "email": user_obj["email"],
+                }
+                for user_obj in self._users
+            ),
+        )
 
-    def create_jobs(self) -> None:
-        """Create provided jobs."""
+    def create_jobs(self) -> int:
+        """Create provided jobs. Return no. of jobs created."""
         curr_time_milli: int = int(datetime.now(timezone.utc).timestamp() * 1000)
 
+        return self._load(
+            "Job",
+            _JOB_COLUMNS,
+            (
+                {
+                    "createdTime": curr_time_milli,
+                    "lastModifiedTime": curr_time_milli,
+                    **{column: job_obj.get(column) for column in _JOB_COLUMNS[2:]},
+                }
+                for job_obj in self._jobs
+            ),
+        )
+
+    def _load(
+        self, table_name: str, columns: Tuple[str, ...], rows: Iterable[dict]
+    ) -> int:
+        loaded: int = 0
+        started: float = perf_counter()
+        stmt = insert(table(table_name, *(column(name) for name in columns)))
+
         with self._engine.connect() as conn:
-            for job_obj in self._jobs:
-                conn.execute(
-                    text(
-                        """INSERT INTO "Job"("createdTime", "lastModifiedTime", name, company, "expectedExperienceInYears", locations, "shortJobDescription", "shortCompanyDescription", "fullJobDescription")"""
-                        + f"""VALUES ({curr_time_milli}, {curr_time_milli}, '{job_obj["name"]}', '{job_obj["company"]}', '{job_obj["expectedExperienceInYears"]}', '{job_obj["locations"]}', '{job_obj["shortJobDescription"]}', '{job_obj["shortCompanyDescription"]}', '{job_obj["fullJobDescription"]}')"""
-                    )
-                )
+            for batch in _batches(rows, self._batch_size):
+                if self._method == "copy":
+                    _copy(conn, table_name, columns, batch)
+                else:
+                    conn.execute(stmt, batch)
+                loaded += len(batch)
+                self._progress(table_name, loaded, perf_counter() - started)
+        return loaded
+
+
+def read_records(path: str, key: Optional[str] = None) -> Iterator[dict]:
+    """Read records from a file.
+
+    * `.ndjson`/`.jsonl`: one record per line, read line by line.
+    * `.json` with a list of records at top level: read incrementally.
+    * `.json` with the list under `key` of an object (eg: `tests/jobs.json`):
+      loaded at once.
+    """
+    with open(path, "r", encoding="utf-8") as source:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+        elif key is not None:
+            yield from json.load(source)[key]
+        else:
+            yield from _read_json_array(source)
+
+
+def _read_json_array(source: TextIO, chunk_size: int = 64 * 1024) -> Iterator[dict]:
+    """Decode items of a top level json array, without loading whole file."""
+    decoder: json.JSONDecoder = json.JSONDecoder()
+    buffer: str = source.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a json array")
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(","):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # Record is split across chunks.
+            chunk: str = source.read(chunk_size)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+
+
+def _batches(rows: Iterable[dict], batch_size: int) -> Iterator[List[dict]]:
+    iterator: Iterator[dict] = iter(rows)
+    while True:
+        batch: List[dict] = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _copy(
+    conn: Connection, table_name: str, columns: Tuple[str, ...], batch: List[dict]
+) -> None:
+    """Write rows with `copy from stdin` (text format)."""
+    buffer: io.StringIO = io.StringIO()
+    for row in batch:
+        buffer.write("\t".join(_copy_value(row[name]) for name in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    column_names: str = ", ".join(f'"{name}"' for name in columns)
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(f'copy "{table_name}"({column_names}) from stdin', buffer)
+
+
+def _copy_value(value: object) -> str:
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _log_progress(table_name: str, loaded: int, elapsed: float) -> None:
+    _LOGGER.info(
+        "%s: %d rows loaded (%.0f rows/s)", table_name, loaded, loaded / elapsed
+    )
+
+
+# Role and tenant of shared tenancy, in one round-trip (`set_config` is `set`).
+_SET_SHARED_TENANT = text(
+    f"select set_config('role', '{SHARED_TENANT_ROLE}', false), "
+    + f"set_config('{migrations.TENANT_SETTING}', :tenant_id, false)"
+)
+_SET_LOCAL_SHARED_TENANT = text(
+    f"select set_config('role', '{SHARED_TENANT_ROLE}', true), "
+    + f"set_config('{migrations.TENANT_SETTING}', :tenant_id, true)"
+)
 
 
 class DBSession:
     """Manage a db session."""
 
-    def __init__(self, conn: Connection, tenant_id: int) -> None:
+    def __init__(
+        self, conn: Connection, tenant_id: int, tenancy: str = TENANCY_ROLE
+    ) -> None:
         self._conn: Connection = conn
         self._tenant_id: int = tenant_id
+        self._tenancy: str = tenancy
 
     def open(self) -> None:
         """Set schema and role"""
-        self._conn.execute(text(f"set role tenant_{self._tenant_id}"))
+        if self._tenancy == TENANCY_SHARED:
+            self._conn.execute(_SET_SHARED_TENANT, {"tenant_id": str(self._tenant_id)})
+        else:
+            self._conn.execute(text(f"set role tenant_{self._tenant_id}"))
 
     def close(self) -> None:
         """Reset schema and role"""
         self._conn.execute(text("reset role"))
+        if self._tenancy == TENANCY_SHARED:
+            self._conn.execute(text(f"reset {migrations.TENANT_SETTING}"))
+
+
+class AsyncDBSession:
+    """Tenant scoped unit of work on an asyncio connection.
+
+    Statements of the block run in a single transaction as the tenant's role
+    (or as the shared role, for the tenant, in shared tenancy). The role is set
+    with `set local`, it ends with the transaction, so there is no `reset role`
+    round-trip and an error can never leak the role to the next user of the
+    pooled connection.
+
+    eg:
+        async with AsyncDBSession(conn, tenant_id):
+            await conn.execute(stmt)
+    """
+
+    def __init__(
+        self, conn: AsyncConnection, tenant_id: int, tenancy: str = TENANCY_ROLE
+    ) -> None:
+        self._conn: AsyncConnection = conn
+        self._tenant_id: int = tenant_id
+        self._tenancy: str = tenancy
+        self._transaction: Optional[AsyncTransaction] = None
+
+    async def __aenter__(self) -> AsyncConnection:
+        """Begin transaction and set role."""
+        # Pooled connections are in autocommit, which never opens a transaction.
+        await self._conn.execution_options(isolation_level="READ COMMITTED")
+        self._transaction = await self._conn.begin()
+        try:
+            if self._tenancy == TENANCY_SHARED:
+                await self._conn.execute(
+                    _SET_LOCAL_SHARED_TENANT, {"tenant_id": str(self._tenant_id)}
+                )
+            else:
+                await self._conn.execute(
+                    text(f"set local role tenant_{self._tenant_id}")
+                )
+        except BaseException:
+            await self._transaction.rollback()
+            raise
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        """Commit, or rollback on error. Role is reset along with it."""
+        if exc_type is None:
+            await self._transaction.commit()
+        else:
+            await self._transaction.rollback()
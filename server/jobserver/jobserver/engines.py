@@ -0,0 +1,403 @@
+"""Engine registry. Owns the connection pools shared by all stores of a process."""
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+from dataclasses import dataclass, asdict
+from itertools import count
+from threading import Lock
+from time import monotonic, perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine.base import Engine, Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from jobserver.contexts import DBConfig, PoolConfig
+from jobserver.db import create_async_engine_, create_engine_
+from jobserver.metrics import POOL_WAIT_SECONDS, Metrics
+
+PRIMARY: str = "primary"
+REPLICA_PREFIX: str = "replica-"
+_ASYNC_SUFFIX: str = ".async"
+# Seconds for which a replica that failed to connect is not used.
+_REPLICA_RETRY_INTERVAL: float = 5.0
+# Recent writes are pruned of expired ones beyond these many tenants.
+_MAX_RECENT_WRITES: int = 10000
+# Seconds in which the recent pool wait decays to half.
+_WAIT_HALF_LIFE: float = 1.0
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolStats:
+    """Counters collected from pool events of an engine.
+
+    `waiting`: acquires of a connection in progress (asyncio engines).
+    """
+
+    connects: int = 0
+    checkouts: int = 0
+    checkins: int = 0
+    invalidations: int = 0
+    waits: int = 0
+    connect_failures: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+    waiting: int = 0
+
+    def __post_init__(self) -> None:
+        self._lock: Lock = Lock()
+        # Peak of the recent waits, and when it was recorded.
+        self._peak_wait: float = 0.0
+        self._peak_at: float = 0.0
+        # Waiter -> time it started waiting.
+        self._waiters: Dict[int, float] = {}
+        self._next_waiter: Iterator[int] = count()
+
+    def increment(self, counter: str) -> None:
+        """Add one to a counter (eg: `checkouts`). Pool events of sync engines
+        come from many threads.
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, seconds: float) -> None:
+        """Record the time taken to acquire a connection from the pool."""
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            now: float = perf_counter()
+            if seconds >= self._decayed_peak(now):
+                self._peak_wait, self._peak_at = seconds, now
+
+    def begin_wait(self, started: float) -> int:
+        """Record the start of an acquire, return its waiter id."""
+        with self._lock:
+            waiter: int = next(self._next_waiter)
+            self._waiters[waiter] = started
+            self.waiting = len(self._waiters)
+        return waiter
+
+    def end_wait(self, waiter: int) -> None:
+        """Record the end of an acquire (connection or error). Idempotent."""
+        with self._lock:
+            self._waiters.pop(waiter, None)
+            self.waiting = len(self._waiters)
+
+    def current_wait(self) -> float:
+        """Seconds to acquire a connection now, the longest ongoing wait or
+        the recent waits (their peak, decaying), whichever is larger.
+        """
+        with self._lock:
+            now: float = perf_counter()
+            ongoing: float = now - min(self._waiters.values()) if self._waiters else 0.0
+            return max(ongoing, self._decayed_peak(now))
+
+    def _decayed_peak(self, now: float) -> float:
+        return self._peak_wait * 0.5 ** ((now - self._peak_at) / _WAIT_HALF_LIFE)
+
+
+class EngineRegistry:
+    """Process wide registry of engines.
+
+    * Engines are created once in `start` (server startup) and disposed in
+      `dispose` (server shutdown).
+    * Stores MUST acquire connections through the registry, so that a single
+      pool is shared by every request of the process.
+    * Every database has a sync engine (scripts, sync stores) and an asyncio
+      engine (request handlers), each having its own pool.
+    * Given `metrics`, latency of queries and pool waits are recorded in it.
+    * Read replicas of `db_config` are registered as `replica-<index>`. Reads
+      that tolerate lag use `connect_read` / `connect_read_async`, which
+      spread them over replicas (round robin) and fall back to the primary.
+    """
+
+    def __init__(
+        self,
+        db_config: DBConfig,
+        pool_config: PoolConfig,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        self._db_config: DBConfig = db_config
+        self._pool_config: PoolConfig = pool_config
+        self._metrics: Optional[Metrics] = metrics
+        self._engines: Dict[str, Engine] = {}
+        self._async_engines: Dict[str, AsyncEngine] = {}
+        self._stats: Dict[str, PoolStats] = {}
+        self._replicas: List[str] = []
+        self._next_replica: Iterator[int] = count()
+        # Replica name -> monotonic time until which it is not used.
+        self._down_until: Dict[str, float] = {}
+        # Tenant id -> monotonic time until which its reads go to primary.
+        self._recent_writes: Dict[int, float] = {}
+
+    @property
+    def tenancy(self) -> str:
+        """Tenancy mode of the databases."""
+        return self._db_config.tenancy
+
+    @property
+    def pool_config(self) -> PoolConfig:
+        """Configs of the pool of each database."""
+        return self._pool_config
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        """Metrics of the process, `None` if disabled."""
+        return self._metrics
+
+    def start(self) -> None:
+        """Create all engines."""
+        if PRIMARY in self._engines:
+            return
+        self._register(PRIMARY, self._create_engine(self._db_config))
+        self._register_async(PRIMARY, self._create_async_engine(self._db_config))
+        for index, replica in enumerate(self._db_config.replicas):
+            host, _, port = replica.rpartition(":")
+            replica_config: DBConfig = self._db_config._replace(
+                host=host, port=int(port)
+            )
+            name: str = f"{REPLICA_PREFIX}{index}"
+            self._register(name, self._create_engine(replica_config))
+            self._register_async(name, self._create_async_engine(replica_config))
+            self._replicas.append(name)
+
+    async def dispose(self) -> None:
+        """Close all pooled connections and forget the engines."""
+        for engine in self._engines.values():
+            engine.dispose()
+        for async_engine in self._async_engines.values():
+            await async_engine.dispose()
+        self._engines.clear()
+        self._async_engines.clear()
+        self._replicas.clear()
+
+    def get(self, name: str = PRIMARY) -> Engine:
+        """Get engine registered in the given name."""
+        try:
+            return self._engines[name]
+        except KeyError as exc:
+            raise RuntimeError(
+                f"Engine '{name}' is not started, call `start` on server startup."
+            ) from exc
+
+    def get_async(self, name: str = PRIMARY) -> AsyncEngine:
+        """Get asyncio engine registered in the given name."""
+        try:
+            return self._async_engines[name]
+        except KeyError as exc:
+            raise RuntimeError(
+                f"Engine '{name}' is not started, call `start` on server startup."
+            ) from exc
+
+    @contextmanager
+    def connect(self, name: str = PRIMARY) -> Iterator[Connection]:
+        """Acquire a pooled connection, recording the time spent waiting for it."""
+        engine: Engine = self.get(name)
+        started: float = perf_counter()
+        with engine.connect() as conn:
+            self._record_wait(name, perf_counter() - started)
+            yield conn
+
+    @asynccontextmanager
+    async def connect_async(
+        self, name: str = PRIMARY
+    ) -> AsyncIterator[AsyncConnection]:
+        """Acquire a pooled asyncio connection, recording the time spent waiting."""
+        async_engine: AsyncEngine = self.get_async(name)
+        stats: PoolStats = self._stats[name + _ASYNC_SUFFIX]
+        started: float = perf_counter()
+        waiter: int = stats.begin_wait(started)
+        try:
+            async with async_engine.connect() as conn:
+                stats.end_wait(waiter)
+                self._record_wait(name + _ASYNC_SUFFIX, perf_counter() - started)
+                yield conn
+        finally:
+            stats.end_wait(waiter)
+
+    @contextmanager
+    def connect_read(self, tenant_id: Optional[int] = None) -> Iterator[Connection]:
+        """Acquire a connection for a read that tolerates replication lag.
+        See `connect_read_async`.
+        """
+        with ExitStack() as stack:
+            for name in self._read_candidates(tenant_id):
+                try:
+                    conn: Connection = stack.enter_context(self.connect(name))
+                    break
+                except (DBAPIError, OSError):
+                    if name == PRIMARY:
+                        raise
+                    self._mark_down(name, name)
+            yield conn
+
+    @asynccontextmanager
+    async def connect_read_async(
+        self, tenant_id: Optional[int] = None
+    ) -> AsyncIterator[AsyncConnection]:
+        """Acquire an asyncio connection for a read that tolerates replication lag.
+
+        * A replica is picked round robin, primary if there is no replica.
+        * Reads of a tenant (`tenant_id`) go to the primary for
+          `DBConfig.read_your_writes` seconds after its write (`record_write`).
+        * A replica failing to connect is skipped for a while, the next one
+          (or the primary) is used instead.
+        """
+        async with AsyncExitStack() as stack:
+            for name in self._read_candidates(tenant_id):
+                try:
+                    conn: AsyncConnection = await stack.enter_async_context(
+                        self.connect_async(name)
+                    )
+                    break
+                except (DBAPIError, OSError, asyncio.TimeoutError):
+                    if name == PRIMARY:
+                        raise
+                    self._mark_down(name, name + _ASYNC_SUFFIX)
+            yield conn
+
+    def record_write(self, tenant_id: int) -> None:
+        """Record a committed write of the tenant, for read-your-writes."""
+        if not self._replicas or self._db_config.read_your_writes <= 0:
+            return
+        now: float = monotonic()
+        if len(self._recent_writes) >= _MAX_RECENT_WRITES:
+            self._recent_writes = {
+                key: until for key, until in self._recent_writes.items() if until > now
+            }
+        self._recent_writes[tenant_id] = now + self._db_config.read_your_writes
+
+    def _read_candidates(self, tenant_id: Optional[int]) -> List[str]:
+        """Engines to try for a read, in order. Primary is always the last."""
+        if not self._replicas or (
+            tenant_id is not None
+            and self._recent_writes.get(tenant_id, 0.0) > monotonic()
+        ):
+            return [PRIMARY]
+        now: float = monotonic()
+        start: int = next(self._next_replica) % len(self._replicas)
+        rotated: List[str] = self._replicas[start:] + self._replicas[:start]
+        return [name for name in rotated if self._down_until.get(name, 0.0) <= now] + [
+            PRIMARY
+        ]
+
+    def _mark_down(self, name: str, stats_name: str) -> None:
+        _LOGGER.warning(
+            "Replica '%s' failed to connect, reading from others for %ss.",
+            name,
+            _REPLICA_RETRY_INTERVAL,
+        )
+        self._stats[stats_name].increment("connect_failures")
+        self._down_until[name] = monotonic() + _REPLICA_RETRY_INTERVAL
+
+    def _record_wait(self, name: str, seconds: float) -> None:
+        self._stats[name].record_wait(seconds)
+        if self._metrics is not None:
+            self._metrics.observe(POOL_WAIT_SECONDS, (("engine", name),), seconds)
+
+    def pool_wait(self) -> float:
+        """Seconds requests wait for a connection now, the worst of the asyncio
+        pools (see `PoolStats.current_wait`). Signal of db saturation.
+        """
+        return max(
+            (
+                self._stats[name + _ASYNC_SUFFIX].current_wait()
+                for name in self._async_engines
+            ),
+            default=0.0,
+        )
+
+    def stats(self) -> Dict[str, dict]:
+        """Pool counters along with the current pool status for each engine."""
+        engines: Dict[str, Engine] = dict(self._engines)
+        for name, async_engine in self._async_engines.items():
+            engines[name + _ASYNC_SUFFIX] = async_engine.sync_engine
+        result: Dict[str, dict] = {}
+        for name, engine in engines.items():
+            pool_stats: dict = asdict(self._stats[name])
+            pool_stats.update(
+                size=engine.pool.size(),
+                checked_in=engine.pool.checkedin(),
+                checked_out=engine.pool.checkedout(),
+                overflow=engine.pool.overflow(),
+            )
+            result[name] = pool_stats
+        return result
+
+    def _engine_options(self) -> dict:
+        return {
+            "isolation_level": "AUTOCOMMIT",
+            "pool_size": self._pool_config.size,
+            "max_overflow": self._pool_config.max_overflow,
+            "pool_pre_ping": self._pool_config.pre_ping,
+            "pool_recycle": self._pool_config.recycle,
+            "pool_timeout": self._pool_config.timeout,
+        }
+
+    def _create_engine(self, db_config: DBConfig) -> Engine:
+        return create_engine_(
+            db_config.host,
+            db_config.port,
+            db_config.username,
+            db_config.password,
+            db_config.db_name,
+            **self._engine_options(),
+        )
+
+    def _create_async_engine(self, db_config: DBConfig) -> AsyncEngine:
+        return create_async_engine_(
+            db_config.host,
+            db_config.port,
+            db_config.username,
+            db_config.password,
+            db_config.db_name,
+            **self._engine_options(),
+        )
+
+    def _register_async(self, name: str, async_engine: AsyncEngine) -> None:
+        # Pool events are only available on the underlying sync engine.
+        self._listen(name + _ASYNC_SUFFIX, async_engine.sync_engine)
+        self._async_engines[name] = async_engine
+
+    def _register(self, name: str, engine: Engine) -> None:
+        self._listen(name, engine)
+        self._engines[name] = engine
+
+    def _listen(self, name: str, engine: Engine) -> None:
+        pool_stats: PoolStats = self._stats.setdefault(name, PoolStats())
+
+        def _on_connect(*_) -> None:
+            pool_stats.increment("connects")
+
+        def _on_checkout(*_) -> None:
+            pool_stats.increment("checkouts")
+
+        def _on_checkin(*_) -> None:
+            pool_stats.increment("checkins")
+
+        def _on_invalidate(*_) -> None:
+            pool_stats.increment("invalidations")
+
+        event.listen(engine, "connect", _on_connect)
+        event.listen(engine, "checkout", _on_checkout)
+        event.listen(engine, "checkin", _on_checkin)
+        event.listen(engine, "invalidate", _on_invalidate)
+        if self._metrics is not None:
+            self._listen_queries(name, engine, self._metrics)
+
+    @staticmethod
+    def _listen_queries(name: str, engine: Engine, metrics: Metrics) -> None:
+        # A connection executes one query at a time, failed ones are overwritten.
+        def _before_execute(conn: Connection, *_) -> None:
+            conn.info["query_started"] = perf_counter()
+
+        def _after_execute(conn: Connection, cursor, statement: str, *_) -> None:
+            metrics.record_query(
+                name, statement, perf_counter() - conn.info["query_started"]
+            )
+
+        event.listen(engine, "before_cursor_execute", _before_execute)
+        event.listen(engine, "after_cursor_execute", _after_execute)
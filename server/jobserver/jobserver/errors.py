@@ -29,3 +29,27 @@ INVALID_ID = Error(
     title="Invalid id value",
     detail="Given id does not exists.",
 )
+INVALID_QUERY_PARAM = Error(
+    status=str(HTTPStatus.BAD_REQUEST.value),
+    code="4",
+    title="Invalid query parameter",
+    detail="One or more query parameters have an invalid value.",
+)
+INVALID_REQUEST_BODY = Error(
+    status=str(HTTPStatus.BAD_REQUEST.value),
+    code="5",
+    title="Invalid request body",
+    detail="The request body is not in the expected format.",
+)
+SERVICE_UNAVAILABLE = Error(
+    status=str(HTTPStatus.SERVICE_UNAVAILABLE.value),
+    code="6",
+    title="Service unavailable",
+    detail="The server can't serve the request now, retry later.",
+)
+SYNC_TOKEN_EXPIRED = Error(
+    status=str(HTTPStatus.GONE.value),
+    code="7",
+    title="Sync token expired",
+    detail="Changes after the given token are no longer kept, sync with since=0.",
+)
@@ -0,0 +1,252 @@
+"""Push of job changes to clients (server-sent events).
+
+One listener connection per process (`LISTEN` on `CHANGE_CHANNEL`) receives
+the notifications of the `Job` / `UserJob` triggers. Each one is encoded once
+and fanned out to the subscribers, job changes to all of them and applied job
+changes to the tenant's ones.
+
+Every subscriber has a bounded buffer. A subscriber which can't keep up (its
+buffer is full) has its buffered events replaced by a single `resync` event,
+memory of a slow client stays bounded and the listener never waits for it.
+Clients catch up with a delta sync (`GET /jobs?since=`) on `resync`.
+"""
+import json
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Set
+from dataclasses import dataclass
+
+import asyncpg
+
+from jobserver.contexts import DBConfig
+from jobserver.contract.models import CHANGE_CHANNEL
+from jobserver.serializers import dumps
+
+# Sent to a client to reconnect (milliseconds), first message of a stream.
+_RETRY_MILLI: int = 3000
+# Seconds between attempts to reconnect the listener.
+_RECONNECT_INTERVAL: float = 1.0
+# Seconds of silence after which the listener connection is checked (a broken
+# network is not noticed otherwise), and the time allowed for the check.
+_PING_INTERVAL: float = 30.0
+_PING_TIMEOUT: float = 10.0
+_HEARTBEAT: bytes = b": ping\n\n"
+_RESYNC: bytes = b"event: resync\ndata: {}\n\n"
+# `UserJob` operation -> event.
+_USER_JOB_EVENTS: Dict[str, str] = {"insert": "applied", "delete": "withdrawn"}
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+
+def _event(name: str, data: dict) -> bytes:
+    return b"event: " + name.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+@dataclass
+class EventStats:
+    """Counters of the change events.
+
+    * `notifications`: received from db.
+    * `delivered`: events buffered for subscribers.
+    * `overflows`: buffers of slow subscribers replaced by `resync`.
+    * `reconnects`: listener connection re-established.
+    """
+
+    notifications: int = 0
+    delivered: int = 0
+    overflows: int = 0
+    reconnects: int = 0
+
+
+class Subscription:
+    """Bounded buffer of the encoded events of a client."""
+
+    __slots__ = ("tenant_id", "queue")
+
+    def __init__(self, tenant_id: int, buffer_size: int) -> None:
+        self.tenant_id: int = tenant_id
+        self.queue: asyncio.Queue = asyncio.Queue(buffer_size)
+
+    def put(self, event: bytes) -> bool:
+        """Buffer the event, `False` if the buffer overflowed (replaced by a
+        `resync` event).
+        """
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_RESYNC)
+            return False
+
+
+class JobEvents:
+    """Listener of the change notifications and the subscribers of a process.
+
+    * `buffer_size`: events buffered per subscriber.
+    * `max_subscribers`: new subscriptions are refused beyond it.
+    * `heartbeat`: seconds of inactivity after which a comment is sent, to keep
+      the connection open through proxies and detect gone clients.
+    """
+
+    def __init__(
+        self,
+        db_config: DBConfig,
+        buffer_size: int = 64,
+        max_subscribers: int = 10000,
+        heartbeat: float = 15.0,
+    ) -> None:
+        self.buffer_size: int = buffer_size
+        self.max_subscribers: int = max_subscribers
+        self.heartbeat: float = heartbeat
+        self.stats: EventStats = EventStats()
+        self._db_config: DBConfig = db_config
+        # tenant id -> its subscriptions
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._count: int = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscribers(self) -> int:
+        return self._count
+
+    def start(self) -> None:
+        """Start listening, in a background task of the running loop."""
+        self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Stop listening. Streams of the subscribers are left to the server."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def subscribe(self, tenant_id: int) -> Optional[Subscription]:
+        """Subscribe to the changes, `None` if there are too many subscribers."""
+        if self._count >= self.max_subscribers:
+            return None
+        subscription: Subscription = Subscription(tenant_id, self.buffer_size)
+        self._subscriptions.setdefault(tenant_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions: Optional[Set[Subscription]] = self._subscriptions.get(
+            subscription.tenant_id
+        )
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.tenant_id]
+        self._count -= 1
+
+    async def stream(self, subscription: Subscription) -> AsyncIterator[bytes]:
+        """Events of the subscription, in the `text/event-stream` format.
+        Unsubscribes when the client is gone (generator is closed).
+        """
+        try:
+            yield f"retry: {_RETRY_MILLI}\n\n".encode("utf-8")
+            while True:
+                try:
+                    yield await asyncio.wait_for(
+                        subscription.queue.get(), self.heartbeat
+                    )
+                except asyncio.TimeoutError:
+                    yield _HEARTBEAT
+        finally:
+            self.unsubscribe(subscription)
+
+    def publish(self, payload: str) -> None:
+        """Fan out a notification (json payload of the triggers)."""
+        self.stats.notifications += 1
+        notification: dict = json.loads(payload)
+        ids: Optional[List[int]] = notification["ids"]
+        if notification["table"] == "Job":
+            event: bytes = (
+                _RESYNC
+                if ids is None
+                else _event(
+                    "job",
+                    {
+                        "op": notification["op"],
+                        "ids": [str(job_id) for job_id in ids],
+                    },
+                )
+            )
+            for tenant_subscriptions in self._subscriptions.values():
+                self._deliver(tenant_subscriptions, event)
+            return
+        subscriptions: Optional[Set[Subscription]] = self._subscriptions.get(
+            notification["tenant"]
+        )
+        if subscriptions is None:
+            return
+        self._deliver(
+            subscriptions,
+            _RESYNC
+            if ids is None
+            else _event(
+                _USER_JOB_EVENTS[notification["op"]],
+                {"ids": [str(job_id) for job_id in ids]},
+            ),
+        )
+
+    def _deliver(self, subscriptions: Set[Subscription], event: bytes) -> None:
+        for subscription in subscriptions:
+            if subscription.put(event):
+                self.stats.delivered += 1
+            else:
+                self.stats.overflows += 1
+
+    def _resync_all(self) -> None:
+        """Notifications may have been missed, every client has to resync."""
+        for subscriptions in self._subscriptions.values():
+            self._deliver(subscriptions, _RESYNC)
+
+    async def _listen(self) -> None:
+        """Keep a listener connection (to the primary), reconnecting on loss."""
+        config: DBConfig = self._db_config
+        connected_before: bool = False
+        while True:
+            try:
+                conn: asyncpg.Connection = await asyncpg.connect(
+                    host=config.host,
+                    port=config.port,
+                    user=config.username,
+                    password=config.password,
+                    database=config.db_name,
+                )
+            except (OSError, asyncpg.PostgresError) as exc:
+                _LOGGER.warning("Change listener failed to connect: %s", exc)
+                await asyncio.sleep(_RECONNECT_INTERVAL)
+                continue
+            lost: asyncio.Event = asyncio.Event()
+            conn.add_termination_listener(lambda _: lost.set())
+            try:
+                await conn.add_listener(
+                    CHANGE_CHANNEL, lambda *args: self.publish(args[-1])
+                )
+                if connected_before:
+                    self.stats.reconnects += 1
+                    self._resync_all()
+                connected_before = True
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), _PING_INTERVAL)
+                    except asyncio.TimeoutError:
+                        await asyncio.wait_for(conn.execute("select 1"), _PING_TIMEOUT)
+                _LOGGER.warning("Change listener connection lost, reconnecting.")
+            except (
+                OSError,
+                asyncio.TimeoutError,
+                asyncpg.PostgresError,
+                asyncpg.InterfaceError,
+            ) as exc:
+                _LOGGER.warning("Change listener failed, reconnecting: %s", exc)
+            finally:
+                conn.terminate()
+            await asyncio.sleep(_RECONNECT_INTERVAL)
@@ -0,0 +1,143 @@
+"""Serve on multiple cores.
+
+Runs `--workers` uvicorn processes sharing one listening socket, each one
+with its own app (`server.create_app`), engines and caches, and a distinct
+`WORKER_ID` (id generation). A worker that exits is restarted with the same
+worker id, ids of the new process start after the ones the exited process may
+have used. `SIGINT` / `SIGTERM` stop all workers gracefully.
+
+    python -m jobserver.launcher --workers 4 --port 8000
+
+Configs are read from `.env` (of the working directory) and the environment.
+
+Each worker has its own connection pool, the db MUST allow
+workers x (`DB_POOL_SIZE` + `DB_POOL_MAX_OVERFLOW`) connections (and one
+listener connection for the change events).
+
+Event streams never end by themselves, they are cancelled after
+`--graceful-timeout` seconds of shutdown.
+"""
+import os
+import signal
+import socket
+import logging
+import argparse
+import threading
+import multiprocessing
+from typing import Dict, List, Optional
+from multiprocessing.context import SpawnProcess
+
+import uvicorn
+
+from jobserver.utils import TOOL_WORKER_ID
+
+_APP: str = "jobserver.server:create_app"
+# Seconds between checks for exited workers.
+_CHECK_INTERVAL: float = 1.0
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+
+def _serve(
+    worker_id: int,
+    sockets: List[socket.socket],
+    log_level: str,
+    graceful_timeout: float,
+) -> None:
+    """Entry point of a worker process."""
+    os.environ["WORKER_ID"] = str(worker_id)
+    uvicorn.Server(
+        uvicorn.Config(
+            _APP,
+            factory=True,
+            log_level=log_level,
+            lifespan="on",
+            timeout_graceful_shutdown=graceful_timeout,
+        )
+    ).run(sockets=sockets)
+
+
+class Launcher:
+    """Start, watch and stop the worker processes."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        workers: int,
+        host: str,
+        port: int,
+        log_level: str,
+        graceful_timeout: float = 10.0,
+    ) -> None:
+        # Worker ids are `0` to `workers - 1`, below the one of tools.
+        if not 1 <= workers <= TOOL_WORKER_ID:
+            raise ValueError(f"Workers MUST be in [1, {TOOL_WORKER_ID}]")
+        self._workers: int = workers
+        self._log_level: str = log_level
+        self._graceful_timeout: float = graceful_timeout
+        self._socket: socket.socket = uvicorn.Config(
+            _APP, host=host, port=port
+        ).bind_socket()
+        self._processes: Dict[int, SpawnProcess] = {}
+        self._should_exit: threading.Event = threading.Event()
+
+    def run(self) -> None:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: self._should_exit.set())
+        for worker_id in range(self._workers):
+            self._start(worker_id)
+        while not self._should_exit.wait(_CHECK_INTERVAL):
+            for worker_id, process in self._processes.items():
+                if not process.is_alive():
+                    _LOGGER.warning(
+                        "Worker %s exited with %s, restarting.",
+                        worker_id,
+                        process.exitcode,
+                    )
+                    self._start(worker_id)
+        self._stop()
+
+    def _start(self, worker_id: int) -> None:
+        # Spawned (not forked), nothing of this process is inherited by workers.
+        process: SpawnProcess = multiprocessing.get_context("spawn").Process(
+            target=_serve,
+            args=(
+                worker_id,
+                [self._socket],
+                self._log_level,
+                self._graceful_timeout,
+            ),
+            name=f"jobserver-worker-{worker_id}",
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def _stop(self) -> None:
+        # Workers finish in-flight requests and run lifespan shutdown on SIGTERM.
+        for process in self._processes.values():
+            process.terminate()
+        for process in self._processes.values():
+            process.join()
+        self._socket.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--graceful-timeout", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper())
+    Launcher(
+        min(args.workers, TOOL_WORKER_ID),
+        args.host,
+        args.port,
+        args.log_level,
+        args.graceful_timeout,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
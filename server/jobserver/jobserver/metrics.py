@@ -0,0 +1,278 @@
+"""Request and query instrumentation, exposed in the Prometheus text format.
+
+* `MetricsMiddleware`: latency and no. of queries of every request, by route.
+* `EngineRegistry` (given a `Metrics`): latency of every query and of pool
+  checkouts, by engine.
+* `timed`: latency of store methods.
+* `MetricsExporter.fetch_all`: `GET /metrics` endpoint, along with pool stats.
+
+Nothing is installed when metrics are disabled (`Metrics` is not created), the
+only cost left is a `None` check in `timed` methods.
+"""
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_SECONDS: str = "jobserver_http_request_duration_seconds"
+REQUEST_QUERIES: str = "jobserver_http_request_queries"
+STORE_SECONDS: str = "jobserver_store_method_duration_seconds"
+QUERY_SECONDS: str = "jobserver_db_query_duration_seconds"
+POOL_WAIT_SECONDS: str = "jobserver_db_pool_wait_seconds"
+ENCODE_SECONDS: str = "jobserver_encode_duration_seconds"
+
+_HELP: Dict[str, str] = {
+    REQUEST_SECONDS: "Latency of HTTP requests.",
+    REQUEST_QUERIES: "No. of database queries per HTTP request.",
+    STORE_SECONDS: "Latency of store methods.",
+    QUERY_SECONDS: "Latency of database queries (cursor execution).",
+    POOL_WAIT_SECONDS: "Time spent waiting for a pooled connection.",
+    ENCODE_SECONDS: "Time spent encoding jobs.",
+}
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS: Tuple[float, ...] = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Route label of requests not matching any route.
+_UNMATCHED: str = "unmatched"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative histogram of observations, with fixed buckets."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        # Last one is the `+Inf` bucket.
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _RequestQueries:
+    """Queries executed by the current request."""
+
+    __slots__ = ("count",)
+
+    def __init__(self) -> None:
+        self.count: int = 0
+
+
+# Set by the middleware for the duration of each request. Query hooks of the
+# asyncio engine run in the request's context (greenlets inherit it), sync
+# engines in threadpool run in a copy of it.
+_REQUEST_QUERIES: ContextVar[Optional[_RequestQueries]] = ContextVar(
+    "request_queries", default=None
+)
+
+
+class Metrics:
+    """Registry of histograms. Safe to be updated from threads."""
+
+    def __init__(self) -> None:
+        self._lock: Lock = Lock()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def observe(
+        self,
+        name: str,
+        labels: Labels,
+        value: float,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        """Add an observation to the histogram of `name` and `labels`."""
+        with self._lock:
+            histograms: Dict[Labels, Histogram] = self._histograms.setdefault(name, {})
+            histogram: Optional[Histogram] = histograms.get(labels)
+            if histogram is None:
+                histogram = histograms[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def record_query(self, engine: str, statement: str, seconds: float) -> None:
+        """Record a query executed by `engine`, counted in the current request."""
+        words: List[str] = statement.split(None, 1)
+        self.observe(
+            QUERY_SECONDS,
+            (("engine", engine), ("statement", words[0].lower() if words else "")),
+            seconds,
+        )
+        request_queries: Optional[_RequestQueries] = _REQUEST_QUERIES.get()
+        if request_queries is not None:
+            request_queries.count += 1
+
+    def render(self, pool_stats: Optional[Dict[str, dict]] = None) -> str:
+        """All metrics (and pool stats of `EngineRegistry.stats`), in the
+        Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, histograms in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(histograms.items()):
+                    cumulative: int = 0
+                    for bound, count in zip(
+                        histogram.buckets + (float("inf"),), histogram.counts
+                    ):
+                        cumulative += count
+                        lines.append(
+                            f"{name}_bucket"
+                            f"{_format_labels(labels + (('le', _format_value(bound)),))}"
+                            f" {cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}"
+                    )
+                    lines.append(
+                        f"{name}_count{_format_labels(labels)} {histogram.count}"
+                    )
+        for key, samples in sorted(_pool_samples(pool_stats or {}).items()):
+            name: str = f"jobserver_db_pool_{key}"
+            lines.append(f"# HELP {name} Pool stat `{key}` of the engine.")
+            lines.append(f"# TYPE {name} gauge")
+            for engine, value in samples:
+                lines.append(
+                    f"{name}{_format_labels((('engine', engine),))} {_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _pool_samples(pool_stats: Dict[str, dict]) -> Dict[str, List[Tuple[str, float]]]:
+    samples: Dict[str, List[Tuple[str, float]]] = {}
+    for engine, stats in sorted(pool_stats.items()):
+        for key, value in stats.items():
+            samples.setdefault(key, []).append((engine, value))
+    return samples
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_Method = TypeVar("_Method", bound=Callable[..., Awaitable])
+
+
+def timed(method: _Method) -> _Method:
+    """Record latency of an asyncio store method, in `STORE_SECONDS`.
+    Metrics are taken from the store's `EngineRegistry`."""
+    labels: Labels = (("method", method.__qualname__),)
+
+    @wraps(method)
+    async def _timed(self, *args, **kwargs):
+        metrics: Optional[Metrics] = self._engines.metrics
+        if metrics is None:
+            return await method(self, *args, **kwargs)
+        started: float = perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            metrics.observe(STORE_SECONDS, labels, perf_counter() - started)
+
+    return _timed
+
+
+class MetricsMiddleware:
+    """Record latency and no. of queries of requests, by method, route
+    (qualified name of the endpoint) and status."""
+
+    def __init__(self, app: ASGIApp, metrics: Metrics) -> None:
+        self.app: ASGIApp = app
+        self.metrics: Metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status: List[int] = [500]
+
+        async def _send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        request_queries: _RequestQueries = _RequestQueries()
+        token = _REQUEST_QUERIES.set(request_queries)
+        started: float = perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed: float = perf_counter() - started
+            _REQUEST_QUERIES.reset(token)
+            # Router sets the matched endpoint in the (shared) scope.
+            endpoint: Optional[Callable] = scope.get("endpoint")
+            route: str = getattr(endpoint, "__qualname__", _UNMATCHED)
+            self.metrics.observe(
+                REQUEST_SECONDS,
+                (
+                    ("method", scope["method"]),
+                    ("route", route),
+                    ("status", str(status[0])),
+                ),
+                elapsed,
+            )
+            self.metrics.observe(
+                REQUEST_QUERIES,
+                (("method", scope["method"]), ("route", route)),
+                request_queries.count,
+                COUNT_BUCKETS,
+            )
+
+
+class MetricsExporter:
+    """`GET /metrics` endpoint."""
+
+    def __init__(self, metrics: Metrics, pool_stats: Callable[[], Dict[str, dict]]):
+        self._metrics: Metrics = metrics
+        self._pool_stats: Callable[[], Dict[str, dict]] = pool_stats
+
+    async def fetch_all(self, request: Request) -> Response:
+        """All metrics, in the Prometheus text format."""
+        return Response(
+            self._metrics.render(self._pool_stats()),
+            media_type="text/plain; version=0.0.4",
+        )
@@ -0,0 +1,388 @@
+"""Schema migrations of existing databases.
+
+* Databases created with `InitDB.create_db` already have the latest schema,
+  they are stamped with the latest version.
+* `InitDB.migrate` upgrades older databases. Pending migrations are applied
+  in order, each one in its own transaction.
+* Statements are built from the table definitions, so that a migrated db has
+  the same schema as a new one. Migrations MUST NOT be modified once released,
+  add a new one instead.
+* Optional layouts are not migrations, eg: `partition_user_job` converts
+  `UserJob` to a partitioned table (`InitDB.partition_user_job`).
+"""
+import re
+from typing import List, Optional, Tuple
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine.base import Connection
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from jobserver.contract.models import CHANGE_LOG_TRIGGERS, NOTIFY_TRIGGERS
+from jobserver.utils import tenant_id_range
+
+# * `version`: sequence no. of the migration, starting from 1.
+# * `statements(conn, metadata)`: builds the statements to apply, from the table
+#   definitions (and the current state of db, if needed).
+Migration = namedtuple("Migration", "version description statements")
+
+_DIALECT = postgresql.dialect()
+# Tenant of the transaction in shared tenancy (`set local`).
+TENANT_SETTING: str = "app.tenant_id"
+# Name of the RLS policy of a tenant on a table.
+_POLICY_NAME = re.compile(r"^(?P<table_name>.+)\.tenant_(?P<tenant_id>\d+)$")
+# Name of an RLS policy on `UserJob`, of a tenant's role or the shared role.
+_USER_JOB_POLICY_NAME = re.compile(
+    r"^UserJob\.(?P<role_name>tenant_(?P<tenant_id>\d+)|\w+)$"
+)
+
+
+def tenant_policy_condition(tenant_id: int, tenant_column: bool = False) -> str:
+    """Condition of the RLS policy on tenant's rows.
+
+    Same as `id >> 47 = tenant_id`, but as a range on `id`, so that the primary
+    key index is used instead of scanning all rows of all tenants. Tables with
+    a `tenantID` column (`tenant_column`) check it as well, so that only the
+    tenant's partition is scanned when the table is partitioned.
+    """
+    start, stop = tenant_id_range(tenant_id)
+    condition: str = (
+        f"id >= {start}" if stop is None else f"id >= {start} and id < {stop}"
+    )
+    if tenant_column:
+        return f'"tenantID" = {tenant_id} and {condition}'
+    return condition
+
+
+def shared_policy_condition(tenant_column: bool = False) -> str:
+    """Condition of the RLS policy of the role shared by all tenants.
+
+    Same as `tenant_policy_condition`, for the tenant set in `TENANT_SETTING`
+    for the transaction. Nothing is visible if it is not set.
+    """
+    span: int = tenant_id_range(0)[1]
+    tenant_id: str = (
+        f"cast(nullif(current_setting('{TENANT_SETTING}', true), '') as bigint)"
+    )
+    condition: str = (
+        f"id between {tenant_id} * {span} and {tenant_id} * {span} + {span - 1}"
+    )
+    if tenant_column:
+        return f'"tenantID" = {tenant_id} and {condition}'
+    return condition
+
+
+def _add_generated_columns(table: Table, column_names: List[str]) -> List[str]:
+    """Add generated columns, values are computed for existing rows."""
+    statements: List[str] = []
+    for column_name in column_names:
+        column = table.c[column_name]
+        statements.append(
+            f'alter table "{table.name}" add column if not exists "{column.name}" '
+            + f"{column.type.compile(dialect=_DIALECT)} "
+            + f"generated always as ({column.computed.sqltext}) stored"
+        )
+    return statements
+
+
+def _create_indexes(table: Table, index_names: List[str]) -> List[str]:
+    indexes: dict = {index.name: index for index in table.indexes}
+    return [
+        str(CreateIndex(indexes[name], if_not_exists=True).compile(dialect=_DIALECT))
+        for name in index_names
+    ]
+
+
+def _job_search_and_filters(_: Connection, metadata: MetaData) -> List[str]:
+    table: Table = metadata.tables["Job"]
+    return _add_generated_columns(
+        table,
+        [
+            "searchVector",
+            "minExperienceInYears",
+            "maxExperienceInYears",
+            "locationKeys",
+        ],
+    ) + _create_indexes(
+        table,
+        ["Job.searchVector", "Job.experience", "Job.locationKeys", "Job.company"],
+    )
+
+
+def _indexed_tenant_policies(conn: Connection, metadata: MetaData) -> List[str]:
+    statements: List[str] = _create_indexes(
+        metadata.tables["UserJob"], ["UserJob.jobID"]
+    )
+    policies = conn.execute(
+        text("select policyname from pg_policies where schemaname = current_schema()")
+    ).scalars()
+    for policy_name in policies:
+        match = _POLICY_NAME.match(policy_name)
+        if match is None or match["table_name"] not in metadata.tables:
+            continue
+        statements.append(
+            f"""alter policy "{policy_name}" on "{match['table_name']}" """
+            + f"using ({tenant_policy_condition(int(match['tenant_id']))})"
+        )
+    return statements
+
+
+def _create_tables(metadata: MetaData, table_names: List[str]) -> List[str]:
+    """Create tables (without indexes), if not exists."""
+    return [
+        str(
+            CreateTable(metadata.tables[name], if_not_exists=True).compile(
+                dialect=_DIALECT
+            )
+        )
+        for name in table_names
+    ]
+
+
+def _user_job_roles(conn: Connection) -> List[Tuple[str, Optional[int]]]:
+    """Roles with a policy on `UserJob` and their tenant (`None` for the
+    shared role).
+    """
+    policies = conn.execute(
+        text(
+            "select policyname from pg_policies where schemaname = current_schema() "
+            + "and tablename = 'UserJob'"
+        )
+    ).scalars()
+    roles: List[Tuple[str, Optional[int]]] = []
+    for policy_name in policies:
+        match = _USER_JOB_POLICY_NAME.match(policy_name)
+        if match is None:
+            continue
+        roles.append(
+            (
+                match["role_name"],
+                None if match["tenant_id"] is None else int(match["tenant_id"]),
+            )
+        )
+    return roles
+
+
+def _policy_condition(tenant_id: Optional[int], tenant_column: bool = False) -> str:
+    if tenant_id is None:
+        return shared_policy_condition(tenant_column)
+    return tenant_policy_condition(tenant_id, tenant_column)
+
+
+def _change_logs(conn: Connection, metadata: MetaData) -> List[str]:
+    statements: List[str] = (
+        _create_indexes(metadata.tables["Job"], ["Job.lastModifiedTime"])
+        + _create_tables(metadata, ["JobDeletion", "UserJobChange"])
+        + _create_indexes(metadata.tables["JobDeletion"], ["JobDeletion.deletedTime"])
+        + _create_indexes(
+            metadata.tables["UserJobChange"], ["UserJobChange.changedTime"]
+        )
+        + list(CHANGE_LOG_TRIGGERS)
+    )
+    # Existing relations, as applied before any sync token.
+    statements.append(
+        """insert into "UserJobChange"(id, "jobID", "isApplied", "changedTime") """
+        + """select id, "jobID", true, 0 from "UserJob" on conflict do nothing"""
+    )
+    # Roles which can write `UserJob` write its log (triggers) as well.
+    policy_statements: List[str] = []
+    for role_name, tenant_id in _user_job_roles(conn):
+        policy_statements.append(
+            f"""grant all privileges on table "UserJobChange" to {role_name}"""
+        )
+        policy_statements.append(
+            f"""create policy "UserJobChange.{role_name}" """
+            + f"""on "UserJobChange" as permissive for all to {role_name} """
+            + f"""using ({_policy_condition(tenant_id)})"""
+        )
+    if policy_statements:
+        statements.append('alter table "UserJobChange" enable row level security')
+    return statements + policy_statements
+
+
+def _change_notifications(_: Connection, __: MetaData) -> List[str]:
+    return list(NOTIFY_TRIGGERS)
+
+
+def _user_job_tenant(conn: Connection, metadata: MetaData) -> List[str]:
+    column = metadata.tables["UserJob"].c["tenantID"]
+    statements: List[str] = [
+        f'alter table "UserJob" add column if not exists "{column.name}" '
+        + f"{column.type.compile(dialect=_DIALECT)}",
+        f'update "UserJob" set "tenantID" = id / {tenant_id_range(0)[1]} '
+        + 'where "tenantID" is null',
+        'alter table "UserJob" alter column "tenantID" set not null',
+    ]
+    for role_name, tenant_id in _user_job_roles(conn):
+        statements.append(
+            f"""alter policy "UserJob.{role_name}" on "UserJob" """
+            + f"using ({_policy_condition(tenant_id, tenant_column=True)})"
+        )
+    return statements
+
+
+def _job_experience(_: Connection, metadata: MetaData) -> List[str]:
+    # Generation expressions can't be altered (before Postgres 17), columns are
+    # added again. Their index is dropped along with them.
+    table: Table = metadata.tables["Job"]
+    column_names: List[str] = ["minExperienceInYears", "maxExperienceInYears"]
+    return (
+        [
+            f'alter table "{table.name}" drop column if exists "{column_name}"'
+            for column_name in column_names
+        ]
+        + _add_generated_columns(table, column_names)
+        + _create_indexes(table, ["Job.experience"])
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "Job search vector, parsed experience & locations, and their indexes.",
+        _job_search_and_filters,
+    ),
+    Migration(
+        2,
+        "Tenant RLS policies as a range on id, index on UserJob.jobID.",
+        _indexed_tenant_policies,
+    ),
+    Migration(
+        3,
+        "Index on Job.lastModifiedTime, job deletion and applied job change logs.",
+        _change_logs,
+    ),
+    Migration(
+        4,
+        "Notifications of Job and UserJob changes (LISTEN / NOTIFY).",
+        _change_notifications,
+    ),
+    Migration(
+        5,
+        "UserJob.tenantID, checked by the tenant RLS policies of UserJob.",
+        _user_job_tenant,
+    ),
+    Migration(
+        6,
+        "Parsed experience capped to smallint, with `yrs` and `to` forms.",
+        _job_experience,
+    ),
+]
+
+
+def create_version_table(conn: Connection) -> None:
+    """Create the table which tracks applied migrations, if not exists."""
+    conn.execute(
+        text(
+            """create table if not exists "SchemaVersion"("""
+            + """version integer primary key, description text not null, """
+            + """"appliedTime" bigint not null)"""
+        )
+    )
+
+
+def current_version(conn: Connection) -> int:
+    """Version of the last applied migration, `0` if none."""
+    return conn.execute(
+        text("""select coalesce(max(version), 0) from "SchemaVersion\"""")
+    ).scalar()
+
+
+def record(conn: Connection, migration: Migration) -> None:
+    """Mark migration as applied."""
+    conn.execute(
+        text(
+            """insert into "SchemaVersion"(version, description, "appliedTime") """
+            + """values (:version, :description, :applied_time)"""
+        ),
+        {
+            "version": migration.version,
+            "description": migration.description,
+            "applied_time": int(datetime.now(timezone.utc).timestamp() * 1000),
+        },
+    )
+
+
+def apply(conn: Connection, metadata: MetaData, migration: Migration) -> None:
+    """Apply migration and mark it as applied."""
+    for statement in migration.statements(conn, metadata):
+        conn.execute(text(statement))
+    record(conn, migration)
+
+
+def is_partitioned(conn: Connection, table_name: str) -> bool:
+    return conn.execute(
+        text(
+            "select exists(select from pg_partitioned_table "
+            + "where partrelid = cast(:table_name as regclass))"
+        ),
+        {"table_name": f'"{table_name}"'},
+    ).scalar()
+
+
+def partition_user_job(conn: Connection, partitions: int) -> List[str]:
+    """Statements converting `UserJob` to a table hash partitioned on
+    `tenantID`, with `partitions` partitions (`UserJob.p<remainder>`).
+
+    * Rows are copied to the new table before its constraints and indexes are
+      created (on every partition, from the parent).
+    * Triggers, grants and policies of the existing roles are re-created on the
+      new table. Policies check `tenantID`, so that a tenant's queries touch
+      only its partition. Partitions have RLS enabled and no grants, they are
+      accessed only through `UserJob`.
+    * `UserJob` is locked until the transaction ends.
+    """
+    if partitions < 1:
+        raise ValueError(f"Invalid no. of partitions {partitions}")
+    if is_partitioned(conn, "UserJob"):
+        raise ValueError("UserJob is already partitioned")
+    roles: List[Tuple[str, Optional[int]]] = _user_job_roles(conn)
+    partition_names: List[str] = [f"UserJob.p{index}" for index in range(partitions)]
+    statements: List[str] = [
+        'lock table "UserJob" in access exclusive mode',
+        """create table "UserJob.partitioned"(id bigint not null, """
+        + """"tenantID" bigint not null, "userID" bigint not null, """
+        + """"jobID" bigint not null) partition by hash ("tenantID")""",
+    ]
+    for remainder, partition_name in enumerate(partition_names):
+        statements.append(
+            f"""create table "{partition_name}" partition of "UserJob.partitioned" """
+            + f"for values with (modulus {partitions}, remainder {remainder})"
+        )
+    statements.extend(
+        [
+            """insert into "UserJob.partitioned"(id, "tenantID", "userID", "jobID") """
+            + f"""select id, id / {tenant_id_range(0)[1]}, "userID", "jobID" """
+            + """from "UserJob\"""",
+            # Along with its triggers and policies.
+            'drop table "UserJob"',
+            'alter table "UserJob.partitioned" rename to "UserJob"',
+            'alter table "UserJob" add primary key ("tenantID", id)',
+            'alter table "UserJob" add unique ("tenantID", "userID", "jobID")',
+            """alter table "UserJob" add foreign key ("userID") """
+            + """references "User"(id) on delete cascade""",
+            """alter table "UserJob" add foreign key ("jobID") """
+            + """references "Job"(id) on delete cascade""",
+            'create index "UserJob.jobID" on "UserJob" ("jobID")',
+        ]
+    )
+    statements.extend(
+        statement
+        for statement in CHANGE_LOG_TRIGGERS + NOTIFY_TRIGGERS
+        if 'on "UserJob"' in statement
+    )
+    statements.append('alter table "UserJob" enable row level security')
+    statements.extend(
+        f'alter table "{partition_name}" enable row level security'
+        for partition_name in partition_names
+    )
+    for role_name, tenant_id in roles:
+        statements.append(f'grant all privileges on table "UserJob" to {role_name}')
+        statements.append(
+            f"""create policy "UserJob.{role_name}" """
+            + f"""on "UserJob" as permissive for all to {role_name} """
+            + f"""using ({_policy_condition(tenant_id, tenant_column=True)})"""
+        )
+    return statements
@@ -0,0 +1,105 @@
+"""Bulk tenant provisioning.
+
+Create the tenancy configs (roles and RLS policies) and the users of tenants,
+from a file of users (`{"id": <tenant id>, "name": ..., "email": ...}` records,
+in any format supported by `db.read_records`).
+
+    python -m jobserver.provision users.ndjson --tenancy shared --db-name job_db
+
+Database options default to the `DB_*` environment variables.
+"""
+import os
+import json
+import logging
+import argparse
+from typing import List, Optional
+from time import perf_counter
+
+from jobserver.contexts import DBConfig
+from jobserver.contract.models import METADATA
+from jobserver.db import TENANCY_ROLE, TENANCY_SHARED, InitDB, InitData, read_records
+
+
+def provision(
+    db_config: DBConfig,
+    path: str,
+    key: Optional[str] = None,
+    batch_size: int = 5000,
+) -> dict:
+    """Provision all tenants in the file, with the tenancy of `db_config`.
+    Return no. of tenants and the seconds taken by each step.
+    """
+    # Roles need all tenant ids upfront, users are streamed from the file.
+    tenant_ids: List[int] = [user_obj["id"] for user_obj in read_records(path, key)]
+    started: float = perf_counter()
+    InitDB(
+        METADATA,
+        db_config.db_name,
+        db_config.host,
+        db_config.port,
+        db_config.username,
+        db_config.password,
+        tenant_ids,
+        tenancy=db_config.tenancy,
+    ).create_roles(batch_size=batch_size)
+    roles_done: float = perf_counter()
+    users: int = InitData(
+        read_records(path, key),
+        [],
+        db_config.db_name,
+        db_config.host,
+        db_config.port,
+        db_config.username,
+        db_config.password,
+        batch_size=batch_size,
+    ).create_users()
+    users_done: float = perf_counter()
+    return {
+        "tenancy": db_config.tenancy,
+        "tenants": users,
+        "roles_seconds": round(roles_done - started, 3),
+        "users_seconds": round(users_done - roles_done, 3),
+        "tenants_per_second": round(users / (users_done - started), 2),
+    }
+
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="File of users.")
+    parser.add_argument("--key", help="Key of the users, if file is an object.")
+    parser.add_argument(
+        "--tenancy",
+        choices=[TENANCY_ROLE, TENANCY_SHARED],
+        default=os.environ.get("DB_TENANCY", TENANCY_ROLE),
+    )
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME", "job_db"))
+    parser.add_argument("--host", default=os.environ.get("DB_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=os.environ.get("DB_PORT", 5432))
+    parser.add_argument("--username", default=os.environ.get("DB_USERNAME"))
+    parser.add_argument("--password", default=os.environ.get("DB_PASSWORD", ""))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(
+        json.dumps(
+            provision(
+                DBConfig(
+                    db_name=args.db_name,
+                    host=args.host,
+                    port=args.port,
+                    username=args.username,
+                    password=args.password,
+                    tenancy=args.tenancy,
+                ),
+                args.path,
+                key=args.key,
+                batch_size=args.batch_size,
+            )
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Json serialization of resources."""
+import json
+from typing import Dict, Iterable, List, Set, Tuple
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # Optional dependency, stdlib json is used without it.
+    orjson = None
+
+_DATETIME_FORMAT: str = "%Y-%m-%dT%H:%M:%SZ"
+_APPLIED_SUFFIX: bytes = b',"isApplied":true}'
+_NOT_APPLIED_SUFFIX: bytes = b',"isApplied":false}'
+
+
+def dumps(obj: object) -> bytes:
+    """Encode to compact utf-8 json, using orjson if installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(
+        obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def format_time(epoch_milli: int) -> str:
+    """UTC time in ISO 8601 format."""
+    return datetime.utcfromtimestamp(epoch_milli / 1000).strftime(_DATETIME_FORMAT)
+
+
+class JobEncoder:
+    """Encode job rows to json resources.
+
+    The tenant independent part of a job (everything except `isApplied`) is
+    encoded once and re-used until its `lastModifiedTime` changes. Only the
+    `isApplied` flag is added per request. Rows without `lastModifiedTime`
+    (projections) are encoded on every call.
+    """
+
+    def __init__(self, fields: Tuple[str, ...], max_jobs: int) -> None:
+        # All fields of a job resource, in response order.
+        self._fields: Tuple[str, ...] = fields
+        self._max_jobs: int = max_jobs
+        # job id -> (last modified time, encoded job without `isApplied`)
+        self._encoded: Dict[int, Tuple[int, bytes]] = {}
+
+    def encode(
+        self, job_obj: dict, fields: Tuple[str, ...], applied_job_ids: Set[int]
+    ) -> bytes:
+        """Encode a job row as resource with the given fields."""
+        return b"".join(self._parts(job_obj, fields, applied_job_ids))
+
+    def encode_all(
+        self,
+        jobs: Iterable[dict],
+        fields: Tuple[str, ...],
+        applied_job_ids: Set[int],
+    ) -> bytes:
+        """Encode job rows as a json array of resources."""
+        parts: List[bytes] = [b"["]
+        for job_obj in jobs:
+            parts.extend(self._parts(job_obj, fields, applied_job_ids))
+            parts.append(b",")
+        # Replace the trailing separator (or append to the opening bracket).
+        if len(parts) > 1:
+            parts.pop()
+        parts.append(b"]")
+        # Encoded jobs are copied only once, while joining.
+        return b"".join(parts)
+
+    def _parts(
+        self, job_obj: dict, fields: Tuple[str, ...], applied_job_ids: Set[int]
+    ) -> Tuple[bytes, bytes]:
+        """Encoded job without `isApplied`, and the rest of it."""
+        if fields == self._fields and "lastModifiedTime" in job_obj:
+            prefix: bytes = self._encoded_prefix(job_obj)
+        else:
+            prefix = self._prefix(job_obj, fields)
+        if "isApplied" not in fields:
+            return prefix, b"}"
+        if job_obj["id"] in applied_job_ids:
+            return prefix, _APPLIED_SUFFIX
+        return prefix, _NOT_APPLIED_SUFFIX
+
+    def _encoded_prefix(self, job_obj: dict) -> bytes:
+        cached: Tuple[int, bytes] = self._encoded.get(job_obj["id"])
+        if cached is not None and cached[0] == job_obj["lastModifiedTime"]:
+            return cached[1]
+        prefix: bytes = self._prefix(job_obj, self._fields)
+        # Bound memory, jobs seen afterwards are encoded again.
+        if len(self._encoded) >= self._max_jobs:
+            self._encoded.clear()
+        self._encoded[job_obj["id"]] = (job_obj["lastModifiedTime"], prefix)
+        return prefix
+
+    @staticmethod
+    def _prefix(job_obj: dict, fields: Tuple[str, ...]) -> bytes:
+        """Encoded job without `isApplied` and the closing brace."""
+        resource: dict = {}
+        for field in fields:
+            if field == "isApplied":
+                continue
+            if field == "createdTime":
+                resource[field] = format_time(job_obj["createdTime"])
+            else:
+                resource[field] = job_obj[field]
+        return dumps(resource)[:-1]
@@ -1,43 +1,282 @@
-"""Server running module."""
-from typing import Final
+"""Server running module.
 
+`create_app` builds an app with its own engines, caches and metrics. Run one
+app per process (worker), eg: `uvicorn jobserver.server:create_app --factory`
+or `python -m jobserver.launcher --workers 4` for multiple cores.
+Engines (connection pools) are created in the lifespan of the app, after the
+worker process has started, and disposed on its shutdown.
+"""
+import os
+import asyncio
+import logging
+import tempfile
+from typing import AsyncIterator, List, Optional
+from contextlib import asynccontextmanager
+
+from sqlalchemy.exc import SQLAlchemyError
 from starlette.applications import Starlette
-from starlette.routing import Route, Mount
+from starlette.middleware import Middleware
+from starlette.routing import BaseRoute, Route, Mount
 
-from jobserver.contexts import AppContext, DBConfig
+from jobserver.admission import (
+    READ,
+    WRITE,
+    AdmissionController,
+    AdmissionMiddleware,
+    RouteLimits,
+)
+from jobserver.caches import AppliedJobsCache, JobCache
+from jobserver.compression import CompressionLevels, CompressionMiddleware
+from jobserver.contexts import AppContext, DBConfig, PoolConfig
+from jobserver.engines import EngineRegistry
+from jobserver.events import JobEvents
 from jobserver.env_util import Config
+from jobserver.metrics import Metrics, MetricsExporter, MetricsMiddleware
+from jobserver.utils import claim_worker_id
 
 # NOTE: If there are huge no. of services in future, need a different way to
 #       register services. Something dynamic.
 from jobserver.services.job import JobService
 from jobserver.contract.models import METADATA
 
-_ENV_CONFIGS: Final = Config(".env")
-_APP_CONTEXT: AppContext = AppContext(
-    db_config=DBConfig(
-        db_name=_ENV_CONFIGS.get("DB_NAME"),
-        host=_ENV_CONFIGS.get("DB_HOST"),
-        port=int(_ENV_CONFIGS.get("DB_PORT")),
-        username=_ENV_CONFIGS.get("DB_USERNAME"),
-        password=_ENV_CONFIGS.get("DB_PASSWORD"),
-    ),
-    table_metadata=METADATA,
-    debug=bool(_ENV_CONFIGS.get("DEBUG", default=None)),
-)
+_LOGGER: logging.Logger = logging.getLogger(__name__)
 
-app = Starlette(
-    debug=_APP_CONTEXT.debug,
-    routes=[
-        Mount(
-            "/jobs",
-            routes=[
-                Route("/", JobService(_APP_CONTEXT).fetch_all, methods=["GET"]),
-                Route("/{job_id}", JobService(_APP_CONTEXT).update, methods=["PATCH"]),
-            ],
-        )
-    ],
-    # The below options are not using for now, may needed in the future.
-    middleware=None,
-    on_startup=None,
-    on_shutdown=None,
-)
+
+def _app_context(env_configs: Config, metrics: Optional[Metrics]) -> AppContext:
+    db_config: DBConfig = DBConfig(
+        db_name=env_configs.get("DB_NAME"),
+        host=env_configs.get("DB_HOST"),
+        port=int(env_configs.get("DB_PORT")),
+        username=env_configs.get("DB_USERNAME"),
+        password=env_configs.get("DB_PASSWORD"),
+        tenancy=env_configs.get("DB_TENANCY", default="role"),
+        replicas=tuple(
+            replica.strip()
+            for replica in str(env_configs.get("DB_REPLICAS", default="")).split(",")
+            if replica.strip()
+        ),
+        read_your_writes=float(env_configs.get("DB_READ_YOUR_WRITES", default=1)),
+    )
+    # Per process, total connections are workers x (size + max overflow).
+    pool_config: PoolConfig = PoolConfig(
+        size=int(env_configs.get("DB_POOL_SIZE", default=5)),
+        max_overflow=int(env_configs.get("DB_POOL_MAX_OVERFLOW", default=10)),
+        pre_ping=str(env_configs.get("DB_POOL_PRE_PING", default=True)) == "True",
+        recycle=int(env_configs.get("DB_POOL_RECYCLE", default=-1)),
+        timeout=float(env_configs.get("DB_POOL_TIMEOUT", default=30)),
+    )
+    return AppContext(
+        db_config=db_config,
+        table_metadata=METADATA,
+        debug=bool(env_configs.get("DEBUG", default=None)),
+        engines=EngineRegistry(db_config, pool_config, metrics),
+        job_cache=JobCache(
+            max_jobs=int(env_configs.get("JOB_CACHE_MAX_JOBS", default=100000)),
+            check_interval=float(
+                env_configs.get("JOB_CACHE_CHECK_INTERVAL", default=1)
+            ),
+        )
+        if str(env_configs.get("JOB_CACHE_ENABLED", default=True)) == "True"
+        else None,
+        applied_jobs_cache=AppliedJobsCache(
+            max_tenants=int(
+                env_configs.get("APPLIED_JOBS_CACHE_MAX_TENANTS", default=100000)
+            ),
+            ttl=float(env_configs.get("APPLIED_JOBS_CACHE_TTL", default=5)),
+        )
+        if str(env_configs.get("APPLIED_JOBS_CACHE_ENABLED", default=True)) == "True"
+        else None,
+        job_events=JobEvents(
+            db_config,
+            buffer_size=int(env_configs.get("JOB_EVENTS_BUFFER_SIZE", default=64)),
+            max_subscribers=int(
+                env_configs.get("JOB_EVENTS_MAX_SUBSCRIBERS", default=10000)
+            ),
+            heartbeat=float(env_configs.get("JOB_EVENTS_HEARTBEAT", default=15)),
+        )
+        if str(env_configs.get("JOB_EVENTS_ENABLED", default=True)) == "True"
+        else None,
+        sync_retention=float(env_configs.get("SYNC_RETENTION", default=7 * 24 * 3600)),
+    )
+
+
+def _admission(env_configs: Config, app_context: AppContext) -> AdmissionController:
+    queue_timeout: float = float(env_configs.get("ADMISSION_QUEUE_TIMEOUT", default=1))
+    # Concurrency of the classes adds up to the connections of the pool, by
+    # default. Reads are cheap, writes are shed first (smaller queue, lower pool
+    # wait).
+    pool_config: PoolConfig = app_context.engines.pool_config
+    connections: int = pool_config.size + pool_config.max_overflow
+    write_concurrency: int = int(
+        env_configs.get("ADMISSION_WRITE_CONCURRENCY", default=max(connections // 4, 1))
+    )
+    read_concurrency: int = int(
+        env_configs.get(
+            "ADMISSION_READ_CONCURRENCY",
+            default=max(connections - write_concurrency, 1),
+        )
+    )
+    read_limits: RouteLimits = RouteLimits(
+        max_concurrency=read_concurrency,
+        max_queue=int(
+            env_configs.get("ADMISSION_READ_QUEUE", default=4 * read_concurrency)
+        ),
+        queue_timeout=queue_timeout,
+        max_pool_wait=float(env_configs.get("ADMISSION_READ_MAX_POOL_WAIT", default=1)),
+    )
+    write_limits: RouteLimits = RouteLimits(
+        max_concurrency=write_concurrency,
+        max_queue=int(
+            env_configs.get("ADMISSION_WRITE_QUEUE", default=2 * write_concurrency)
+        ),
+        queue_timeout=queue_timeout,
+        max_pool_wait=float(
+            env_configs.get("ADMISSION_WRITE_MAX_POOL_WAIT", default=0.25)
+        ),
+    )
+    return AdmissionController(
+        {READ: read_limits, WRITE: write_limits},
+        {
+            JobService.fetch_all.__qualname__: READ,
+            JobService.update.__qualname__: WRITE,
+            JobService.update_all.__qualname__: WRITE,
+        },
+        app_context.engines.pool_wait,
+        retry_after=int(env_configs.get("ADMISSION_RETRY_AFTER", default=1)),
+    )
+
+
+def _middlewares(
+    env_configs: Config, app_context: AppContext, metrics: Optional[Metrics]
+) -> List[Middleware]:
+    middlewares: List[Middleware] = []
+    # Outermost, so that compression is part of the request latency.
+    if metrics is not None:
+        middlewares.append(Middleware(MetricsMiddleware, metrics=metrics))
+    # Before anything is done for a request which may be rejected.
+    if str(env_configs.get("ADMISSION_ENABLED", default=True)) == "True":
+        middlewares.append(
+            Middleware(
+                AdmissionMiddleware, controller=_admission(env_configs, app_context)
+            )
+        )
+    # Response compression.
+    if str(env_configs.get("COMPRESSION_ENABLED", default=True)) == "True":
+        middlewares.append(
+            Middleware(
+                CompressionMiddleware,
+                minimum_size=int(
+                    env_configs.get("COMPRESSION_MINIMUM_SIZE", default=1024)
+                ),
+                levels=CompressionLevels(
+                    gzip=int(env_configs.get("COMPRESSION_GZIP_LEVEL", default=6)),
+                    brotli=int(env_configs.get("COMPRESSION_BROTLI_LEVEL", default=4)),
+                    zstd=int(env_configs.get("COMPRESSION_ZSTD_LEVEL", default=3)),
+                ),
+                cache_entries=int(
+                    env_configs.get("COMPRESSION_CACHE_ENTRIES", default=128)
+                ),
+            )
+        )
+    return middlewares
+
+
+def _routes(
+    app_context: AppContext, job_service: JobService, metrics: Optional[Metrics]
+) -> List[BaseRoute]:
+    job_routes: List[BaseRoute] = [
+        Route("/", job_service.fetch_all, methods=["GET"]),
+        Route("/", job_service.update_all, methods=["PATCH"]),
+    ]
+    if app_context.job_events is not None:
+        job_routes.append(Route("/events", job_service.events, methods=["GET"]))
+    job_routes.append(Route("/{job_id}", job_service.update, methods=["PATCH"]))
+    routes: List[BaseRoute] = [Mount("/jobs", routes=job_routes)]
+    if metrics is not None:
+        routes.append(
+            Route(
+                "/metrics",
+                MetricsExporter(metrics, app_context.engines.stats).fetch_all,
+                methods=["GET"],
+            )
+        )
+    return routes
+
+
+async def _prune_changes(job_service: JobService, interval: float) -> None:
+    """Delete the change logs of the delta sync beyond the retention, every
+    `interval` seconds. Idempotent, workers don't coordinate.
+    """
+    while True:
+        try:
+            await job_service.prune_changes()
+        except (OSError, SQLAlchemyError) as exc:
+            _LOGGER.warning("Change logs of the delta sync not pruned: %s", exc)
+        await asyncio.sleep(interval)
+
+
+def create_app(env_file: str = ".env") -> Starlette:
+    """Build the app of a worker process, configured from `env_file` (and the
+    environment, which takes precedence).
+    """
+    env_configs: Config = Config(env_file)
+    # Unique per process writing to the db, claimed among the processes of the
+    # host whatever started them: `WORKER_ID` if set (not shared), else a free one.
+    worker_id: Optional[str] = env_configs.get("WORKER_ID", default=None)
+    claim_worker_id(
+        str(
+            env_configs.get(
+                "WORKER_LOCK_DIR",
+                default=os.path.join(tempfile.gettempdir(), "jobserver-workers"),
+            )
+        ),
+        None if worker_id is None else int(worker_id),
+    )
+    # Request / query metrics, nothing is instrumented if disabled.
+    metrics: Optional[Metrics] = (
+        Metrics()
+        if str(env_configs.get("METRICS_ENABLED", default=False)) == "True"
+        else None
+    )
+    app_context: AppContext = _app_context(env_configs, metrics)
+    # One service (stores, encoder cache) for all the routes of the app.
+    job_service: JobService = JobService(app_context)
+    prune_interval: float = float(env_configs.get("SYNC_PRUNE_INTERVAL", default=3600))
+
+    @asynccontextmanager
+    async def _lifespan(_: Starlette) -> AsyncIterator[None]:
+        # Engines (connection pools) are shared by all requests of the process.
+        app_context.engines.start()
+        # A listener connection per process, for the change events.
+        if app_context.job_events is not None:
+            app_context.job_events.start()
+        pruning: asyncio.Task = asyncio.create_task(
+            _prune_changes(job_service, prune_interval)
+        )
+        try:
+            yield
+        finally:
+            pruning.cancel()
+            if app_context.job_events is not None:
+                await app_context.job_events.stop()
+            await app_context.engines.dispose()
+
+    return Starlette(
+        debug=app_context.debug,
+        routes=_routes(app_context, job_service, metrics),
+        middleware=_middlewares(env_configs, app_context, metrics),
+        lifespan=_lifespan,
+    )
+
+
+_APP: Optional[Starlette] = None
+
+
+def __getattr__(name: str) -> Starlette:
+    """`app`, built on first access, for `uvicorn jobserver.server:app`."""
+    global _APP  # pylint: disable=global-statement
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _APP is None:
+        _APP = create_app()
+    return _APP
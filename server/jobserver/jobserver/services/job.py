@@ -1,19 +1,275 @@
 """Job service. Service which handles all the requests on `job` resource."""
-from typing import List, Set, Union
+from typing import AsyncIterator, Dict, Final, List, Optional, Set, Tuple, Union
 from http import HTTPStatus
-from dataclasses import asdict
-
-from datetime import datetime
+from hashlib import blake2b
+from dataclasses import asdict, replace
+from email.utils import formatdate
+from time import perf_counter, time
 
+from starlette.datastructures import QueryParams
 from starlette.requests import Request
-from starlette.responses import JSONResponse, Response
-from sqlalchemy.exc import DataError, IntegrityError
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy.exc import DBAPIError, IntegrityError
 
+from jobserver.caches import CatalogueVersion
 from jobserver.contexts import AppContext
 from jobserver.core.service import Service
-from jobserver.stores.job import JobStore
-from jobserver.stores.user import UserStore
-from jobserver.errors import INVALID_ID, INVALID_TENANT_ID, REL_ALREADY_EXISTS
+from jobserver.events import JobEvents, Subscription
+from jobserver.metrics import ENCODE_SECONDS, Metrics
+from jobserver.serializers import JobEncoder, dumps
+from jobserver.stores.job import SEARCH_RANK, AsyncJobStore, JobQuery
+from jobserver.stores.user import AsyncUserStore
+from jobserver.errors import (
+    Error,
+    INVALID_ID,
+    INVALID_QUERY_PARAM,
+    INVALID_REQUEST_BODY,
+    INVALID_TENANT_ID,
+    REL_ALREADY_EXISTS,
+    SERVICE_UNAVAILABLE,
+    SYNC_TOKEN_EXPIRED,
+)
+
+# Fields of a job resource, in response order.
+_JOB_FIELDS: Final = (
+    "id",
+    "name",
+    "company",
+    "expectedExperienceInYears",
+    "locations",
+    "createdTime",
+    "shortJobDescription",
+    "shortCompanyDescription",
+    "fullJobDescription",
+    "isApplied",
+)
+_MAX_PAGE_SIZE: int = 1000
+_MAX_SEARCH_LENGTH: int = 200
+_MAX_FILTER_LENGTH: int = 500
+_MAX_BATCH_SIZE: int = 1000
+# Max. no. of jobs for which encoded json is kept in memory.
+_MAX_ENCODED_JOBS: int = 100000
+# Supported `stream` formats and their media types.
+_STREAM_MEDIA_TYPES: Final = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+# Encoded jobs are sent to client in chunks of (at least) this size.
+_STREAM_CHUNK_SIZE: int = 64 * 1024
+# Changes of this many milliseconds before a sync token are sent again, so that
+# transactions in flight, clock skew (app / db) and replica lag don't lose any.
+_SYNC_OVERLAP_MILLI: int = 5000
+# Params which can't be combined with a delta sync (`since`).
+_NON_SYNC_PARAMS: Final = (
+    "limit",
+    "after",
+    "q",
+    "company",
+    "location",
+    "minExperience",
+    "maxExperience",
+    "stream",
+)
+
+
+def _requested_fields(query_params: QueryParams) -> Tuple[str, ...]:
+    """Fields requested through `fields` param, all fields by default.
+    Raise `ValueError` for unknown fields.
+    """
+    if "fields" not in query_params:
+        return _JOB_FIELDS
+    requested: Set[str] = {
+        field.strip() for field in query_params["fields"].split(",") if field.strip()
+    }
+    if not requested.issubset(_JOB_FIELDS):
+        raise ValueError(f"Unknown fields {requested.difference(_JOB_FIELDS)}")
+    requested.add("id")
+    return tuple(field for field in _JOB_FIELDS if field in requested)
+
+
+def _job_query(query_params: QueryParams, fields: Tuple[str, ...]) -> JobQuery:
+    """Build store query from request params. Raise `ValueError` if invalid."""
+    limit: Optional[int] = None
+    after: Optional[int] = None
+    after_rank: Optional[float] = None
+    search: Optional[str] = query_params.get("q")
+    if "limit" in query_params:
+        limit = int(query_params["limit"])
+        if not 0 < limit <= _MAX_PAGE_SIZE:
+            raise ValueError(f"limit should be in range 1-{_MAX_PAGE_SIZE}")
+    if search is not None:
+        search = search.strip()
+        if not 0 < len(search) <= _MAX_SEARCH_LENGTH:
+            raise ValueError(f"q should have 1-{_MAX_SEARCH_LENGTH} characters")
+    company: Optional[str] = _text_filter(query_params, "company")
+    location: Optional[str] = _text_filter(query_params, "location")
+    min_experience: Optional[int] = _experience_filter(query_params, "minExperience")
+    max_experience: Optional[int] = _experience_filter(query_params, "maxExperience")
+    if (
+        min_experience is not None
+        and max_experience is not None
+        and min_experience > max_experience
+    ):
+        raise ValueError("minExperience should not exceed maxExperience")
+    if "after" in query_params:
+        # Search results are ordered by rank, cursor is `<rank>:<job id>`.
+        if search is not None:
+            rank, _, job_id = query_params["after"].partition(":")
+            after_rank, after = float(rank), int(job_id)
+        else:
+            after = int(query_params["after"])
+    return JobQuery(
+        # `isApplied` is not a column, it is resolved from user-job mapping.
+        columns=None
+        if fields == _JOB_FIELDS
+        else tuple(field for field in fields if field != "isApplied"),
+        limit=limit,
+        after=after,
+        search=search,
+        after_rank=after_rank,
+        company=company,
+        location=location,
+        min_experience=min_experience,
+        max_experience=max_experience,
+    )
+
+
+def _text_filter(query_params: QueryParams, name: str) -> Optional[str]:
+    value: Optional[str] = query_params.get(name)
+    if value is None:
+        return None
+    value = value.strip()
+    if not 0 < len(value) <= _MAX_FILTER_LENGTH:
+        raise ValueError(f"{name} should have 1-{_MAX_FILTER_LENGTH} characters")
+    return value
+
+
+def _experience_filter(query_params: QueryParams, name: str) -> Optional[int]:
+    if name not in query_params:
+        return None
+    years: int = int(query_params[name])
+    if not 0 <= years <= 100:
+        raise ValueError(f"{name} should be in range 0-100")
+    return years
+
+
+def _cursor(job_obj: dict) -> str:
+    """Cursor to the page after the given job (`after` param)."""
+    if SEARCH_RANK in job_obj:
+        return f"{job_obj[SEARCH_RANK]!r}:{job_obj['id']}"
+    return str(job_obj["id"])
+
+
+def _etag(
+    version: CatalogueVersion, applied_job_ids: Set[int], query_params: QueryParams
+) -> str:
+    """Weak entity tag of a job listing. Changes with the catalogue, the jobs
+    applied by the tenant and the query.
+    """
+    digest = blake2b(digest_size=16)
+    digest.update(
+        repr(
+            (version, sorted(applied_job_ids), sorted(query_params.multi_items()))
+        ).encode("utf-8")
+    )
+    return f'W/"{digest.hexdigest()}"'
+
+
+def _validator_headers(etag: str, version: CatalogueVersion) -> Dict[str, str]:
+    """`ETag`, `Last-Modified` (last modification of the catalogue) headers."""
+    headers: Dict[str, str] = {
+        "ETag": etag,
+        # Listing is tenant specific, clients have to revalidate every time.
+        "Cache-Control": "private, no-cache",
+    }
+    if version[2] is not None:
+        headers["Last-Modified"] = formatdate(version[2] / 1000, usegmt=True)
+    return headers
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    """Whether `If-None-Match` has the entity tag (weak comparison).
+    `If-Modified-Since` is not used, applications don't change `Last-Modified`.
+    """
+    if_none_match: Optional[str] = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag: str = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(",")
+    )
+
+
+def _stream_format(query_params: QueryParams) -> Optional[str]:
+    """Format requested through `stream` param. Raise `ValueError` if unknown."""
+    stream_format: Optional[str] = query_params.get("stream")
+    if stream_format is not None and stream_format not in _STREAM_MEDIA_TYPES:
+        raise ValueError(f"Unknown stream format {stream_format}")
+    return stream_format
+
+
+async def _encode_stream(
+    job_encoder: JobEncoder,
+    jobs: AsyncIterator[dict],
+    fields: Tuple[str, ...],
+    applied_job_ids: Set[int],
+    stream_format: str,
+) -> AsyncIterator[bytes]:
+    """Encode jobs as a json array or as newline delimited json, chunk by chunk."""
+    separator: bytes = b"\n" if stream_format == "ndjson" else b","
+    chunk: bytearray = bytearray(b"[" if stream_format == "json" else b"")
+    first: bool = True
+    async for job_obj in jobs:
+        if not first and stream_format == "json":
+            chunk += separator
+        first = False
+        chunk += job_encoder.encode(job_obj, fields, applied_job_ids)
+        if stream_format == "ndjson":
+            chunk += separator
+        if len(chunk) >= _STREAM_CHUNK_SIZE:
+            yield bytes(chunk)
+            chunk.clear()
+    if stream_format == "json":
+        chunk += b"]"
+    if chunk:
+        yield bytes(chunk)
+
+
+def _sync_token(query_params: QueryParams) -> Optional[int]:
+    """Time (epoch milliseconds) of the `since` token, `None` if not a delta
+    sync. Raise `ValueError` if invalid.
+    """
+    if "since" not in query_params:
+        return None
+    since: int = int(query_params["since"])
+    if since < 0:
+        raise ValueError("since should not be negative")
+    if any(param in query_params for param in _NON_SYNC_PARAMS):
+        raise ValueError(f"since can't be combined with {_NON_SYNC_PARAMS}")
+    return since
+
+
+def _batch_operations(body: object) -> List[Tuple[int, bool]]:
+    """`(job id, is applied)` of each operation in a batch update body.
+    Raise `ValueError` if invalid.
+    """
+    if not isinstance(body, list) or not 0 < len(body) <= _MAX_BATCH_SIZE:
+        raise ValueError(f"Expected a list of 1-{_MAX_BATCH_SIZE} operations")
+    operations: List[Tuple[int, bool]] = []
+    for item in body:
+        if (
+            not isinstance(item, dict)
+            or set(item) != {"jobId", "isApplied"}
+            or not isinstance(item["jobId"], (str, int))
+            or not isinstance(item["isApplied"], bool)
+        ):
+            raise ValueError(f"Invalid operation {item}")
+        operations.append((int(item["jobId"]), item["isApplied"]))
+    if len({job_id for job_id, _ in operations}) < len(operations):
+        raise ValueError("A job can have only one operation in a batch")
+    return operations
 
 
 class JobService(Service):
@@ -21,50 +277,198 @@ class JobService(Service):
 
     def __init__(self, app_context: AppContext) -> None:
         super().__init__(app_context)
+        self._job_store: AsyncJobStore = AsyncJobStore(
+            app_context.engines, app_context.table_metadata, app_context.job_cache
+        )
+        self._user_store: AsyncUserStore = AsyncUserStore(
+            app_context.engines,
+            app_context.table_metadata,
+            app_context.applied_jobs_cache,
+        )
+        self._job_encoder: JobEncoder = JobEncoder(_JOB_FIELDS, _MAX_ENCODED_JOBS)
 
-    def fetch_all(self, request: Request) -> JSONResponse:
+    async def fetch_all(self, request: Request) -> Response:
         """Fetch all jobs.
         Mark it as applied if user-job mapping is there.
+
+        * `fields`: comma separated fields to return, `id` is always returned.
+        * `limit`, `after`: keyset pagination on job id. A paginated response is
+          wrapped as `{"data": [...], "next": <cursor or null>}`.
+        * `q`: full text search on name, company, locations and descriptions.
+          Matching jobs are ordered by relevance, then by id.
+        * `company`, `location`: case insensitive match on company / one of the
+          places of the job.
+        * `minExperience`, `maxExperience`: candidate's years of experience, jobs
+          with an overlapping experience range are returned.
+        * `stream`: `json` (array) or `ndjson`, jobs are streamed a page at a
+          time instead of being buffered. For bulk consumers.
+        * `since`: delta sync, only the changes after the token (`next` of the
+          previous sync, `0` for the first one) are returned (`_sync`).
+
+        Responses have an `ETag`. `304` is returned for a matching
+        `If-None-Match`, without fetching or encoding any job.
         """
-        job_store: JobStore = JobStore(
-            self._app_context.db_config, self._app_context.table_metadata
-        )
-        user_store: UserStore = UserStore(
-            self._app_context.db_config, self._app_context.table_metadata
-        )
-        jobs: List[dict] = job_store.get_all()
         try:
-            applied_job_ids: Set[int] = user_store.get_user_job_ids(
+            fields: Tuple[str, ...] = _requested_fields(request.query_params)
+            query: JobQuery = _job_query(request.query_params, fields)
+            stream_format: Optional[str] = _stream_format(request.query_params)
+            since: Optional[int] = _sync_token(request.query_params)
+        except ValueError:
+            return JSONResponse(
+                asdict(INVALID_QUERY_PARAM), status_code=int(INVALID_QUERY_PARAM.status)
+            )
+        try:
+            applied_job_ids: Set[int] = await self._user_store.get_user_job_ids(
                 int(request.query_params["tenant"])
             )
-        except DataError as exc:
-            # Invalid tenant id value.
+        except DBAPIError as exc:
+            # Invalid tenant id value (asyncpg reports it as a generic db error).
             if exc.orig.pgcode == "22023":
                 return JSONResponse(
                     asdict(INVALID_TENANT_ID), status_code=int(INVALID_TENANT_ID.status)
                 )
             raise exc
-        result: List[dict] = []
-        for job_obj in jobs:
-            result.append(
-                {
-                    "id": job_obj["id"],
-                    "name": job_obj["name"],
-                    "company": job_obj["company"],
-                    "expectedExperienceInYears": job_obj["expectedExperienceInYears"],
-                    "locations": job_obj["locations"],
-                    "createdTime": str(
-                        datetime.utcfromtimestamp(
-                            (job_obj["createdTime"] / 1000)
-                        ).strftime("%Y-%m-%dT%H:%M:%SZ")
-                    ),
-                    "shortJobDescription": job_obj["shortJobDescription"],
-                    "shortCompanyDescription": job_obj["shortCompanyDescription"],
-                    "fullJobDescription": job_obj["fullJobDescription"],
-                    "isApplied": job_obj["id"] in applied_job_ids,
-                }
+        version: CatalogueVersion = await self._job_store.get_current_version()
+        etag: str = _etag(version, applied_job_ids, request.query_params)
+        headers: Dict[str, str] = _validator_headers(etag, version)
+        if _is_not_modified(request, etag):
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+        if since is not None:
+            return await self._sync(
+                int(request.query_params["tenant"]),
+                since,
+                query,
+                fields,
+                applied_job_ids,
+                headers,
+            )
+        if stream_format is not None:
+            return StreamingResponse(
+                _encode_stream(
+                    self._job_encoder,
+                    self._job_store.stream(query),
+                    fields,
+                    applied_job_ids,
+                    stream_format,
+                ),
+                media_type=_STREAM_MEDIA_TYPES[stream_format],
+                headers=headers,
+            )
+        # Fetch one extra row to know whether a next page exists.
+        jobs: List[dict] = await self._job_store.get_all(
+            query if query.limit is None else replace(query, limit=query.limit + 1)
+        )
+        if query.limit is None:
+            return Response(
+                self._encode_all(jobs, fields, applied_job_ids),
+                media_type="application/json",
+                headers=headers,
             )
-        return JSONResponse(result)
+        page: List[dict] = jobs[: query.limit]
+        return Response(
+            b'{"data":'
+            + self._encode_all(page, fields, applied_job_ids)
+            + b',"next":'
+            + dumps(_cursor(page[-1]) if len(jobs) > query.limit else None)
+            + b"}",
+            media_type="application/json",
+            headers=headers,
+        )
+
+    async def _sync(  # pylint: disable=too-many-arguments
+        self,
+        tenant_id: int,
+        since: int,
+        query: JobQuery,
+        fields: Tuple[str, ...],
+        applied_job_ids: Set[int],
+        headers: Dict[str, str],
+    ) -> Response:
+        """Changes after the `since` token, as
+        `{"data": [<jobs created / modified>], "deleted": [<job ids>],
+        "applied": [<job ids>], "withdrawn": [<job ids>], "next": <token>}`.
+
+        Served by the indexes on modification / deletion time, cost is by the
+        no. of changes, not by the size of the catalogue. Changes close to the
+        token may be sent again, applying them is idempotent.
+        `since=0` is a full sync: every job and the applied ones, without the
+        change logs. Those are kept for `sync_retention` (`prune_changes`), an
+        older token gets `410` and the client syncs again from `0`.
+        """
+        # Taken before the reads, nothing committed after it is missed.
+        next_token: int = int(time() * 1000)
+        if since == 0:
+            jobs, _ = await self._job_store.get_changes(-1, query.columns)
+            applied, withdrawn = applied_job_ids, set()
+            deleted: List[int] = []
+        elif since < next_token - self._app_context.sync_retention * 1000:
+            return JSONResponse(
+                asdict(SYNC_TOKEN_EXPIRED), status_code=int(SYNC_TOKEN_EXPIRED.status)
+            )
+        else:
+            after: int = since - _SYNC_OVERLAP_MILLI
+            jobs, deleted = await self._job_store.get_changes(after, query.columns)
+            applied, withdrawn = await self._user_store.get_user_job_changes(
+                tenant_id, after
+            )
+        return Response(
+            b'{"data":'
+            + self._encode_all(jobs, fields, applied_job_ids)
+            + b',"deleted":'
+            + dumps([str(job_id) for job_id in deleted])
+            + b',"applied":'
+            + dumps([str(job_id) for job_id in sorted(applied)])
+            + b',"withdrawn":'
+            + dumps([str(job_id) for job_id in sorted(withdrawn)])
+            + b',"next":'
+            + dumps(str(next_token))
+            + b"}",
+            media_type="application/json",
+            headers=headers,
+        )
+
+    async def prune_changes(self) -> int:
+        """Delete the change logs beyond `sync_retention`, no token accepted by
+        `_sync` reads them. Return the no. of rows deleted.
+        """
+        return await self._job_store.prune_changes(
+            int((time() - self._app_context.sync_retention) * 1000)
+            - _SYNC_OVERLAP_MILLI
+        )
+
+    async def events(self, request: Request) -> Response:
+        """Stream changes as server-sent events, instead of polling `fetch_all`.
+
+        * `job`: `{"op": "insert" | "update" | "delete", "ids": [<job ids>]}`.
+        * `applied`, `withdrawn`: `{"ids": [<job ids>]}`, of the tenant.
+        * `resync`: changes were missed (client too slow, too many changes at
+          once, or lost listener connection), resync with `since`.
+
+        `503` beyond the max. no. of subscribers of the process.
+        """
+        job_events: JobEvents = self._app_context.job_events
+        try:
+            tenant_id: int = int(request.query_params["tenant"])
+            # Validates the tenant (usually from cache).
+            await self._user_store.get_user_job_ids(tenant_id)
+        except DBAPIError as exc:
+            # Invalid tenant id value (asyncpg reports it as a generic db error).
+            if exc.orig.pgcode == "22023":
+                return JSONResponse(
+                    asdict(INVALID_TENANT_ID), status_code=int(INVALID_TENANT_ID.status)
+                )
+            raise exc
+        subscription: Optional[Subscription] = job_events.subscribe(tenant_id)
+        if subscription is None:
+            return JSONResponse(
+                asdict(SERVICE_UNAVAILABLE),
+                status_code=int(SERVICE_UNAVAILABLE.status),
+            )
+        return StreamingResponse(
+            job_events.stream(subscription),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     async def update(self, request: Request) -> Union[Response, JSONResponse]:
         """Only allow,
@@ -72,16 +476,15 @@ class JobService(Service):
         2. Unapply for job.
         """
         body: dict = await request.json()
-        user_store: UserStore = UserStore(
-            self._app_context.db_config, self._app_context.table_metadata
-        )
         tenant_id: int = int(request.query_params["tenant"])
         job_id: int = int(request.path_params["job_id"])
 
         try:
             if body["isApplied"] is True:
                 try:
-                    user_store.create_user_job_relation(tenant_id, job_id)
+                    created: bool = await self._user_store.create_user_job_relation(
+                        tenant_id, job_id
+                    )
                 except IntegrityError as exc:
                     # Violation of unique constraint
                     if exc.orig.pgcode == "23505":
@@ -95,16 +498,107 @@ class JobService(Service):
                             asdict(INVALID_ID), status_code=int(INVALID_ID.status)
                         )
                     raise exc
+                # Tenant's role exists, but it has no user.
+                if created is False:
+                    return JSONResponse(
+                        asdict(INVALID_TENANT_ID),
+                        status_code=int(INVALID_TENANT_ID.status),
+                    )
             else:
-                if user_store.remove_user_job_relation(tenant_id, job_id) is False:
+                if (
+                    await self._user_store.remove_user_job_relation(tenant_id, job_id)
+                    is False
+                ):
                     return JSONResponse(
                         asdict(INVALID_ID), status_code=int(INVALID_ID.status)
                     )
-        except DataError as exc:
-            # Invalid tenant id value.
+        except DBAPIError as exc:
+            # Invalid tenant id value (asyncpg reports it as a generic db error).
             if exc.orig.pgcode == "22023":
                 return JSONResponse(
                     asdict(INVALID_TENANT_ID), status_code=int(INVALID_TENANT_ID.status)
                 )
             raise exc
         return Response(status_code=HTTPStatus.NO_CONTENT)
+
+    async def update_all(self, request: Request) -> JSONResponse:
+        """Apply / unapply for multiple jobs in a single transaction.
+
+        Body is a list of `{"jobId": <id>, "isApplied": <bool>}`. Response has
+        the result of each operation in the same order, `error` is `null` if
+        it succeeded.
+        """
+        try:
+            operations: List[Tuple[int, bool]] = _batch_operations(await request.json())
+        except ValueError:
+            return JSONResponse(
+                asdict(INVALID_REQUEST_BODY),
+                status_code=int(INVALID_REQUEST_BODY.status),
+            )
+        tenant_id: int = int(request.query_params["tenant"])
+        apply_job_ids: List[int] = [
+            job_id for job_id, is_applied in operations if is_applied is True
+        ]
+        withdraw_job_ids: List[int] = [
+            job_id for job_id, is_applied in operations if is_applied is False
+        ]
+        # Non existing jobs are left out, so that they don't fail the batch.
+        existing_job_ids: Set[int] = (
+            await self._job_store.get_existing_ids(apply_job_ids)
+            if apply_job_ids
+            else set()
+        )
+        result: Optional[Tuple[Set[int], Set[int]]]
+        try:
+            result = await self._user_store.update_user_job_relations(
+                tenant_id,
+                [job_id for job_id in apply_job_ids if job_id in existing_job_ids],
+                withdraw_job_ids,
+            )
+        except IntegrityError as exc:
+            # Job removed after checking for existence.
+            if exc.orig.pgcode == "23503":
+                return JSONResponse(
+                    asdict(INVALID_ID), status_code=int(INVALID_ID.status)
+                )
+            raise exc
+        except DBAPIError as exc:
+            # Invalid tenant id value (asyncpg reports it as a generic db error).
+            if exc.orig.pgcode == "22023":
+                return JSONResponse(
+                    asdict(INVALID_TENANT_ID), status_code=int(INVALID_TENANT_ID.status)
+                )
+            raise exc
+        # Tenant's role exists, but it has no user.
+        if result is None:
+            return JSONResponse(
+                asdict(INVALID_TENANT_ID), status_code=int(INVALID_TENANT_ID.status)
+            )
+        created, removed = result
+        results: List[dict] = []
+        for job_id, is_applied in operations:
+            error: Optional[Error] = None
+            if is_applied is True and job_id not in created:
+                error = REL_ALREADY_EXISTS if job_id in existing_job_ids else INVALID_ID
+            elif is_applied is False and job_id not in removed:
+                error = INVALID_ID
+            results.append(
+                {
+                    "jobId": str(job_id),
+                    "isApplied": is_applied,
+                    "error": None if error is None else asdict(error),
+                }
+            )
+        return JSONResponse(results)
+
+    def _encode_all(
+        self, jobs: List[dict], fields: Tuple[str, ...], applied_job_ids: Set[int]
+    ) -> bytes:
+        """Encode jobs, recording the time taken if metrics are enabled."""
+        metrics: Optional[Metrics] = self._app_context.engines.metrics
+        if metrics is None:
+            return self._job_encoder.encode_all(jobs, fields, applied_job_ids)
+        started: float = perf_counter()
+        encoded: bytes = self._job_encoder.encode_all(jobs, fields, applied_job_ids)
+        metrics.observe(ENCODE_SECONDS, (), perf_counter() - started)
+        return encoded
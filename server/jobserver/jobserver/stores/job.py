@@ -1,24 +1,358 @@
 """Handle database activities for `job` resource."""
-from typing import List
+from typing import AsyncIterator, Collection, List, Optional, Set, Tuple
+from bisect import bisect_right
+from dataclasses import dataclass, replace
 
-from sqlalchemy import MetaData, select
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    ColumnElement,
+    MetaData,
+    Select,
+    Table,
+    and_,
+    any_,
+    delete,
+    func,
+    literal,
+    or_,
+    select,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 
-from jobserver.contexts import DBConfig
-from jobserver.core.store import Store
+from jobserver.caches import CatalogueVersion, JobCache
+from jobserver.core.store import AsyncStore, Store
+from jobserver.engines import EngineRegistry
+from jobserver.metrics import timed
+
+# Jobs read per connection checkout by `stream`.
+_STREAM_BATCH_SIZE: int = 1000
+# Text search configuration of `Job.searchVector`.
+_SEARCH_CONFIG: str = "english"
+# Key of the search rank in jobs matching a search.
+SEARCH_RANK: str = "searchRank"
+
+
+def _job_columns(table: Table) -> List[Column]:
+    """Columns of a job, generated columns (search vector, parsed
+    columns) are left out."""
+    return [column for column in table.columns if column.computed is None]
+
+
+@dataclass(frozen=True)
+class JobQuery:
+    """Projection, filters and page of a job listing.
+
+    * `columns`: columns to select (`id` is always selected), all if `None`.
+    * `after`, `limit`: keyset page on job id.
+    * `search`: full text search (web search syntax). Matching jobs are ordered
+      by rank (highest first) and then by id, each job has its rank in
+      `SEARCH_RANK`. Pages continue after (`after_rank`, `after`).
+    * `company`: case insensitive company name.
+    * `location`: case insensitive place, eg: `Pune` for "Pune,Maharashtra".
+    * `min_experience`, `max_experience`: years of experience of the candidate,
+      jobs whose experience range overlaps with it are returned.
+    """
+
+    columns: Optional[Tuple[str, ...]] = None
+    after: Optional[int] = None
+    limit: Optional[int] = None
+    search: Optional[str] = None
+    after_rank: Optional[float] = None
+    company: Optional[str] = None
+    location: Optional[str] = None
+    min_experience: Optional[int] = None
+    max_experience: Optional[int] = None
+
+    @property
+    def is_filtered(self) -> bool:
+        """Whether jobs are searched or filtered. Served from db (indexes)."""
+        return (
+            self.search is not None
+            or self.company is not None
+            or self.location is not None
+            or self.min_experience is not None
+            or self.max_experience is not None
+        )
+
+
+def _filters(table: Table, query: JobQuery) -> List[ColumnElement]:
+    """Conditions of the query filters. Each one is served by an index on `Job`."""
+    conditions: List[ColumnElement] = []
+    if query.company is not None:
+        conditions.append(func.lower(table.c.company) == query.company.lower())
+    if query.location is not None:
+        conditions.append(
+            table.c.locationKeys.contains([query.location.strip().lower()])
+        )
+    if query.max_experience is not None:
+        conditions.append(table.c.minExperienceInYears <= query.max_experience)
+    if query.min_experience is not None:
+        # No max. experience for open ranges like "6+".
+        conditions.append(
+            or_(
+                table.c.maxExperienceInYears >= query.min_experience,
+                and_(
+                    table.c.maxExperienceInYears.is_(None),
+                    table.c.minExperienceInYears.is_not(None),
+                ),
+            )
+        )
+    return conditions
 
 
 class JobStore(Store):
     """Database activities related to job resource."""
 
-    def __init__(self, db_config: DBConfig, table_metadata: MetaData) -> None:
-        super().__init__(db_config, table_metadata)
+    def __init__(self, engines: EngineRegistry, table_metadata: MetaData) -> None:
+        super().__init__(engines, table_metadata)
 
     def get_all(self) -> List[dict]:
         """Get all jobs."""
-        stmt = select(self._table_metadata.tables["Job"])
+        stmt = select(*_job_columns(self._table_metadata.tables["Job"]))
         jobs: List[dict] = []
 
-        with self._engine.connect() as conn:
+        with self._engines.connect_read() as conn:
             for row in conn.execute(stmt):
                 jobs.append(row._asdict())
         return jobs
+
+
+class AsyncJobStore(AsyncStore):
+    """Asyncio database activities related to job resource.
+
+    Reads are served from `job_cache` when given. Only the (cheap) catalogue
+    version is read from db to validate it.
+    """
+
+    def __init__(
+        self,
+        engines: EngineRegistry,
+        table_metadata: MetaData,
+        job_cache: Optional[JobCache] = None,
+    ) -> None:
+        super().__init__(engines, table_metadata)
+        self._job_cache: Optional[JobCache] = job_cache
+
+    @timed
+    async def get_all(self, query: JobQuery = JobQuery()) -> List[dict]:
+        """Get jobs ordered by id (or rank if searched), projected and paginated
+        as per the query. Searches and filters are always served from db (indexes).
+        """
+        if self._job_cache is not None and not query.is_filtered:
+            if await self._ensure_cached():
+                return self._from_cache(query)
+            self._job_cache.stats.misses += 1
+        return await self._fetch(query)
+
+    @timed
+    async def get_existing_ids(self, job_ids: Collection[int]) -> Set[int]:
+        """Ids among the given ones, for which a job exists. Always read from db."""
+        table = self._table_metadata.tables["Job"]
+        stmt = select(table.c.id).where(
+            table.c.id == any_(literal(list(job_ids), ARRAY(BigInteger)))
+        )
+
+        async with self._engines.connect_async() as conn:
+            return set((await conn.execute(stmt)).scalars())
+
+    @timed
+    async def get_version(self) -> CatalogueVersion:
+        """Version of the catalogue. Changes on every insert, update or delete."""
+        table = self._table_metadata.tables["Job"]
+        stmt = select(
+            func.count(), func.max(table.c.id), func.max(table.c.lastModifiedTime)
+        )
+
+        async with self._engines.connect_read_async() as conn:
+            return tuple((await conn.execute(stmt)).one())
+
+    @timed
+    async def get_current_version(self) -> CatalogueVersion:
+        """Version of the catalogue, from cache (no db query) while it is fresh."""
+        if self._job_cache is not None and self._job_cache.is_fresh():
+            return self._job_cache.version
+        return await self.get_version()
+
+    @timed
+    async def get_changes(
+        self, since: int, columns: Optional[Tuple[str, ...]] = None
+    ) -> Tuple[List[dict], List[int]]:
+        """Jobs created / modified after `since` (epoch milliseconds), ordered by
+        modification, and ids of the jobs deleted after it. Read in one snapshot,
+        through the indexes on modification / deletion time. A negative `since`
+        reads every job and no deletion (full sync).
+        """
+        table = self._table_metadata.tables["Job"]
+        deletion_table = self._table_metadata.tables["JobDeletion"]
+        if columns is None:
+            selected: List[Column] = _job_columns(table)
+        else:
+            selected = [
+                table.c.id,
+                *(table.c[column] for column in columns if column != "id"),
+            ]
+        modified_stmt = (
+            select(*selected)
+            .where(table.c.lastModifiedTime > since)
+            .order_by(table.c.lastModifiedTime, table.c.id)
+        )
+        deleted_stmt = (
+            select(deletion_table.c.jobID)
+            .where(deletion_table.c.deletedTime > since)
+            .distinct()
+        )
+
+        async with self._engines.connect_read_async() as conn:
+            await conn.execution_options(isolation_level="REPEATABLE READ")
+            async with conn.begin():
+                jobs: List[dict] = [
+                    row._asdict() for row in await conn.execute(modified_stmt)
+                ]
+                deleted: List[int] = (
+                    list((await conn.execute(deleted_stmt)).scalars())
+                    if since >= 0
+                    else []
+                )
+        return jobs, deleted
+
+    @timed
+    async def prune_changes(self, before: int) -> int:
+        """Delete the change logs of the delta sync (`JobDeletion`,
+        `UserJobChange`) before `before` (epoch milliseconds), of every tenant.
+        Return the no. of rows deleted.
+        """
+        deletion_table = self._table_metadata.tables["JobDeletion"]
+        change_table = self._table_metadata.tables["UserJobChange"]
+        async with self._engines.connect_async() as conn:
+            async with conn.begin():
+                deletions = await conn.execute(
+                    delete(deletion_table).where(deletion_table.c.deletedTime < before)
+                )
+                changes = await conn.execute(
+                    delete(change_table).where(change_table.c.changedTime < before)
+                )
+        return deletions.rowcount + changes.rowcount
+
+    async def _ensure_cached(self) -> bool:
+        """Whether the latest catalogue is in cache, reloading it if outdated.
+        `False` if catalogue is too large to be cached.
+        """
+        job_cache: JobCache = self._job_cache
+        if not job_cache.is_fresh():
+            async with job_cache.lock:
+                # Another request might have refreshed it while waiting for lock.
+                if not job_cache.is_fresh() and await self._refresh_cache():
+                    job_cache.stats.misses += 1
+                    return True
+        if job_cache.jobs is None:
+            return False
+        job_cache.stats.hits += 1
+        return True
+
+    async def _refresh_cache(self) -> bool:
+        """Reload cached catalogue if its version has changed.
+        Return whether catalogue was reloaded into cache.
+        """
+        job_cache: JobCache = self._job_cache
+        job_cache.stats.version_checks += 1
+        # Version is read before the jobs, a change in between only causes one
+        # more reload.
+        version: CatalogueVersion = await self.get_version()
+        if version == job_cache.version:
+            job_cache.mark_checked()
+            return False
+        if version[0] > job_cache.max_jobs:
+            job_cache.store(version, None)
+            return False
+        job_cache.store(version, await self._fetch(JobQuery()))
+        return True
+
+    def _from_cache(self, query: JobQuery) -> List[dict]:
+        """Apply query on the cached catalogue."""
+        start: int = 0
+        if query.after is not None:
+            start = bisect_right(self._job_cache.ids, query.after)
+        stop: Optional[int] = None if query.limit is None else start + query.limit
+        jobs: List[dict] = self._job_cache.jobs[start:stop]
+        if query.columns is None:
+            return jobs
+        columns: Tuple[str, ...] = ("id",) + tuple(
+            column for column in query.columns if column != "id"
+        )
+        return [{column: job_obj[column] for column in columns} for job_obj in jobs]
+
+    async def _fetch(self, query: JobQuery) -> List[dict]:
+        jobs: List[dict] = []
+
+        async with self._engines.connect_read_async() as conn:
+            for row in await conn.execute(self._select(query)):
+                jobs.append(row._asdict())
+        return jobs
+
+    async def stream(self, query: JobQuery = JobQuery()) -> AsyncIterator[dict]:
+        """Yield jobs one by one, read in keyset pages of `_STREAM_BATCH_SIZE`.
+        Memory stays flat irrespective of the no. of jobs, and a connection is
+        held only while a page is read (not for a slow client). Like pages, each
+        one sees the jobs as of when it is read.
+        """
+        remaining: Optional[int] = query.limit
+        while remaining is None or remaining > 0:
+            batch_size: int = (
+                _STREAM_BATCH_SIZE
+                if remaining is None
+                else min(remaining, _STREAM_BATCH_SIZE)
+            )
+            jobs: List[dict] = await self._fetch(replace(query, limit=batch_size))
+            for job_obj in jobs:
+                yield job_obj
+            if len(jobs) < batch_size:
+                return
+            if remaining is not None:
+                remaining -= batch_size
+            query = replace(
+                query, after=jobs[-1]["id"], after_rank=jobs[-1].get(SEARCH_RANK)
+            )
+
+    def _select(self, query: JobQuery) -> Select:
+        table = self._table_metadata.tables["Job"]
+        if query.columns is None:
+            columns: List[Column] = _job_columns(table)
+        else:
+            columns = [
+                table.c.id,
+                *(table.c[column] for column in query.columns if column != "id"),
+            ]
+        if query.search is not None:
+            return self._select_matching(table, columns, query)
+        stmt = select(*columns).where(*_filters(table, query)).order_by(table.c.id)
+        if query.after is not None:
+            stmt = stmt.where(table.c.id > query.after)
+        if query.limit is not None:
+            stmt = stmt.limit(query.limit)
+        return stmt
+
+    @staticmethod
+    def _select_matching(
+        table: Table, columns: List[Column], query: JobQuery
+    ) -> Select:
+        """Jobs matching the search, served by the GIN index on `searchVector`."""
+        ts_query = func.websearch_to_tsquery(_SEARCH_CONFIG, query.search)
+        rank = func.ts_rank(table.c.searchVector, ts_query)
+        stmt = (
+            select(*columns, rank.label(SEARCH_RANK))
+            .where(
+                table.c.searchVector.bool_op("@@")(ts_query), *_filters(table, query)
+            )
+            .order_by(rank.desc(), table.c.id)
+        )
+        if query.after is not None:
+            stmt = stmt.where(
+                or_(
+                    rank < query.after_rank,
+                    and_(rank == query.after_rank, table.c.id > query.after),
+                )
+            )
+        if query.limit is not None:
+            stmt = stmt.limit(query.limit)
+        return stmt
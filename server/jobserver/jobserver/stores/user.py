@@ -1,19 +1,24 @@
 """Handle user related store apis."""
-from typing import Set
+from typing import Collection, List, Optional, Set, Tuple
 
-from sqlalchemy import MetaData, select, insert, delete, func
+from sqlalchemy import BigInteger, MetaData, select, insert, delete, func, literal, any_
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from jobserver.contexts import DBConfig
-from jobserver.core.store import Store
-from jobserver.db import DBSession
-from jobserver.utils import generate_id
+from jobserver.caches import AppliedJobsCache
+from jobserver.core.store import AsyncStore, Store
+from jobserver.engines import EngineRegistry
+from jobserver.metrics import timed
+from jobserver.db import AsyncDBSession, DBSession
+from jobserver.migrations import is_partitioned
+from jobserver.utils import generate_id, generate_id_async, generate_ids_async
 
 
 class UserStore(Store):
     """Database activities related to user resource."""
 
-    def __init__(self, db_config: DBConfig, table_metadata: MetaData) -> None:
-        super().__init__(db_config, table_metadata)
+    def __init__(self, engines: EngineRegistry, table_metadata: MetaData) -> None:
+        super().__init__(engines, table_metadata)
 
     def get_user_job_ids(self, tenant_id: int) -> Set[int]:
         """Get all job ids for which user has applied."""
@@ -21,12 +26,14 @@ class UserStore(Store):
         stmt = select(func.array_agg(table.c.jobID))
         job_ids: Set[int] = set()
 
-        with self._engine.connect() as conn:
-            db_session: DBSession = DBSession(conn, tenant_id)
+        with self._engines.connect_read(tenant_id) as conn:
+            db_session: DBSession = DBSession(conn, tenant_id, self._engines.tenancy)
             db_session.open()
-            for row in conn.execute(stmt):
-                job_ids = job_ids.union(row[0])
-            db_session.close()
+            try:
+                for row in conn.execute(stmt):
+                    job_ids = job_ids.union(row[0])
+            finally:
+                db_session.close()
         return job_ids
 
     def get_user_id(self, tenant_id: int) -> int:
@@ -34,25 +41,33 @@ class UserStore(Store):
         table = self._table_metadata.tables["User"]
         stmt = select(table.c.id)
 
-        with self._engine.connect() as conn:
-            db_session: DBSession = DBSession(conn, tenant_id)
+        with self._engines.connect() as conn:
+            db_session: DBSession = DBSession(conn, tenant_id, self._engines.tenancy)
             db_session.open()
-            user_id: int = conn.execute(stmt).fetchone()[0]
-            db_session.close()
+            try:
+                user_id: int = conn.execute(stmt).fetchone()[0]
+            finally:
+                db_session.close()
         return user_id
 
     def create_user_job_relation(self, tenant_id: int, job_id: int) -> None:
         """Create user - job relation."""
         table = self._table_metadata.tables["UserJob"]
         stmt = insert(table).values(
-            id=generate_id(tenant_id), userID=self.get_user_id(tenant_id), jobID=job_id
+            id=generate_id(tenant_id),
+            tenantID=tenant_id,
+            userID=self.get_user_id(tenant_id),
+            jobID=job_id,
         )
 
-        with self._engine.connect() as conn:
-            db_session: DBSession = DBSession(conn, tenant_id)
+        with self._engines.connect() as conn:
+            db_session: DBSession = DBSession(conn, tenant_id, self._engines.tenancy)
             db_session.open()
-            conn.execute(stmt)
-            db_session.close()
+            try:
+                conn.execute(stmt)
+            finally:
+                db_session.close()
+        self._engines.record_write(tenant_id)
 
     def remove_user_job_relation(self, tenant_id: int, job_id: int) -> None:
         """Remove the given user - job relation."""
@@ -60,12 +75,219 @@ class UserStore(Store):
         stmt = delete(table).where(table.c.jobID == job_id).returning(table.c.id)
         record_exists: bool = False
 
-        with self._engine.connect() as conn:
-            db_session: DBSession = DBSession(conn, tenant_id)
+        with self._engines.connect() as conn:
+            db_session: DBSession = DBSession(conn, tenant_id, self._engines.tenancy)
             db_session.open()
-            for row in conn.execute(stmt):
-                record_exists = True
-                break
+            try:
+                for row in conn.execute(stmt):
+                    record_exists = True
+                    break
+            finally:
+                db_session.close()
+        self._engines.record_write(tenant_id)
+        return record_exists
+
+
+class AsyncUserStore(AsyncStore):
+    """Asyncio database activities related to user resource.
+
+    Every method is a single tenant scoped unit of work (`AsyncDBSession`), on
+    one connection. Applied job ids are served from `applied_jobs_cache` when
+    given, writes update it. Layout of `UserJob` (partitioned or not) is looked
+    up once, servers are restarted after a conversion.
+    """
+
+    def __init__(
+        self,
+        engines: EngineRegistry,
+        table_metadata: MetaData,
+        applied_jobs_cache: Optional[AppliedJobsCache] = None,
+    ) -> None:
+        super().__init__(engines, table_metadata)
+        self._applied_jobs_cache: Optional[AppliedJobsCache] = applied_jobs_cache
+        self._user_job_partitioned: Optional[bool] = None
+
+    @timed
+    async def get_user_job_ids(self, tenant_id: int) -> Set[int]:
+        """Get all job ids for which user has applied."""
+        cache: Optional[AppliedJobsCache] = self._applied_jobs_cache
+        if cache is None:
+            return await self._fetch_user_job_ids(tenant_id)
+        job_ids: Optional[Set[int]] = cache.get(tenant_id)
+        if job_ids is None:
+            generation: int = cache.generation(tenant_id)
+            job_ids = await self._fetch_user_job_ids(tenant_id)
+            cache.store(tenant_id, job_ids, generation)
+        return job_ids
+
+    async def _fetch_user_job_ids(self, tenant_id: int) -> Set[int]:
+        table = self._table_metadata.tables["UserJob"]
+        stmt = select(func.array_agg(table.c.jobID))
+
+        async with self._engines.connect_read_async(tenant_id) as conn:
+            async with AsyncDBSession(conn, tenant_id, self._engines.tenancy):
+                job_ids: Optional[List[int]] = (await conn.execute(stmt)).scalar()
+        return set(job_ids or [])
+
+    @timed
+    async def get_user_job_changes(
+        self, tenant_id: int, since: int
+    ) -> Tuple[Set[int], Set[int]]:
+        """Job ids applied and withdrawn by the tenant after `since` (epoch
+        milliseconds). A job withdrawn and applied again is only applied.
+        """
+        table = self._table_metadata.tables["UserJobChange"]
+        stmt = select(table.c.jobID, table.c.isApplied).where(
+            table.c.changedTime > since
+        )
+        applied: Set[int] = set()
+        withdrawn: Set[int] = set()
+
+        async with self._engines.connect_read_async(tenant_id) as conn:
+            async with AsyncDBSession(conn, tenant_id, self._engines.tenancy):
+                for job_id, is_applied in await conn.execute(stmt):
+                    (applied if is_applied else withdrawn).add(job_id)
+        # A job has only one relation at a time, the one applied is the latest.
+        return applied, withdrawn - applied
+
+    @timed
+    async def get_user_id(self, tenant_id: int) -> int:
+        """Get user-id of the tenant."""
+        table = self._table_metadata.tables["User"]
+        stmt = select(table.c.id)
+
+        async with self._engines.connect_async() as conn:
+            async with AsyncDBSession(conn, tenant_id, self._engines.tenancy):
+                user_id: int = (await conn.execute(stmt)).scalar_one()
+        return user_id
+
+    @timed
+    async def create_user_job_relation(self, tenant_id: int, job_id: int) -> bool:
+        """Create user - job relation.
+        User id is looked up in the same statement (`insert ... select`).
+        Return `False` if tenant has no user.
+        """
+        table = self._table_metadata.tables["UserJob"]
+        user_table = self._table_metadata.tables["User"]
+        # Before the checkout, it may wait for the clock.
+        relation_id: int = await generate_id_async(tenant_id)
+        stmt = (
+            insert(table)
+            .from_select(
+                ["id", "tenantID", "userID", "jobID"],
+                select(
+                    literal(relation_id, BigInteger),
+                    literal(tenant_id, BigInteger),
+                    user_table.c.id,
+                    literal(job_id, BigInteger),
+                ),
+            )
+            .returning(table.c.id)
+        )
+
+        async with self._engines.connect_async() as conn:
+            async with AsyncDBSession(conn, tenant_id, self._engines.tenancy):
+                created: bool = (await conn.execute(stmt)).first() is not None
+        self._record_write(tenant_id, applied=[job_id] if created else ())
+        return created
+
+    @timed
+    async def remove_user_job_relation(self, tenant_id: int, job_id: int) -> bool:
+        """Remove the given user - job relation."""
+        table = self._table_metadata.tables["UserJob"]
+        stmt = delete(table).where(table.c.jobID == job_id).returning(table.c.id)
 
-            db_session.close()
+        async with self._engines.connect_async() as conn:
+            async with AsyncDBSession(conn, tenant_id, self._engines.tenancy):
+                record_exists: bool = (await conn.execute(stmt)).first() is not None
+        self._record_write(tenant_id, withdrawn=[job_id] if record_exists else ())
         return record_exists
+
+    @timed
+    async def update_user_job_relations(
+        self,
+        tenant_id: int,
+        apply_job_ids: Collection[int],
+        withdraw_job_ids: Collection[int],
+    ) -> Optional[Tuple[Set[int], Set[int]]]:
+        """Create and remove user - job relations of a tenant in one transaction.
+
+        Return job ids of the relations actually created and removed, relations
+        which already exist / don't exist are left as it is. `None` if tenant
+        has no user.
+        """
+        table = self._table_metadata.tables["UserJob"]
+        user_table = self._table_metadata.tables["User"]
+        created: Set[int] = set()
+        removed: Set[int] = set()
+        # Before the checkout, it may wait for the clock.
+        relation_ids: List[int] = await generate_ids_async(
+            tenant_id, len(apply_job_ids)
+        )
+
+        async with self._engines.connect_async() as conn:
+            async with AsyncDBSession(conn, tenant_id, self._engines.tenancy):
+                if apply_job_ids:
+                    rows = func.unnest(
+                        literal(relation_ids, ARRAY(BigInteger)),
+                        literal(list(apply_job_ids), ARRAY(BigInteger)),
+                    ).table_valued("id", "jobID")
+                    stmt = (
+                        pg_insert(table)
+                        .from_select(
+                            ["id", "tenantID", "userID", "jobID"],
+                            select(
+                                rows.c.id,
+                                literal(tenant_id, BigInteger),
+                                user_table.c.id,
+                                rows.c.jobID,
+                            ),
+                        )
+                        # Only an existing relation is skipped, a conflict of
+                        # ids is raised.
+                        .on_conflict_do_nothing(
+                            index_elements=await self._user_job_unique(conn)
+                        )
+                        .returning(table.c.jobID)
+                    )
+                    created = set((await conn.execute(stmt)).scalars())
+                    # Nothing is created when the tenant has no user as well.
+                    if (
+                        len(created) < len(apply_job_ids)
+                        and (await conn.execute(select(user_table.c.id))).first()
+                        is None
+                    ):
+                        return None
+                if withdraw_job_ids:
+                    stmt = (
+                        delete(table)
+                        .where(
+                            table.c.jobID
+                            == any_(literal(list(withdraw_job_ids), ARRAY(BigInteger)))
+                        )
+                        .returning(table.c.jobID)
+                    )
+                    removed = set((await conn.execute(stmt)).scalars())
+        self._record_write(tenant_id, applied=created, withdrawn=removed)
+        return created, removed
+
+    async def _user_job_unique(self, conn: AsyncConnection) -> List[str]:
+        """Columns of the unique constraint of a relation, partitioned `UserJob`
+        has the tenant in it.
+        """
+        if self._user_job_partitioned is None:
+            self._user_job_partitioned = await conn.run_sync(is_partitioned, "UserJob")
+        if self._user_job_partitioned:
+            return ["tenantID", "userID", "jobID"]
+        return ["userID", "jobID"]
+
+    def _record_write(
+        self,
+        tenant_id: int,
+        applied: Collection[int] = (),
+        withdrawn: Collection[int] = (),
+    ) -> None:
+        """Record a committed write of the tenant (read-your-writes, cache)."""
+        self._engines.record_write(tenant_id)
+        if self._applied_jobs_cache is not None:
+            self._applied_jobs_cache.record_write(tenant_id, applied, withdrawn)
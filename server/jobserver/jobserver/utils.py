@@ -1,33 +1,253 @@
 """Utilities."""
+import asyncio
+import fcntl
+import os
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from time import time
-from random import randrange
+from threading import Lock
+from time import sleep, time
 
 
-_OFFSET_2022_02_02_MILLI: int = int(
-    datetime(year=2022, month=2, day=2).timestamp() * 1000
-)
+_OFFSET_2022_02_02: int = int(datetime(year=2022, month=2, day=2).timestamp())
 _TENANT_ID_RSHIFT_OFFSET: int = 47
+_MAX_BIGINT: int = 2**63 - 1
+MAX_TENANT_ID: int = _MAX_BIGINT >> _TENANT_ID_RSHIFT_OFFSET
+_WORKER_ID_BITS: int = 5
+_SEQUENCE_BITS: int = 10
+_TIMESTAMP_OFFSET: int = _WORKER_ID_BITS + _SEQUENCE_BITS
+MAX_WORKER_ID: int = 2**_WORKER_ID_BITS - 1
+_MAX_SEQUENCE: int = 2**_SEQUENCE_BITS - 1
+# Seconds a tenant's sequence may run ahead of the clock, by borrowing slots of
+# the following seconds. Beyond it, id generation waits for the clock.
+_BORROW_SECONDS: int = 3
+MAX_IDS_PER_CALL: int = (_BORROW_SECONDS + 1) << _SEQUENCE_BITS
+# Worker id of tools writing to the db (`InitData`, benchmarks), servers use the
+# ones below it.
+TOOL_WORKER_ID: int = MAX_WORKER_ID
+
+
+def _now_seconds() -> int:
+    return int(time()) - _OFFSET_2022_02_02
+
+
+class _IdSequences:
+    """Per process state of id generation.
+
+    Each tenant has a monotonic sequence of slots, `seconds << 10 | sequence`.
+    A slot is never reused by the process, a tenant needing more than 1024 ids
+    in a second borrows slots of the following seconds, up to `_BORROW_SECONDS`
+    ahead of the clock.
+
+    A process doesn't know the slots borrowed by an earlier process of the same
+    worker id (eg: a restarted worker), which are up to `_BORROW_SECONDS` after
+    its last second. So slots of a process start after the borrow window of the
+    second it starts in, its first ids wait for the next second.
+    """
+
+    def __init__(self, worker_id: int) -> None:
+        self.pid: int = os.getpid()
+        self.worker_id: int = worker_id
+        self.lock: Lock = Lock()
+        self.last_slots: Dict[int, int] = {}
+        self.first_slot: int = (_now_seconds() + _BORROW_SECONDS + 1) << _SEQUENCE_BITS
+
+    def try_reserve(self, tenant_id: int, count: int) -> Tuple[Optional[int], float]:
+        """Reserve `count` consecutive slots of the tenant if they are within the
+        borrow window. Returns the first one, or `None` and the seconds to wait
+        for the clock.
+        """
+        now: int = _now_seconds()
+        with self.lock:
+            first: int = max(
+                self.last_slots.get(tenant_id, -1) + 1,
+                now << _SEQUENCE_BITS,
+                self.first_slot,
+            )
+            last: int = first + count - 1
+            if (last >> _SEQUENCE_BITS) - now <= _BORROW_SECONDS:
+                self.last_slots[tenant_id] = last
+                return first, 0
+        return None, max(
+            (last >> _SEQUENCE_BITS) - _BORROW_SECONDS + _OFFSET_2022_02_02 - time(),
+            0,
+        )
+
+    def reserve(self, tenant_id: int, count: int) -> int:
+        """`try_reserve`, sleeps till the slots are within the borrow window."""
+        while True:
+            first, delay = self.try_reserve(tenant_id, count)
+            if first is not None:
+                return first
+            sleep(delay)
+
+    async def reserve_async(self, tenant_id: int, count: int) -> int:
+        """`reserve` without blocking the event loop."""
+        while True:
+            first, delay = self.try_reserve(tenant_id, count)
+            if first is not None:
+                return first
+            await asyncio.sleep(delay)
+
+
+_SEQUENCES: Optional[_IdSequences] = None
+
+
+def set_worker_id(worker_id: int) -> None:
+    """Set worker id of the process, MUST be unique among the live processes
+    writing to the db (eg: index of the worker, `jobserver.launcher` sets
+    `WORKER_ID` of each one, `claim_worker_id` checks it among the processes of
+    the host). Ids are not generated without it, a forked process has to set
+    its own.
+    """
+    global _SEQUENCES  # pylint: disable=global-statement
+    if not 0 <= worker_id <= MAX_WORKER_ID:
+        raise ValueError(f"Worker id MUST be in [0, {MAX_WORKER_ID}]")
+    _SEQUENCES = _IdSequences(worker_id)
+
+
+# Worker id claimed by the process, `(pid, worker id, fd of its lock file)`.
+_CLAIM: Optional[Tuple[int, int, int]] = None
+
+
+def _lock(lock_dir: str, worker_id: int) -> Optional[int]:
+    """Fd of the locked file of the worker id, `None` if another process holds
+    it. `lockf` locks are of the process, a forked process doesn't inherit them.
+    """
+    fd: int = os.open(
+        os.path.join(lock_dir, f"{worker_id}.lock"), os.O_RDWR | os.O_CREAT, 0o644
+    )
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def claim_worker_id(lock_dir: str, worker_id: Optional[int] = None) -> int:
+    """Claim a worker id among the processes of the host and set it
+    (`set_worker_id`), the given one or else the first free one below
+    `TOOL_WORKER_ID`. A claim is a lock on `<lock_dir>/<worker id>.lock`, held
+    till the process exits.
+
+    Raises `RuntimeError` if the worker id (or every one) is held by another
+    live process, eg: `WORKER_ID` shared by the workers of `uvicorn --workers`.
+    """
+    global _CLAIM  # pylint: disable=global-statement
+    if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+        raise ValueError(f"Worker id MUST be in [0, {MAX_WORKER_ID}]")
+    claim: Optional[Tuple[int, int, int]] = _CLAIM
+    if claim is not None and claim[0] == os.getpid():
+        if worker_id is None or worker_id == claim[1]:
+            # Sequences of the claim are kept, their slots may be borrowed.
+            if _SEQUENCES is None or _SEQUENCES.worker_id != claim[1]:
+                set_worker_id(claim[1])
+            return claim[1]
+        # Closing any fd of the file would release the lock, this is the only one.
+        os.close(claim[2])
+        _CLAIM = None
+    os.makedirs(lock_dir, exist_ok=True)
+    candidates: List[int] = (
+        list(range(TOOL_WORKER_ID)) if worker_id is None else [worker_id]
+    )
+    for candidate in candidates:
+        fd: Optional[int] = _lock(lock_dir, candidate)
+        if fd is not None:
+            set_worker_id(candidate)
+            _CLAIM = (os.getpid(), candidate, fd)
+            return candidate
+    if worker_id is None:
+        raise RuntimeError(f"No free worker id in [0, {TOOL_WORKER_ID})")
+    raise RuntimeError(f"Worker id {worker_id} is held by another process")
+
+
+def _sequences() -> _IdSequences:
+    """State of the current process."""
+    sequences: Optional[_IdSequences] = _SEQUENCES
+    if sequences is None or sequences.pid != os.getpid():
+        raise RuntimeError("Worker id of the process is not set (set_worker_id)")
+    return sequences
 
 
 def generate_id(tenant_id: int) -> int:
     """Generate user-specific id to use in DB.
 
-    * Total 64 bits.
-    * Assuming 100000 users' data will be stored in a single db instance.
-      So `17bits` are needed for user-id
+    * Total 64 bits (signed).
+    1. First 16bits tenant-id.
+    2. Next 32bits seconds since 2022-02-02.
+    3. Next 5bits worker id (`set_worker_id`).
+    4. Next 10bits per tenant sequence of the process.
 
-    1. First 17bits user-id.
-    2. Next 42bits timestmap diff from 2023-03-03
-    3. Next 4bits random number.
+    Ids are unique as long as worker ids of the live processes are unique, up to
+    1024 ids per tenant in a second are generated without borrowing from the
+    following seconds, and without waiting for the clock on average.
+    NOTE: Ids are above the ones of the previous layout (milliseconds << 5),
+          generated up to the same second.
     """
-    timestamp_offset: int = 5
+    return generate_ids(tenant_id, 1)[0]
+
 
-    timestamp_diff: int = int(time() * 1000) - _OFFSET_2022_02_02_MILLI
+def _check_count(tenant_id: int, count: int) -> None:
+    if not 0 <= tenant_id <= MAX_TENANT_ID:
+        raise ValueError(f"Tenant id MUST be in [0, {MAX_TENANT_ID}]")
+    if not 0 <= count <= MAX_IDS_PER_CALL:
+        raise ValueError(f"Count MUST be in [0, {MAX_IDS_PER_CALL}]")
 
-    return (
-        (tenant_id << _TENANT_ID_RSHIFT_OFFSET)
-        + (timestamp_diff << timestamp_offset)
-        # 4 bit random number.
-        + (randrange(0, (2**4) - 1))
+
+def _slot_ids(worker_id: int, tenant_id: int, slot: int, count: int) -> List[int]:
+    """Ids of `count` slots from `slot`."""
+    stop_slot: int = slot + count
+    prefix: int = (tenant_id << _TENANT_ID_RSHIFT_OFFSET) | (
+        worker_id << _SEQUENCE_BITS
     )
+    ids: List[int] = []
+    # Ids of consecutive slots within a second are consecutive.
+    while slot < stop_slot:
+        second_stop: int = min((slot | _MAX_SEQUENCE) + 1, stop_slot)
+        base: int = prefix | ((slot >> _SEQUENCE_BITS) << _TIMESTAMP_OFFSET)
+        ids.extend(
+            range(
+                base | (slot & _MAX_SEQUENCE),
+                base + ((second_stop - 1) & _MAX_SEQUENCE) + 1,
+            )
+        )
+        slot = second_stop
+    return ids
+
+
+def generate_ids(tenant_id: int, count: int) -> List[int]:
+    """`count` distinct ids for the tenant, in ascending order.
+    See `generate_id` for the layout.
+    """
+    _check_count(tenant_id, count)
+    if count == 0:
+        return []
+    sequences: _IdSequences = _sequences()
+    slot: int = sequences.reserve(tenant_id, count)
+    return _slot_ids(sequences.worker_id, tenant_id, slot, count)
+
+
+async def generate_ids_async(tenant_id: int, count: int) -> List[int]:
+    """`generate_ids` for coroutines, waiting for the clock (a fresh process, a
+    tenant beyond the borrow window) doesn't block the event loop.
+    """
+    _check_count(tenant_id, count)
+    if count == 0:
+        return []
+    sequences: _IdSequences = _sequences()
+    slot: int = await sequences.reserve_async(tenant_id, count)
+    return _slot_ids(sequences.worker_id, tenant_id, slot, count)
+
+
+async def generate_id_async(tenant_id: int) -> int:
+    """`generate_id` for coroutines, see `generate_ids_async`."""
+    return (await generate_ids_async(tenant_id, 1))[0]
+
+
+def tenant_id_range(tenant_id: int) -> Tuple[int, Optional[int]]:
+    """Ids generated for the tenant are in `[start, stop)`.
+    `stop` is `None` if it is beyond the max. id (last tenant).
+    """
+    start: int = tenant_id << _TENANT_ID_RSHIFT_OFFSET
+    stop: int = (tenant_id + 1) << _TENANT_ID_RSHIFT_OFFSET
+    return start, (None if stop > _MAX_BIGINT else stop)
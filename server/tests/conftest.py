@@ -0,0 +1,5 @@
+"""Tests import `jobserver` of this tree, run from `server`: `pytest tests`."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "jobserver"))
@@ -0,0 +1,111 @@
+"""Admission control (`jobserver.admission`)."""
+import asyncio
+
+from jobserver.admission import READ, WRITE, AdmissionController, RouteLimits
+
+
+def _controller(
+    max_concurrency: int = 1, max_queue: int = 1, pool_wait: float = 0
+) -> AdmissionController:
+    limits: RouteLimits = RouteLimits(
+        max_concurrency=max_concurrency,
+        max_queue=max_queue,
+        queue_timeout=0.05,
+        max_pool_wait=1,
+    )
+    return AdmissionController(
+        {READ: limits, WRITE: limits},
+        {"fetch_all": READ, "update": WRITE, "update_all": WRITE},
+        lambda: pool_wait,
+    )
+
+
+def test_routes_of_a_class_share_the_limiter() -> None:
+    controller: AdmissionController = _controller()
+    assert controller.limiter("update") is controller.limiter("update_all")
+    assert controller.limiter("update") is not controller.limiter("fetch_all")
+    assert controller.limiter("events") is None
+    assert set(controller.stats()) == {READ, WRITE}
+
+
+def test_slot_is_handed_over() -> None:
+    async def _run() -> None:
+        controller: AdmissionController = _controller()
+        limiter = controller.limiter("update")
+        assert await controller.admit(limiter)
+        waiting: asyncio.Task = asyncio.create_task(controller.admit(limiter))
+        await asyncio.sleep(0)
+        # A write of the other route waits for the same class.
+        assert limiter.waiting == 1
+        limiter.release()
+        assert await waiting
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(_run())
+
+
+def test_rejected_when_full_or_timed_out() -> None:
+    async def _run() -> None:
+        controller: AdmissionController = _controller()
+        limiter = controller.limiter("fetch_all")
+        assert await controller.admit(limiter)
+        waiting: asyncio.Task = asyncio.create_task(controller.admit(limiter))
+        await asyncio.sleep(0)
+        assert not await controller.admit(limiter)
+        assert not await waiting
+        assert limiter.stats.rejected_queue_full == 1
+        assert limiter.stats.rejected_timeout == 1
+        assert limiter.waiting == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(_run())
+
+
+def test_rejected_while_pool_is_saturated() -> None:
+    async def _run() -> None:
+        controller: AdmissionController = _controller(pool_wait=5)
+        limiter = controller.limiter("fetch_all")
+        assert await controller.admit(limiter)
+        assert not await controller.admit(limiter)
+        assert limiter.stats.rejected_pool_wait == 1
+
+    asyncio.run(_run())
+
+
+def test_slot_handed_over_to_cancelled_request_is_released() -> None:
+    async def _run() -> None:
+        controller: AdmissionController = _controller()
+        limiter = controller.limiter("update")
+        assert await controller.admit(limiter)
+        waiting: asyncio.Task = asyncio.create_task(controller.admit(limiter))
+        await asyncio.sleep(0)
+        # Client gone right after the slot was handed over.
+        limiter.release()
+        waiting.cancel()
+        try:
+            await waiting
+        except asyncio.CancelledError:
+            pass
+        assert limiter.active == 0
+        assert limiter.try_acquire()
+
+    asyncio.run(_run())
+
+
+def test_cancelled_while_waiting() -> None:
+    async def _run() -> None:
+        controller: AdmissionController = _controller()
+        limiter = controller.limiter("update")
+        assert await controller.admit(limiter)
+        waiting: asyncio.Task = asyncio.create_task(controller.admit(limiter))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert limiter.waiting == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(_run())
@@ -0,0 +1,85 @@
+"""In-process caches (`jobserver.caches`)."""
+from jobserver.caches import AppliedJobsCache, JobCache
+
+
+def test_job_cache() -> None:
+    cache: JobCache = JobCache(max_jobs=10, check_interval=60)
+    assert cache.version is None
+    assert not cache.is_fresh()
+    cache.store((2, 2, 100), [{"id": 1}, {"id": 2}])
+    assert cache.is_fresh()
+    assert cache.ids == [1, 2]
+    assert cache.stats.refreshes == 1
+    # Too large to cache, only its version is kept.
+    cache.store((20, 20, 200), None)
+    assert cache.version == (20, 20, 200)
+    assert cache.jobs is None
+    assert cache.ids == []
+    assert cache.stats.refreshes == 1
+
+
+def test_job_cache_check_interval() -> None:
+    cache: JobCache = JobCache(max_jobs=10, check_interval=0)
+    cache.store((0, None, None), [])
+    assert not cache.is_fresh()
+
+
+def test_applied_jobs() -> None:
+    cache: AppliedJobsCache = AppliedJobsCache(max_tenants=10, ttl=60)
+    assert cache.get(1) is None
+    cache.store(1, [3, 1, 2], cache.generation(1))
+    assert cache.get(1) == {1, 2, 3}
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+
+def test_applied_jobs_write_through() -> None:
+    cache: AppliedJobsCache = AppliedJobsCache(max_tenants=10, ttl=60)
+    cache.store(1, [1, 2], cache.generation(1))
+    cache.record_write(1, applied=[3], withdrawn=[1])
+    assert cache.get(1) == {2, 3}
+    assert cache.stats.write_throughs == 1
+    # Tenants not cached are only marked as written.
+    cache.record_write(2, applied=[3])
+    assert cache.get(2) is None
+
+
+def test_applied_jobs_read_before_write_is_not_cached() -> None:
+    cache: AppliedJobsCache = AppliedJobsCache(max_tenants=10, ttl=60)
+    generation: int = cache.generation(1)
+    # Write committed while the read was in flight.
+    cache.record_write(1, applied=[5])
+    cache.store(1, [], generation)
+    assert cache.get(1) is None
+    cache.store(1, [5], cache.generation(1))
+    assert cache.get(1) == {5}
+
+
+def test_applied_jobs_generations_are_bounded() -> None:
+    cache: AppliedJobsCache = AppliedJobsCache(max_tenants=2, ttl=60)
+    generation: int = cache.generation(1)
+    for tenant_id in range(2, 5):
+        cache.record_write(tenant_id)
+    # Tenant 1 is not tracked, reads in flight are dropped all the same.
+    cache.store(1, [1], generation)
+    assert cache.get(1) is None
+    cache.store(1, [1], cache.generation(1))
+    assert cache.get(1) == {1}
+
+
+def test_applied_jobs_expire() -> None:
+    cache: AppliedJobsCache = AppliedJobsCache(max_tenants=10, ttl=0)
+    cache.store(1, [1], cache.generation(1))
+    assert cache.get(1) is None
+    assert cache.stats.expirations == 1
+
+
+def test_applied_jobs_lru() -> None:
+    cache: AppliedJobsCache = AppliedJobsCache(max_tenants=2, ttl=60)
+    for tenant_id in (1, 2):
+        cache.store(tenant_id, [tenant_id], cache.generation(tenant_id))
+    cache.get(1)
+    cache.store(3, [3], cache.generation(3))
+    assert cache.get(2) is None
+    assert cache.get(1) == {1}
+    assert cache.stats.evictions == 1
+    assert cache.memory()["tenants"] == 2
@@ -0,0 +1,153 @@
+"""Response compression (`jobserver.compression`)."""
+import gzip
+import zlib
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from jobserver.compression import (
+    CompressedBodyCache,
+    CompressionLevels,
+    CompressionMiddleware,
+    _StreamCompressor,
+    available_encodings,
+    compress,
+    negotiate,
+)
+
+_BODY: bytes = b'{"jobs":[' + b'{"name":"Software Engineer"},' * 200 + b"{}]}"
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip", "gzip"),
+        ("GZIP, deflate", "gzip"),
+        ("br, gzip", "br"),
+        ("br;q=0, gzip", "gzip"),
+        ("gzip;q=0.5, zstd;q=0.1", "zstd"),
+        ("*", "br"),
+        ("*;q=0", None),
+        ("gzip;q=0", None),
+        ("gzip;q=x", None),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate(accept_encoding: str, expected: str) -> None:
+    assert negotiate(accept_encoding, ["br", "zstd", "gzip"]) == expected
+
+
+def test_available_encodings() -> None:
+    # gzip (stdlib) is always available, the least preferred.
+    assert available_encodings()[-1] == "gzip"
+
+
+def test_compress_gzip() -> None:
+    assert gzip.decompress(compress(_BODY, "gzip", CompressionLevels())) == _BODY
+
+
+def test_stream_compressor_flushes_every_chunk() -> None:
+    compressor: _StreamCompressor = _StreamCompressor("gzip", CompressionLevels())
+    decompressor = zlib.decompressobj(31)
+    for chunk in (b"[1,", b"2,", b"3]"):
+        # Each chunk can be decoded as soon as it is received.
+        assert decompressor.decompress(compressor.compress(chunk)) == chunk
+    assert decompressor.decompress(compressor.finish()) == b""
+    assert decompressor.eof
+
+
+def test_body_cache_is_bounded() -> None:
+    cache: CompressedBodyCache = CompressedBodyCache(max_entries=2, max_bytes=10)
+    cache.put(("a", "gzip"), b"1234")
+    cache.put(("b", "gzip"), b"1234")
+    assert cache.get(("a", "gzip")) == b"1234"
+    # Least recently used is evicted, by entries.
+    cache.put(("c", "gzip"), b"12")
+    assert cache.get(("b", "gzip")) is None
+    # And by bytes.
+    cache.put(("d", "gzip"), b"123456")
+    assert cache.get(("a", "gzip")) is None
+    assert cache.get(("d", "gzip")) == b"123456"
+    # Larger than the cache, not cached.
+    cache.put(("e", "gzip"), b"12345678901")
+    assert cache.get(("e", "gzip")) is None
+
+
+@pytest.fixture(name="middleware")
+def fixture_middleware() -> CompressionMiddleware:
+    """App of json, streamed and event responses, compressed."""
+
+    async def _json(_: Request) -> Response:
+        return Response(_BODY, media_type="application/json")
+
+    async def _tagged(_: Request) -> Response:
+        return Response(_BODY, media_type="application/json", headers={"ETag": "1"})
+
+    async def _small(_: Request) -> Response:
+        return Response(b"{}", media_type="application/json")
+
+    async def _stream(_: Request) -> Response:
+        async def _chunks():
+            yield _BODY[:100]
+            yield _BODY[100:]
+
+        return StreamingResponse(_chunks(), media_type="application/x-ndjson")
+
+    async def _events(_: Request) -> Response:
+        return PlainTextResponse(_BODY, media_type="text/event-stream")
+
+    app: Starlette = Starlette(
+        routes=[
+            Route("/json", _json),
+            Route("/tagged", _tagged),
+            Route("/small", _small),
+            Route("/stream", _stream),
+            Route("/events", _events),
+        ]
+    )
+    return CompressionMiddleware(app)
+
+
+@pytest.fixture(name="client")
+def fixture_client(middleware: CompressionMiddleware) -> TestClient:
+    return TestClient(middleware)
+
+
+def test_middleware_compresses_json(client: TestClient) -> None:
+    response = client.get("/json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.content == _BODY
+
+
+def test_middleware_streams(client: TestClient) -> None:
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.content == _BODY
+
+
+@pytest.mark.parametrize(
+    "path, accept_encoding",
+    [("/small", "gzip"), ("/events", "gzip"), ("/json", "identity")],
+)
+def test_middleware_passthrough(
+    client: TestClient, path: str, accept_encoding: str
+) -> None:
+    response = client.get(path, headers={"Accept-Encoding": accept_encoding})
+    assert "content-encoding" not in response.headers
+
+
+def test_middleware_caches_tagged_bodies(
+    client: TestClient, middleware: CompressionMiddleware
+) -> None:
+    for _ in range(3):
+        response = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+        assert response.content == _BODY
+    assert middleware.stats.compressed == 1
+    assert middleware.stats.cache_hits == 2
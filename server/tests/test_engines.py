@@ -0,0 +1,36 @@
+"""Pool stats (`jobserver.engines`)."""
+from threading import Thread
+from time import perf_counter
+from typing import List
+
+from jobserver.engines import PoolStats
+
+
+def test_counters_from_threads() -> None:
+    pool_stats: PoolStats = PoolStats()
+
+    def _checkouts() -> None:
+        for _ in range(20000):
+            pool_stats.increment("checkouts")
+
+    threads: List[Thread] = [Thread(target=_checkouts) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool_stats.checkouts == 8 * 20000
+
+
+def test_current_wait() -> None:
+    pool_stats: PoolStats = PoolStats()
+    assert pool_stats.current_wait() == 0
+    pool_stats.record_wait(0.5)
+    assert 0 < pool_stats.current_wait() <= 0.5
+    assert pool_stats.waits == 1
+    waiter: int = pool_stats.begin_wait(perf_counter() - 10)
+    assert pool_stats.waiting == 1
+    # The ongoing wait is longer than the recent ones.
+    assert pool_stats.current_wait() >= 10
+    pool_stats.end_wait(waiter)
+    pool_stats.end_wait(waiter)
+    assert pool_stats.waiting == 0
@@ -0,0 +1,263 @@
+"""Job listing (`jobserver.services.job`), with in-memory stores."""
+import asyncio
+from time import time
+from typing import List, Optional, Set, Tuple
+
+import pytest
+from starlette.applications import Starlette
+from starlette.datastructures import QueryParams
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from jobserver.caches import CatalogueVersion
+from jobserver.contexts import AppContext, DBConfig, PoolConfig
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.services.job import (
+    _JOB_FIELDS,
+    _SYNC_OVERLAP_MILLI,
+    JobService,
+    _batch_operations,
+    _cursor,
+    _job_query,
+    _requested_fields,
+    _sync_token,
+)
+from jobserver.stores.job import SEARCH_RANK, JobQuery
+
+
+def _job(job_id: int) -> dict:
+    return {
+        "id": job_id,
+        "name": f"Engineer {job_id}",
+        "company": "Company",
+        "expectedExperienceInYears": "4-7",
+        "locations": "Pune",
+        "createdTime": 1643760000000,
+        "lastModifiedTime": 1643760000000 + job_id,
+        "shortJobDescription": None,
+        "shortCompanyDescription": None,
+        "fullJobDescription": "Build APIs.",
+    }
+
+
+class _JobStore:
+    """Catalogue of `jobs`, `deleted` are ids of the deleted jobs."""
+
+    def __init__(self) -> None:
+        self.jobs: List[dict] = [_job(job_id) for job_id in (1, 2, 3)]
+        self.deleted: List[int] = [9]
+        self.pruned_before: Optional[int] = None
+
+    async def get_current_version(self) -> CatalogueVersion:
+        return (
+            len(self.jobs),
+            max(job_obj["id"] for job_obj in self.jobs),
+            max(job_obj["lastModifiedTime"] for job_obj in self.jobs),
+        )
+
+    async def get_all(self, query: JobQuery = JobQuery()) -> List[dict]:
+        jobs: List[dict] = [
+            job_obj
+            for job_obj in self.jobs
+            if query.after is None or job_obj["id"] > query.after
+        ]
+        return jobs[: query.limit]
+
+    async def get_changes(
+        self, since: int, columns: Optional[Tuple[str, ...]] = None
+    ) -> Tuple[List[dict], List[int]]:
+        return [
+            job_obj for job_obj in self.jobs if job_obj["lastModifiedTime"] > since
+        ], (self.deleted if since >= 0 else [])
+
+    async def prune_changes(self, before: int) -> int:
+        self.pruned_before = before
+        return 0
+
+
+class _UserStore:
+    """Tenant applied job 2, withdrew job 3."""
+
+    async def get_user_job_ids(self, tenant_id: int) -> Set[int]:
+        return {2}
+
+    async def get_user_job_changes(
+        self, tenant_id: int, since: int
+    ) -> Tuple[Set[int], Set[int]]:
+        return {2}, {3}
+
+
+@pytest.fixture(name="job_store")
+def fixture_job_store() -> _JobStore:
+    return _JobStore()
+
+
+@pytest.fixture(name="service")
+def fixture_service(
+    job_store: _JobStore, monkeypatch: pytest.MonkeyPatch
+) -> JobService:
+    db_config: DBConfig = DBConfig("db", "localhost", 5432, "user", "")
+    service: JobService = JobService(
+        AppContext(
+            db_config,
+            METADATA,
+            False,
+            EngineRegistry(db_config, PoolConfig(1, 0, False, -1, 1)),
+            sync_retention=3600,
+        )
+    )
+    monkeypatch.setattr(service, "_job_store", job_store)
+    monkeypatch.setattr(service, "_user_store", _UserStore())
+    return service
+
+
+@pytest.fixture(name="client")
+def fixture_client(service: JobService) -> TestClient:
+    return TestClient(Starlette(routes=[Route("/jobs/", service.fetch_all)]))
+
+
+def test_requested_fields() -> None:
+    assert _requested_fields(QueryParams("")) == _JOB_FIELDS
+    assert _requested_fields(QueryParams("fields=name, isApplied")) == (
+        "id",
+        "name",
+        "isApplied",
+    )
+    with pytest.raises(ValueError):
+        _requested_fields(QueryParams("fields=name,salary"))
+
+
+def test_job_query() -> None:
+    query: JobQuery = _job_query(
+        QueryParams("limit=10&after=5&minExperience=2&maxExperience=4"), _JOB_FIELDS
+    )
+    assert (query.columns, query.limit, query.after) == (None, 10, 5)
+    assert (query.min_experience, query.max_experience) == (2, 4)
+    query = _job_query(QueryParams("q=python&after=0.25:7"), ("id", "isApplied"))
+    assert (query.search, query.after_rank, query.after) == ("python", 0.25, 7)
+    assert query.columns == ("id",)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        "limit=0",
+        "limit=1001",
+        "after=x",
+        "q=%20",
+        "q=python&after=7",
+        "minExperience=101",
+        "minExperience=5&maxExperience=4",
+        "company=",
+    ],
+)
+def test_invalid_job_query(params: str) -> None:
+    with pytest.raises(ValueError):
+        _job_query(QueryParams(params), _JOB_FIELDS)
+
+
+def test_cursor() -> None:
+    assert _cursor({"id": 7}) == "7"
+    assert _cursor({"id": 7, SEARCH_RANK: 0.25}) == "0.25:7"
+
+
+def test_sync_token() -> None:
+    assert _sync_token(QueryParams("tenant=1")) is None
+    assert _sync_token(QueryParams("since=10")) == 10
+    for params in ("since=-1", "since=x", "since=10&limit=5", "since=0&q=python"):
+        with pytest.raises(ValueError):
+            _sync_token(QueryParams(params))
+
+
+def test_batch_operations() -> None:
+    assert _batch_operations(
+        [{"jobId": "1", "isApplied": True}, {"jobId": 2, "isApplied": False}]
+    ) == [(1, True), (2, False)]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        [],
+        {"jobId": 1, "isApplied": True},
+        [{"jobId": 1}],
+        [{"jobId": 1, "isApplied": "yes"}],
+        [{"jobId": 1, "isApplied": True, "note": ""}],
+        [{"jobId": 1, "isApplied": True}, {"jobId": "1", "isApplied": False}],
+        [{"jobId": job_id, "isApplied": True} for job_id in range(1001)],
+    ],
+)
+def test_invalid_batch_operations(body: object) -> None:
+    with pytest.raises(ValueError):
+        _batch_operations(body)
+
+
+def test_fetch_all(client: TestClient) -> None:
+    response = client.get("/jobs/?tenant=1")
+    assert response.status_code == 200
+    assert [(job_obj["id"], job_obj["isApplied"]) for job_obj in response.json()] == [
+        (1, False),
+        (2, True),
+        (3, False),
+    ]
+
+
+def test_pages(client: TestClient) -> None:
+    page: dict = client.get("/jobs/?tenant=1&limit=2&fields=id").json()
+    assert page == {"data": [{"id": 1}, {"id": 2}], "next": "2"}
+    page = client.get(f"/jobs/?tenant=1&limit=2&fields=id&after={page['next']}").json()
+    assert page == {"data": [{"id": 3}], "next": None}
+
+
+@pytest.mark.parametrize("params", ["limit=0", "fields=salary", "stream=xml"])
+def test_invalid_params(client: TestClient, params: str) -> None:
+    assert client.get(f"/jobs/?tenant=1&{params}").status_code == 400
+
+
+def test_not_modified(client: TestClient, job_store: _JobStore) -> None:
+    etag: str = client.get("/jobs/?tenant=1").headers["etag"]
+    response = client.get("/jobs/?tenant=1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    # Tag of another query.
+    response = client.get("/jobs/?tenant=1&limit=1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    job_store.jobs.append(_job(4))
+    response = client.get("/jobs/?tenant=1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_delta_sync(client: TestClient) -> None:
+    started: int = int(time() * 1000)
+    # Full sync, without the change logs.
+    changes: dict = client.get("/jobs/?tenant=1&since=0&fields=id").json()
+    assert changes["data"] == [{"id": 1}, {"id": 2}, {"id": 3}]
+    assert (changes["deleted"], changes["applied"], changes["withdrawn"]) == (
+        [],
+        ["2"],
+        [],
+    )
+    assert int(changes["next"]) >= started
+    changes = client.get(f"/jobs/?tenant=1&since={changes['next']}").json()
+    assert changes["data"] == []
+    assert (changes["deleted"], changes["applied"], changes["withdrawn"]) == (
+        ["9"],
+        ["2"],
+        ["3"],
+    )
+
+
+def test_expired_sync_token(client: TestClient) -> None:
+    # Older than the retention of the change logs.
+    since: int = int((time() - 3600) * 1000) - 1000
+    response = client.get(f"/jobs/?tenant=1&since={since}")
+    assert response.status_code == 410
+    assert response.json()["code"] == "7"
+
+
+def test_prune_changes(service: JobService, job_store: _JobStore) -> None:
+    started: int = int((time() - 3600) * 1000) - _SYNC_OVERLAP_MILLI
+    asyncio.run(service.prune_changes())
+    assert started <= job_store.pruned_before <= started + 1000
@@ -0,0 +1,76 @@
+"""Job store (`jobserver.stores.job`), without a database."""
+import asyncio
+from dataclasses import replace
+from typing import List
+
+import pytest
+
+from jobserver.contexts import DBConfig, PoolConfig
+from jobserver.contract.models import METADATA
+from jobserver.engines import EngineRegistry
+from jobserver.stores.job import SEARCH_RANK, AsyncJobStore, JobQuery
+
+_JOBS: List[dict] = [{"id": id_, "name": f"job {id_}"} for id_ in range(1, 2501)]
+
+
+@pytest.fixture(name="store")
+def fixture_store(monkeypatch: pytest.MonkeyPatch) -> AsyncJobStore:
+    """Store reading pages of `_JOBS`, pages read are in `store.pages`."""
+    store: AsyncJobStore = AsyncJobStore(
+        EngineRegistry(
+            DBConfig("db", "localhost", 5432, "user", ""),
+            PoolConfig(1, 0, False, -1, 1),
+        ),
+        METADATA,
+    )
+    store.pages = []
+
+    async def _fetch(query: JobQuery) -> List[dict]:
+        store.pages.append(query)
+        jobs: List[dict] = [
+            job_obj
+            for job_obj in _JOBS
+            if query.after is None or job_obj["id"] > query.after
+        ]
+        return jobs[: query.limit]
+
+    monkeypatch.setattr(store, "_fetch", _fetch)
+    return store
+
+
+async def _streamed(store: AsyncJobStore, query: JobQuery) -> List[dict]:
+    return [job_obj async for job_obj in store.stream(query)]
+
+
+def test_stream_reads_pages(store: AsyncJobStore) -> None:
+    assert asyncio.run(_streamed(store, JobQuery())) == _JOBS
+    assert [(page.after, page.limit) for page in store.pages] == [
+        (None, 1000),
+        (1000, 1000),
+        (2000, 1000),
+    ]
+
+
+def test_stream_with_limit(store: AsyncJobStore) -> None:
+    jobs: List[dict] = asyncio.run(_streamed(store, JobQuery(after=10, limit=1500)))
+    assert jobs == _JOBS[10:1510]
+    assert [(page.after, page.limit) for page in store.pages] == [
+        (10, 1000),
+        (1010, 500),
+    ]
+
+
+def test_stream_of_search_continues_after_rank(
+    store: AsyncJobStore, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    ranked: List[dict] = [{**job_obj, SEARCH_RANK: 0.5} for job_obj in _JOBS[:1000]]
+
+    async def _fetch(query: JobQuery) -> List[dict]:
+        store.pages.append(query)
+        return ranked if query.after is None else []
+
+    monkeypatch.setattr(store, "_fetch", _fetch)
+    assert asyncio.run(_streamed(store, JobQuery(search="python"))) == ranked
+    assert store.pages[1] == replace(
+        JobQuery(search="python"), after=1000, after_rank=0.5, limit=1000
+    )
@@ -0,0 +1,78 @@
+"""Experience parsed from `Job.expectedExperienceInYears` (`contract.models`).
+
+Patterns are applied as the db does, the first group of the first match
+(`substring(... from pattern)`), they use the syntax common to Postgres and
+Python regular expressions.
+"""
+import re
+from typing import Optional, Tuple
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from jobserver.contract.models import (
+    MAX_EXPERIENCE_PATTERNS,
+    MAX_EXPERIENCE_YEARS,
+    METADATA,
+    MIN_EXPERIENCE_PATTERNS,
+    Job,
+    _experience_years,
+)
+from jobserver.migrations import MIGRATIONS
+
+
+def _years(value: str, patterns: Tuple[str, ...]) -> Optional[int]:
+    for pattern in patterns:
+        match: Optional[re.Match] = re.search(pattern, value.lower())
+        if match is not None:
+            return min(int(match.group(1)), MAX_EXPERIENCE_YEARS)
+    return None
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("4-7", (4, 7)),
+        (" 4 - 7 ", (4, 7)),
+        ("4-7 yrs", (4, 7)),
+        ("4-7 Years", (4, 7)),
+        ("4 to 7", (4, 7)),
+        ("4 TO 7 yrs", (4, 7)),
+        ("5", (5, 5)),
+        ("5 yrs", (5, 5)),
+        ("1 year", (1, 1)),
+        ("6+", (6, None)),
+        ("6+ yrs", (6, None)),
+        ("fresher", (None, None)),
+        ("", (None, None)),
+        ("9999999999", (MAX_EXPERIENCE_YEARS, MAX_EXPERIENCE_YEARS)),
+        ("1-99999999", (1, MAX_EXPERIENCE_YEARS)),
+    ],
+)
+def test_experience(value: str, expected: Tuple[Optional[int], Optional[int]]) -> None:
+    assert (
+        _years(value, MIN_EXPERIENCE_PATTERNS),
+        _years(value, MAX_EXPERIENCE_PATTERNS),
+    ) == expected
+
+
+def test_generated_columns_ddl() -> None:
+    ddl: str = str(CreateTable(Job).compile(dialect=postgresql.dialect()))
+    for column_name, patterns in (
+        ("minExperienceInYears", MIN_EXPERIENCE_PATTERNS),
+        ("maxExperienceInYears", MAX_EXPERIENCE_PATTERNS),
+    ):
+        # Rendered as is, no part of the patterns taken for a bind parameter.
+        expression: str = _experience_years(patterns)
+        assert f"GENERATED ALWAYS AS ({expression}) STORED" in ddl
+
+
+@pytest.mark.parametrize("version", [1, 6])
+def test_migrations_have_no_bind_params(version: int) -> None:
+    (migration,) = [
+        migration for migration in MIGRATIONS if migration.version == version
+    ]
+    for statement in migration.statements(None, METADATA):
+        assert text(statement)._bindparams == {}, statement
@@ -0,0 +1,86 @@
+"""Json encoding of jobs (`jobserver.serializers`)."""
+import json
+from typing import Tuple
+
+import pytest
+
+from jobserver import serializers
+from jobserver.serializers import JobEncoder, dumps, format_time
+
+_FIELDS: Tuple[str, ...] = ("id", "name", "createdTime", "isApplied")
+
+
+def _job(job_id: int, name: str = "Engineer", last_modified_time: int = 1) -> dict:
+    return {
+        "id": job_id,
+        "name": name,
+        "createdTime": 1643760000000,
+        "lastModifiedTime": last_modified_time,
+    }
+
+
+def test_encode() -> None:
+    encoder: JobEncoder = JobEncoder(_FIELDS, 10)
+    assert json.loads(encoder.encode(_job(1), _FIELDS, {1})) == {
+        "id": 1,
+        "name": "Engineer",
+        "createdTime": "2022-02-02T00:00:00Z",
+        "isApplied": True,
+    }
+    assert json.loads(encoder.encode(_job(2), _FIELDS, {1}))["isApplied"] is False
+
+
+def test_encode_projection() -> None:
+    encoder: JobEncoder = JobEncoder(_FIELDS, 10)
+    assert json.loads(encoder.encode(_job(1), ("id", "name"), {1})) == {
+        "id": 1,
+        "name": "Engineer",
+    }
+    assert json.loads(encoder.encode({"id": 1}, ("id", "isApplied"), set())) == {
+        "id": 1,
+        "isApplied": False,
+    }
+
+
+def test_encoded_job_is_reused_till_modified() -> None:
+    encoder: JobEncoder = JobEncoder(_FIELDS, 10)
+    encoder.encode(_job(1), _FIELDS, set())
+    # Same modification time, the cached encoding is served.
+    assert b"Engineer" in encoder.encode(_job(1, name="Manager"), _FIELDS, set())
+    modified: bytes = encoder.encode(
+        _job(1, name="Manager", last_modified_time=2), _FIELDS, set()
+    )
+    assert json.loads(modified)["name"] == "Manager"
+
+
+def test_encoded_jobs_are_bounded() -> None:
+    encoder: JobEncoder = JobEncoder(_FIELDS, 2)
+    for job_id in range(1, 6):
+        encoder.encode(_job(job_id), _FIELDS, set())
+    assert len(encoder._encoded) <= 2  # pylint: disable=protected-access
+    assert json.loads(encoder.encode(_job(1), _FIELDS, set()))["id"] == 1
+
+
+def test_encode_all() -> None:
+    encoder: JobEncoder = JobEncoder(_FIELDS, 10)
+    assert encoder.encode_all([], _FIELDS, set()) == b"[]"
+    jobs: list = json.loads(encoder.encode_all([_job(1), _job(2)], _FIELDS, {2}))
+    assert [(job_obj["id"], job_obj["isApplied"]) for job_obj in jobs] == [
+        (1, False),
+        (2, True),
+    ]
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps(monkeypatch: pytest.MonkeyPatch, use_orjson: bool) -> None:
+    if not use_orjson:
+        monkeypatch.setattr(serializers, "orjson", None)
+    elif serializers.orjson is None:
+        pytest.skip("orjson is not installed")
+    assert dumps({"name": "Développeur", "ids": [1, 2]}) == (
+        '{"name":"Développeur","ids":[1,2]}'.encode("utf-8")
+    )
+
+
+def test_format_time() -> None:
+    assert format_time(0) == "1970-01-01T00:00:00Z"
@@ -0,0 +1,168 @@
+"""Id generation (`jobserver.utils`)."""
+import asyncio
+import multiprocessing
+import os
+from typing import Iterator, List, Optional
+
+import pytest
+
+from jobserver import utils
+from jobserver.utils import (
+    MAX_IDS_PER_CALL,
+    claim_worker_id,
+    generate_id,
+    generate_ids,
+    generate_ids_async,
+    set_worker_id,
+    tenant_id_range,
+)
+
+_FORK = multiprocessing.get_context("fork")
+
+
+def _generate(worker_id: int, tenant_ids: List[int], burst: int) -> List[int]:
+    """Ids of a process, one by one and in bursts borrowing from the following
+    seconds.
+    """
+    set_worker_id(worker_id)
+    ids: List[int] = []
+    for tenant_id in tenant_ids:
+        ids.extend(generate_ids(tenant_id, burst))
+        ids.extend(generate_id(tenant_id) for _ in range(100))
+    return ids
+
+
+def _generate_unset(tenant_id: int) -> str:
+    try:
+        generate_id(tenant_id)
+    except RuntimeError as error:
+        return str(error)
+    return ""
+
+
+def _claim(lock_dir: str, worker_id: Optional[int]) -> str:
+    try:
+        return str(claim_worker_id(lock_dir, worker_id))
+    except RuntimeError as error:
+        return str(error)
+
+
+@pytest.fixture(name="worker")
+def fixture_worker(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Worker id of the test process, restored afterwards."""
+    monkeypatch.setattr(utils, "_SEQUENCES", None)
+    set_worker_id(0)
+
+
+@pytest.fixture(name="lock_dir")
+def fixture_lock_dir(tmp_path, monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    """Lock dir of worker ids, the claim of the test process is released."""
+    monkeypatch.setattr(utils, "_SEQUENCES", None)
+    monkeypatch.setattr(utils, "_CLAIM", None)
+    yield str(tmp_path)
+    if utils._CLAIM is not None:  # pylint: disable=protected-access
+        os.close(utils._CLAIM[2])  # pylint: disable=protected-access
+
+
+def test_ids_of_tenant(worker: None) -> None:
+    tenant_id: int = 7
+    start, stop = tenant_id_range(tenant_id)
+    ids: List[int] = generate_ids(tenant_id, 10)
+    assert all(start <= id_ < stop for id_ in ids)
+    assert generate_ids(tenant_id, 0) == []
+
+
+def test_borrowed_ids_are_unique_and_ascending(worker: None) -> None:
+    # More than the 1024 slots of a second, borrows the following seconds.
+    ids: List[int] = generate_ids(1, 3000) + [generate_id(1) for _ in range(10)]
+    assert ids == sorted(set(ids))
+    assert len(ids) == 3010
+
+
+def test_async_ids_wait_without_blocking(
+    worker: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # A fresh process waits for the next second, the loop keeps running.
+    def blocking_sleep(_: float) -> None:
+        raise AssertionError("slept on the event loop")
+
+    monkeypatch.setattr(utils, "sleep", blocking_sleep)
+    ticks: List[int] = []
+
+    async def generate() -> List[int]:
+        async def tick() -> None:
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        ticker: asyncio.Task = asyncio.create_task(tick())
+        try:
+            return await generate_ids_async(1, 3000)
+        finally:
+            ticker.cancel()
+
+    ids: List[int] = asyncio.run(generate())
+    assert ids == sorted(set(ids)) and len(ids) == 3000
+    assert len(ticks) > 1
+
+
+def test_invalid_count(worker: None) -> None:
+    with pytest.raises(ValueError):
+        generate_ids(1, MAX_IDS_PER_CALL + 1)
+    with pytest.raises(ValueError):
+        generate_ids(1, -1)
+
+
+def test_invalid_worker_id() -> None:
+    with pytest.raises(ValueError):
+        set_worker_id(utils.MAX_WORKER_ID + 1)
+
+
+def test_unset_worker_id(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(utils, "_SEQUENCES", None)
+    with pytest.raises(RuntimeError):
+        generate_id(1)
+
+
+def test_forked_process_needs_own_worker_id(worker: None) -> None:
+    with _FORK.Pool(1) as pool:
+        assert "not set" in pool.apply(_generate_unset, (1,))
+
+
+def test_claimed_worker_ids(lock_dir: str) -> None:
+    assert claim_worker_id(lock_dir, 3) == 3
+    assert claim_worker_id(lock_dir) == 3
+    generate_id(1)
+    # Other processes, whatever started them, can't share it.
+    with _FORK.Pool(1) as pool:
+        assert "held by another process" in pool.apply(_claim, (lock_dir, 3))
+        assert pool.apply(_claim, (lock_dir, None)) == "0"
+        assert pool.apply(_claim, (lock_dir, 0)) == "0"
+        assert "held by another process" in _claim(lock_dir, 0)
+    # Released with the process.
+    assert claim_worker_id(lock_dir, 0) == 0
+    with _FORK.Pool(1) as pool:
+        assert pool.apply(_claim, (lock_dir, 3)) == "3"
+
+
+def test_processes_with_distinct_worker_ids() -> None:
+    tenant_ids: List[int] = [1, 2, 3]
+    with _FORK.Pool(4) as pool:
+        results: List[List[int]] = pool.starmap(
+            _generate, [(worker_id, tenant_ids, 1500) for worker_id in range(4)]
+        )
+    ids: List[int] = [id_ for worker_ids in results for id_ in worker_ids]
+    assert len(ids) == 4 * 3 * 1600
+    assert len(set(ids)) == len(ids)
+
+
+def test_restarted_process() -> None:
+    # The first process borrows slots of the following seconds and exits, a
+    # process of the same worker id starts right after it.
+    results: List[List[int]] = []
+    for _ in range(2):
+        with _FORK.Pool(1) as pool:
+            results.append(pool.apply(_generate, (5, [1], MAX_IDS_PER_CALL - 100)))
+    assert len(results[0]) == len(results[1]) == MAX_IDS_PER_CALL
+    assert not set(results[0]) & set(results[1])
+    assert min(results[1]) > max(results[0])